@@ -0,0 +1,91 @@
+"""
+Autocomplete latency: in-memory index vs the ORM search backends.
+
+Runs against a throwaway in-memory test database:
+
+    python benchmarks/autocomplete.py --sizes 10000 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cocci.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from product.autocomplete import AutocompleteIndex  # noqa: E402
+from product.models import Product  # noqa: E402
+from product.search import BACKENDS  # noqa: E402
+from product.views import ProductSearchView  # noqa: E402
+
+WORDS = [
+    "crewneck", "sweater", "velvet", "coat", "silk", "dress", "linen", "shirt",
+    "denim", "jacket", "wool", "trousers", "leather", "boots", "cotton", "skirt",
+    "cashmere", "cardigan", "tweed", "blazer", "vintage", "archive", "military",
+]
+QUERIES = ["c", "co", "coa", "crewn", "silk dr", "vintage jack", "crewnek", "blazr"]
+
+
+def populate(size):
+    rng = random.Random(size)
+    Product.objects.all().delete()
+    Product.objects.bulk_create(
+        [
+            Product(
+                code=str(100000 + i),
+                title=" ".join(rng.choices(WORDS, k=3)).upper()[:100],
+                description=" ".join(rng.choices(WORDS, k=12)),
+                price=rng.randint(10, 500),
+            )
+            for i in range(size)
+        ],
+        batch_size=5000,
+    )
+    BACKENDS["sqlite_fts"]().rebuild()
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0)
+    view = ProductSearchView()
+    print(f"{'products':>9} {'query':<14} {'scan ms':>9} {'fts ms':>9} {'index ms':>9}")
+    for size in args.sizes:
+        populate(size)
+        index = AutocompleteIndex()
+        load_ms = timed(index.load, 1)
+        for query in QUERIES:
+            row = [f"{size:>9} {query!r:<14}"]
+            for backend in ("scan", "sqlite_fts"):
+                with override_settings(PRODUCT_SEARCH_BACKEND=backend):
+                    row.append(f"{timed(lambda: view.search_products(query, 8), args.repeat):>9.2f}")
+            row.append(f"{timed(lambda: index.search(query, 8), args.repeat):>9.2f}")
+            print(" ".join(row))
+        print(f"{size:>9} index load: {load_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Barcode render time and payload size per output format (PNG, SVG, ZPL),
+cold (rendered) and warm (served from the in-memory cache):
+
+    python benchmarks/barcode_formats.py --count 500
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cocci.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from product import barcodes  # noqa: E402
+
+
+def timed(function, codes):
+    timings, sizes = [], []
+    for code in codes:
+        start = time.perf_counter()
+        data = function(code)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(data))
+    return timings, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    codes = [str(100000 + i) for i in range(args.count)]
+    with tempfile.TemporaryDirectory() as media_root:
+        settings.MEDIA_ROOT = media_root
+        cache = barcodes.BarcodeCache(maxsize=args.count * len(barcodes.FORMATS))
+
+        print(
+            f"{'format':<8}{'render ms':>12}{'p95 ms':>10}{'cached ms':>12}"
+            f"{'avg bytes':>12}{'labels/s':>12}"
+        )
+        for fmt in barcodes.FORMATS:
+            render_times, sizes = timed(
+                lambda code: barcodes.render_barcode(code, fmt=fmt), codes
+            )
+            for code in codes:
+                cache.get(code, fmt=fmt)
+            cached_times, _ = timed(lambda code: cache.get(code, fmt=fmt), codes)
+
+            mean = statistics.mean(render_times)
+            p95 = statistics.quantiles(render_times, n=20)[-1]
+            print(
+                f"{fmt:<8}{mean:>12.3f}{p95:>10.3f}"
+                f"{statistics.mean(cached_times):>12.4f}"
+                f"{statistics.mean(sizes):>12.0f}{1000 / mean:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ python manage.py collectstatic --no-input
 # Apply any outstanding database migrations
 python manage.py migrate
 
+# Rewrite every product card served by the product list, so a change to the
+# card payload reaches all of them (migrate already fills an empty table)
+python manage.py rebuild_product_cards
+
 # python manage.py runscript create_superuser
 python manage.py shell -c "
 import os;
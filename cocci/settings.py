@@ -128,6 +128,13 @@ DATABASES = {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "/app/db/db.sqlite3",
         # "NAME": "/Users/giuliodesana/Downloads/cocci_db_backup_02_07_2026.sqlite3",
+        "OPTIONS": {
+            # SQLite ignores select_for_update: take the write lock when the
+            # transaction starts, so concurrent checkouts run one after the
+            # other instead of failing with "database is locked" on upgrade
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
@@ -144,6 +151,75 @@ DATABASES = {
 # }
 
 
+# Cache
+# With more than one worker process point this at a shared backend (Redis,
+# Memcached): the catalog version used to invalidate cached API responses
+# lives here.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "cocci",
+    }
+}
+
+# Seconds a cached product/tag/search response is kept; signals invalidate
+# it earlier whenever the catalog changes
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Product search: "auto" picks the SQLite FTS5 trigram table or the Postgres
+# pg_trgm indexes for the current database; "scan" forces the plain icontains
+# query. All of them match the query anywhere in the title or description
+PRODUCT_SEARCH_BACKEND = os.getenv("PRODUCT_SEARCH_BACKEND", "auto")
+
+# Serve the search box from an in-memory title index loaded at worker start
+# (product/autocomplete.py) instead of querying the database
+PRODUCT_AUTOCOMPLETE_INDEX = os.getenv("PRODUCT_AUTOCOMPLETE_INDEX") == "1"
+
+# Options passed to python-barcode's ImageWriter; rendered PNGs are cached in
+# memory (up to BARCODE_CACHE_SIZE images per worker) and under MEDIA_ROOT
+BARCODE_WRITER_OPTIONS = {}
+BARCODE_CACHE_SIZE = 512
+# Resolution of the thermal printer receiving ZPL labels
+BARCODE_ZPL_DPI = 203
+
+# Server-side label sheets (products/print/?sheet=pdf|svg): default grid and
+# paper, overridable per request; selections of at least
+# BARCODE_SHEET_PARALLEL_MIN labels are rendered in a process pool
+BARCODE_SHEET = {"paper": "A4", "columns": 3, "rows": 8, "dpi": 300, "margin_mm": 10}
+BARCODE_SHEET_PARALLEL_MIN = 48
+BARCODE_SHEET_WORKERS = None
+
+
+# Carts nobody added to for CART_TTL_DAYS are deleted by sweep_carts (cron)
+# or, with CART_SWEEP_INTERVAL > 0 seconds, by a thread in each worker. The
+# default TTL matches the default session lifetime of two weeks.
+CART_TTL_DAYS = int(os.getenv("CART_TTL_DAYS", "14"))
+CART_SWEEP_INTERVAL = int(os.getenv("CART_SWEEP_INTERVAL", "0"))
+CART_SWEEP_BATCH_SIZE = 500
+
+# Adding a product to a cart holds it for CART_RESERVATION_MINUTES, during
+# which no other cart can add it or check it out; 0 turns holds off. Expired
+# holds no longer count and are deleted by the sweeps above.
+CART_RESERVATION_MINUTES = int(os.getenv("CART_RESERVATION_MINUTES", "15"))
+
+# An order waiting for confirmation keeps its products from other checkouts
+# for ORDER_PENDING_HOLD_HOURS after it was placed; past that, an order the
+# shop never confirmed no longer blocks them. 0 keeps them blocked until the
+# order is confirmed or deleted.
+ORDER_PENDING_HOLD_HOURS = int(os.getenv("ORDER_PENDING_HOLD_HOURS", "72"))
+
+# Responses to cart and checkout requests sent with an Idempotency-Key header
+# are replayed to retries for this long, then purged like expired carts
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# Where carts live: "db" (CartItem rows) or "cache" (one entry per cart in
+# CART_CACHE_ALIAS, written to the database only at checkout). The cache
+# backend needs a cache shared by all workers, unlike the LocMem default.
+CART_BACKEND = os.getenv("CART_BACKEND", "db")
+CART_CACHE_ALIAS = "default"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -227,6 +303,11 @@ CSRF_USE_SESSIONS = False
 CSRF_COOKIE_SAMESITE = None
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
+# Sessions are only persisted once a visitor puts something in the cart
+# (orders/cart.py). "django.contrib.sessions.backends.cached_db" or
+# "...cache" keeps them out of the database, "...signed_cookies" stores
+# them client side; with the db backends run purge_sessions periodically.
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.db")
 # CSRF_TRUSTED_ORIGINS = ["http://"]
 
 
@@ -253,5 +334,19 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 
 SHOP_OWNER_EMAIL = os.getenv("SHOP_OWNER_EMAIL")
+# Do not let a stuck mail server hold the outbox worker
+EMAIL_TIMEOUT = 20
+
+# Order emails go through the OutboxEmail table: a thread in each worker sends
+# them every EMAIL_OUTBOX_INTERVAL seconds and right after each checkout, or,
+# with the interval at 0, the send_outbox command does. Failed sends are
+# retried after EMAIL_OUTBOX_RETRY_DELAY seconds, doubled per attempt.
+EMAIL_OUTBOX_INTERVAL = int(os.getenv("EMAIL_OUTBOX_INTERVAL", "30"))
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+EMAIL_OUTBOX_RETRY_DELAY = 60
+EMAIL_OUTBOX_RETRY_DELAY_MAX = 6 * 60 * 60
+# Seconds a worker has to send what it claimed before others may retry it
+EMAIL_OUTBOX_LEASE = 300
 
 # Another test 2
\ No newline at end of file
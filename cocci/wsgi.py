@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cocci.settings')
 
 application = get_wsgi_application()
+
+# Load the in-memory autocomplete index before the first request, if enabled
+from product import autocomplete  # noqa: E402
+
+autocomplete.warm_up()
+
+# Periodic expired cart sweep in this worker, if CART_SWEEP_INTERVAL is set
+from orders.tasks import start_cart_sweeper, start_outbox_worker  # noqa: E402
+
+start_cart_sweeper()
+
+# Order emails are sent from the outbox by a thread in this worker, unless
+# EMAIL_OUTBOX_INTERVAL is 0 and send_outbox runs on its own
+start_outbox_worker()
@@ -1,4 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .confirmation import set_orders_confirmed
 from .models import *
 
 # Register your models here.
@@ -8,7 +11,57 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
 
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('label', 'email', 'created_at', 'total')
+    list_display = ('label', 'email', 'created_at', 'total', 'confirmed', 'item_count')
+    list_filter = ('confirmed',)
     inlines = [OrderItemInline]
+    actions = ['confirm_orders', 'unconfirm_orders']
+    # Orders have no foreign keys to join; the item count is annotated below
+    list_select_related = False
+    # Skip the extra COUNT(*) over all orders on every filtered page
+    show_full_result_count = False
 
-admin.site.register(Order, OrderAdmin)
\ No newline at end of file
+    def get_queryset(self, request):
+        # A subquery, evaluated only for the rows of the page, rather than a
+        # join and GROUP BY over every order
+        item_count = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            item_count=Coalesce(Subquery(item_count), 0, output_field=IntegerField())
+        )
+
+    @admin.display(description='Items', ordering='item_count')
+    def item_count(self, obj):
+        return obj.item_count
+
+    def set_confirmed(self, request, queryset, confirmed):
+        orders, products = set_orders_confirmed(
+            list(queryset.values_list('pk', flat=True)), confirmed
+        )
+        self.message_user(
+            request,
+            f"{orders} orders {'confirmed' if confirmed else 'unconfirmed'}, "
+            f"{products} products changed availability",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description='Confirm selected orders')
+    def confirm_orders(self, request, queryset):
+        self.set_confirmed(request, queryset, True)
+
+    @admin.action(description='Unconfirm selected orders')
+    def unconfirm_orders(self, request, queryset):
+        self.set_confirmed(request, queryset, False)
+
+admin.site.register(Order, OrderAdmin)
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'created_at', 'attempts', 'sent_at', 'next_attempt_at')
+    list_filter = ('sent_at',)
+    readonly_fields = ('attempts', 'sent_at', 'claim', 'last_error')
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
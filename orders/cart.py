@@ -0,0 +1,58 @@
+import uuid
+
+from .cart_backends import get_cart_backend
+
+# Session key holding the number of items in the cart, kept up to date by the
+# cart views so middleware and templates never have to load the cart
+CART_COUNT_KEY = "cart_items"
+
+
+def get_cart_id(request):
+    """The cart of this visitor, None without creating a session if there is none."""
+    session = getattr(request, "session", None)
+    return None if session is None else session.get("cart_id")
+
+
+def get_or_create_cart_id(request):
+    # Only called when something goes into the cart: this is what persists
+    # the session of an anonymous visitor. The id is independent of the
+    # session key, which the signed-cookie engine does not have and login
+    # rotates.
+    if request.session.get("cart_id") is None:
+        request.session["cart_id"] = uuid.uuid4().hex
+    return request.session["cart_id"]
+
+
+def count_cart_items(session_id):
+    return get_cart_backend().count(session_id)
+
+
+def set_cart_count(request, count):
+    # Assigning marks the session as modified: only do it on a real change
+    if request.session.get(CART_COUNT_KEY) != count:
+        request.session[CART_COUNT_KEY] = count
+
+
+def rebuild_cart_count(request):
+    count = count_cart_items(request.session["cart_id"])
+    set_cart_count(request, count)
+    return count
+
+
+def get_cart_count(request):
+    """The cart item count of this session, counted once if it went missing."""
+    if get_cart_id(request) is None:
+        return 0
+    count = request.session.get(CART_COUNT_KEY)
+    if count is None:
+        count = rebuild_cart_count(request)
+    return count
+
+
+def adjust_cart_count(request, delta):
+    """Apply ``delta`` after the cart rows themselves have been changed."""
+    count = request.session.get(CART_COUNT_KEY)
+    if count is None:
+        rebuild_cart_count(request)
+    else:
+        set_cart_count(request, max(count + delta, 0))
@@ -0,0 +1,289 @@
+import threading
+import weakref
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Subquery, Sum
+
+from product.models import Product
+
+from .models import CartItem, first_image
+
+
+class CartLine(NamedTuple):
+    product: Product
+    quantity: int
+
+
+def summary_item(product, quantity, image, total):
+    return {
+        "id": product.id,
+        "code": product.code,
+        "title": product.title,
+        "price": product.price,
+        "penalty": product.penalty,
+        "quantity": quantity,
+        "total": total,
+        "image": image,
+    }
+
+
+def empty_summary():
+    return {"items": [], "total_items": 0, "total_price": 0}
+
+
+class DatabaseCartBackend:
+    """One CartItem row per product in the cart."""
+
+    name = "db"
+
+    def summary(self, session_id):
+        items = list(CartItem.objects.filter(session_id=session_id).with_summary())
+        if not items:
+            return empty_summary()
+        # Totals come from the window sums, the same on every row
+        return {
+            "items": [
+                summary_item(item.product, item.quantity, item.first_image, item.line_total)
+                for item in items
+            ],
+            "total_items": items[0].cart_items,
+            "total_price": items[0].cart_total or 0,
+        }
+
+    def count(self, session_id):
+        return CartItem.objects.filter(session_id=session_id).aggregate(
+            total=Sum("quantity")
+        )["total"] or 0
+
+    def increment(self, session_id, product_code, quantity):
+        """Add ``quantity`` to the line of ``product_code`` in a single UPDATE,
+        incrementing in the database. False when it is not in the cart yet."""
+        return (
+            CartItem.objects.filter(
+                session_id=session_id, product__code=product_code
+            ).update(quantity=F("quantity") + quantity)
+            > 0
+        )
+
+    def add(self, session_id, product, quantity):
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(
+                    session_id=session_id, product=product, quantity=quantity
+                )
+        except IntegrityError:
+            # Another request of this session created the row in the meantime
+            CartItem.objects.filter(session_id=session_id, product=product).update(
+                quantity=F("quantity") + quantity
+            )
+
+    def add_many(self, session_id, products, quantities):
+        """
+        Add ``quantities`` ({product_code: quantity}) of ``products``
+        ({product_code: product_id}) in one transaction: one UPDATE for the
+        rows already there and one INSERT for the others, however many
+        products there are.
+        """
+        by_id = {products[code]: quantity for code, quantity in quantities.items()}
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    existing = dict(
+                        CartItem.objects.filter(
+                            session_id=session_id, product_id__in=by_id
+                        ).values_list("product_id", "pk")
+                    )
+                    CartItem.objects.bulk_update(
+                        [
+                            CartItem(pk=pk, quantity=F("quantity") + by_id[product_id])
+                            for product_id, pk in existing.items()
+                        ],
+                        ["quantity"],
+                    )
+                    CartItem.objects.bulk_create(
+                        [
+                            CartItem(
+                                session_id=session_id, product_id=product_id, quantity=quantity
+                            )
+                            for product_id, quantity in by_id.items()
+                            if product_id not in existing
+                        ]
+                    )
+                return
+            except IntegrityError:
+                # A row was inserted concurrently: it is an update on the retry
+                if attempt:
+                    raise
+
+    def remove(self, session_id, product_code):
+        """Drop the line of ``product_code``; its quantity, None if not in the cart."""
+        lines = list(
+            CartItem.objects.filter(
+                session_id=session_id, product__code=product_code
+            ).values_list("pk", "quantity")
+        )
+        if not lines:
+            return None
+        CartItem.objects.filter(pk__in=[pk for pk, _ in lines]).delete()
+        return sum(quantity for _, quantity in lines)
+
+    def discard(self, session_id, product_ids):
+        """Drop the lines of ``product_ids``; the codes of the dropped lines."""
+        items = CartItem.objects.filter(session_id=session_id, product_id__in=product_ids)
+        codes = list(items.values_list("product__code", flat=True))
+        items.delete()
+        return codes
+
+    def quantities(self, session_id):
+        """{product_id: quantity} of the cart, without loading the products."""
+        return dict(
+            CartItem.objects.filter(session_id=session_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+
+    def lines(self, session_id):
+        return [
+            CartLine(item.product, item.quantity)
+            for item in CartItem.objects.filter(session_id=session_id)
+            .select_related("product")
+            .order_by("id")
+        ]
+
+    def clear(self, session_id):
+        # Part of the caller's transaction, e.g. checkout
+        CartItem.objects.filter(session_id=session_id).delete()
+
+
+_session_locks = weakref.WeakValueDictionary()
+_session_locks_lock = threading.Lock()
+
+
+def _session_lock(session_id):
+    with _session_locks_lock:
+        lock = _session_locks.get(session_id)
+        if lock is None:
+            lock = threading.Lock()
+            _session_locks[session_id] = lock
+        return lock
+
+
+class CacheCartBackend:
+    """
+    The whole cart as one cache entry, {product_code: [product_id, quantity]}
+    in insertion order, expiring CART_TTL_DAYS after the last change. Only
+    the summary (to show the products) and checkout read the database.
+
+    Updates are read-modify-write, serialized per session within a process:
+    use a cache shared by all workers (Redis, Memcached) in production.
+    """
+
+    name = "cache"
+
+    @property
+    def cache(self):
+        return caches[settings.CART_CACHE_ALIAS]
+
+    def key(self, session_id):
+        return f"cart:{session_id}"
+
+    def load(self, session_id):
+        return self.cache.get(self.key(session_id)) or {}
+
+    def save(self, session_id, cart):
+        if cart:
+            self.cache.set(self.key(session_id), cart, settings.CART_TTL_DAYS * 24 * 60 * 60)
+        else:
+            self.cache.delete(self.key(session_id))
+
+    def summary(self, session_id):
+        cart = self.load(session_id)
+        if not cart:
+            return empty_summary()
+        products = Product.objects.filter(
+            pk__in=[product_id for product_id, _ in cart.values()]
+        ).annotate(first_image=Subquery(first_image("pk")))
+        products = {product.pk: product for product in products}
+
+        items = []
+        for product_id, quantity in cart.values():
+            product = products.get(product_id)
+            if product is None:
+                # Deleted since it was added
+                continue
+            total = product.price * quantity if product.price is not None else None
+            items.append(summary_item(product, quantity, product.first_image, total))
+        return {
+            "items": items,
+            "total_items": sum(item["quantity"] for item in items),
+            "total_price": sum(item["total"] or 0 for item in items),
+        }
+
+    def count(self, session_id):
+        return sum(quantity for _, quantity in self.load(session_id).values())
+
+    def increment(self, session_id, product_code, quantity):
+        with _session_lock(session_id):
+            cart = self.load(session_id)
+            if product_code not in cart:
+                return False
+            cart[product_code][1] += quantity
+            self.save(session_id, cart)
+            return True
+
+    def add(self, session_id, product, quantity):
+        self.add_many(session_id, {product.code: product.pk}, {product.code: quantity})
+
+    def add_many(self, session_id, products, quantities):
+        with _session_lock(session_id):
+            cart = self.load(session_id)
+            for code, quantity in quantities.items():
+                line = cart.setdefault(code, [products[code], 0])
+                line[1] += quantity
+            self.save(session_id, cart)
+
+    def remove(self, session_id, product_code):
+        with _session_lock(session_id):
+            cart = self.load(session_id)
+            line = cart.pop(product_code, None)
+            if line is None:
+                return None
+            self.save(session_id, cart)
+            return line[1]
+
+    def discard(self, session_id, product_ids):
+        product_ids = set(product_ids)
+        with _session_lock(session_id):
+            cart = self.load(session_id)
+            codes = [code for code, (pk, _) in cart.items() if pk in product_ids]
+            for code in codes:
+                del cart[code]
+            if codes:
+                self.save(session_id, cart)
+            return codes
+
+    def quantities(self, session_id):
+        return dict(self.load(session_id).values())
+
+    def lines(self, session_id):
+        cart = self.load(session_id)
+        products = Product.objects.in_bulk([product_id for product_id, _ in cart.values()])
+        return [
+            CartLine(products[product_id], quantity)
+            for product_id, quantity in cart.values()
+            if product_id in products
+        ]
+
+    def clear(self, session_id):
+        # The cache is not transactional: keep the cart if checkout rolls back
+        transaction.on_commit(lambda: self.cache.delete(self.key(session_id)))
+
+
+BACKENDS = {backend.name: backend for backend in (DatabaseCartBackend, CacheCartBackend)}
+
+
+def get_cart_backend():
+    return BACKENDS[settings.CART_BACKEND]()
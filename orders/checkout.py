@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from product.models import Product
+
+from . import reservations
+from .email import queue_order_emails
+from .models import Order, OrderItem
+from .tasks import wake_outbox_worker
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class ProductsUnavailable(CheckoutError):
+    def __init__(self, codes):
+        super().__init__(f"Products no longer available: {', '.join(codes)}")
+        self.codes = codes
+
+
+def pending_order_items():
+    """Items of the unconfirmed orders still holding their products."""
+    items = OrderItem.objects.filter(order__confirmed=False)
+    if settings.ORDER_PENDING_HOLD_HOURS > 0:
+        items = items.filter(
+            order__created_at__gt=timezone.now()
+            - timedelta(hours=settings.ORDER_PENDING_HOLD_HOURS)
+        )
+    return items
+
+
+def place_order(cart, session_id, email):
+    """
+    Turn the cart into an order in one transaction, with a fixed number of
+    queries whatever the cart size. The products are locked first, so two
+    buyers of the same one-of-a-kind item cannot both get it: the second one,
+    or anyone whose item another cart still holds, gets ProductsUnavailable.
+    """
+    with transaction.atomic():
+        quantities = cart.quantities(session_id)
+        if not quantities:
+            raise EmptyCart("Cart is empty")
+
+        # Locked in primary key order so concurrent checkouts cannot deadlock
+        products = list(
+            Product.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .order_by("pk")
+            .only("pk", "code", "price", "is_available")
+        )
+        # Sold, or waiting for confirmation in someone else's recent order
+        pending = set(
+            pending_order_items()
+            .filter(product_id__in=quantities)
+            .values_list("product_id", flat=True)
+        )
+        # Or held by another cart
+        pending.update(reservations.held_by_others(session_id, quantities))
+        unavailable = [
+            product.code
+            for product in products
+            if not product.is_available or product.pk in pending
+        ]
+        # Deleted since they went into the cart: only the cache backend still
+        # has their lines, and the cache keeps their removal despite the rollback
+        missing = set(quantities) - {product.pk for product in products}
+        if missing:
+            unavailable += cart.discard(session_id, missing)
+        if unavailable or missing:
+            raise ProductsUnavailable(unavailable)
+
+        quantity = Case(
+            *(When(pk=pk, then=Value(q)) for pk, q in quantities.items()),
+            output_field=IntegerField(),
+        )
+        total = (
+            Product.objects.filter(pk__in=quantities).aggregate(
+                total=Sum(F("price") * quantity)
+            )["total"]
+            or 0
+        )
+
+        order = Order.objects.create(email=email, session_id=session_id, total=total)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, price=product.price)
+            for product in products
+        )
+        cart.clear(session_id)
+        # The pending order holds the products from now on
+        reservations.release(session_id)
+        # Sent by the outbox worker, not in the request
+        queue_order_emails(order)
+        transaction.on_commit(wake_outbox_worker)
+    return order
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from product.models import Product
+
+from .models import Order, OrderItem
+from .signals import set_products_available
+
+
+def set_orders_confirmed(order_ids, confirmed):
+    """
+    Confirm (or unconfirm) the orders ``order_ids`` together, in one
+    transaction and a fixed number of queries however many orders and items.
+    Orders are updated in bulk, so their per-order signals do not run; instead
+    the availability of their products is recomputed at once: a product is
+    unavailable while it is in a confirmed order.
+
+    Returns (orders changed, products whose availability changed).
+    """
+    with transaction.atomic():
+        changed = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .exclude(confirmed=confirmed)
+            .values_list("pk", flat=True)
+        )
+        if not changed:
+            return 0, 0
+        Order.objects.filter(pk__in=changed).update(confirmed=confirmed)
+
+        sold = Exists(OrderItem.objects.filter(product=OuterRef("pk"), order__confirmed=True))
+        products = Product.objects.filter(
+            pk__in=OrderItem.objects.filter(order_id__in=changed).values("product_id")
+        )
+        now_sold = list(products.filter(sold, is_available=True).values_list("pk", flat=True))
+        now_free = list(
+            products.filter(~sold, is_available=False).values_list("pk", flat=True)
+        )
+        set_products_available(now_sold, False)
+        set_products_available(now_free, True)
+    return len(changed), len(now_sold) + len(now_free)
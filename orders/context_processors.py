@@ -1,16 +1,14 @@
-from .models import CartItem
+from .cart import get_cart_count
 
 def cart_processor(request):
     """
     Context processor that adds cart information to the template context.
     """
-    cart_count = 0
-    
-    if hasattr(request, 'session') and 'cart_id' in request.session:
-        session_id = request.session['cart_id']
-        cart_items = CartItem.objects.filter(session_id=session_id)
-        cart_count = sum(item.quantity for item in cart_items)
+    cart_count = getattr(request, 'cart_count', None)
+    if cart_count is None:
+        # Request that did not go through CartMiddleware
+        cart_count = get_cart_count(request)
     
     return {
         'cart_count': cart_count
-    }
\ No newline at end of file
+    }
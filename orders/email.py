@@ -1,44 +1,137 @@
+import uuid
+from datetime import timedelta
+
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import strip_tags
 
+from .models import OutboxEmail
+
+
+def outbox_email(subject, template, context, to):
+    html = render_to_string(template, context)
+    return OutboxEmail(
+        subject=subject,
+        body=strip_tags(html),
+        html_body=html,
+        from_email=settings.DEFAULT_FROM_EMAIL or "",
+        to=to,
+    )
+
 
-def send_order_emails(order):
+def queue_order_emails(order):
     """
-    Invia:
+    Mette in coda, nella transazione dell'ordine:
     - email di conferma al cliente
     - email di notifica al proprietario del sito
+    Le invia il worker dell'outbox (deliver_outbox).
     """
+    emails = [
+        outbox_email(
+            f"Conferma ordine #{order.id}",
+            "emails/order_confirmation.html",
+            {"order": order},
+            [order.email],
+        )
+    ]
+    if settings.SHOP_OWNER_EMAIL:
+        emails.append(
+            outbox_email(
+                f"Nuovo ordine ricevuto #{order.id}",
+                "emails/order_notification.html",
+                {"order": order},
+                [settings.SHOP_OWNER_EMAIL],
+            )
+        )
+    OutboxEmail.objects.bulk_create(emails)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: EMAIL_OUTBOX_RETRY_DELAY doubled per failed attempt."""
+    delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_DELAY_MAX))
+
 
-    # --- Email cliente ---
-    customer_subject = f"Conferma ordine #{order.id}"
-    customer_html = render_to_string("emails/order_confirmation.html", {
-        "order": order,
-    })
-    customer_text = strip_tags(customer_html)
-
-    send_mail(
-        subject=customer_subject,
-        message=customer_text,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[order.email],
-        html_message=customer_html,
-        fail_silently=False,
+def claim_due_emails(limit):
+    """
+    Take up to ``limit`` due emails for this worker. The UPDATE only claims
+    rows still due, so two workers never get the same email; the lease makes
+    it due again if this worker dies while sending.
+    """
+    now = timezone.now()
+    due = list(
+        OutboxEmail.objects.filter(next_attempt_at__lte=now)
+        .order_by("next_attempt_at", "id")
+        .values_list("pk", flat=True)[:limit]
     )
+    if not due:
+        return []
+    claim = uuid.uuid4().hex
+    OutboxEmail.objects.filter(pk__in=due, next_attempt_at__lte=now).update(
+        claim=claim,
+        next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE),
+    )
+    return list(OutboxEmail.objects.filter(claim=claim).order_by("id"))
+
+
+def deliver_outbox(limit=None):
+    """
+    Send the due emails of the outbox over one connection to the mail server.
+    Failed ones are retried with exponential backoff, up to
+    EMAIL_OUTBOX_MAX_ATTEMPTS attempts. Returns (sent, failed).
+    """
+    emails = claim_due_emails(limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # Server unreachable: every email counts as a failed attempt
+        opened, error = False, exc
+    else:
+        opened, error = True, None
+    try:
+        for email in emails:
+            if opened:
+                message = EmailMultiAlternatives(
+                    email.subject,
+                    email.body,
+                    email.from_email or None,
+                    email.to,
+                    connection=connection,
+                )
+                if email.html_body:
+                    message.attach_alternative(email.html_body, "text/html")
+                try:
+                    message.send()
+                except Exception as exc:
+                    error = exc
+                else:
+                    error = None
 
-    # --- Email proprietario ---
-    owner_subject = f"Nuovo ordine ricevuto #{order.id}"
-    owner_html = render_to_string("emails/order_notification.html", {
-        "order": order,
-    })
-    owner_text = strip_tags(owner_html)
-
-    send_mail(
-        subject=owner_subject,
-        message=owner_text,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[settings.SHOP_OWNER_EMAIL],
-        html_message=owner_html,
-        fail_silently=False,
-    )
\ No newline at end of file
+            email.attempts += 1
+            email.claim = ""
+            if error is None:
+                email.sent_at = timezone.now()
+                email.next_attempt_at = None
+                email.last_error = ""
+                sent += 1
+            else:
+                email.last_error = repr(error)
+                if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    email.next_attempt_at = None
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                failed += 1
+    finally:
+        if opened:
+            connection.close()
+        OutboxEmail.objects.bulk_update(
+            emails, ["attempts", "claim", "sent_at", "next_attempt_at", "last_error"]
+        )
+    return sent, failed
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cart import get_or_create_cart_id
+from .maintenance import delete_in_batches
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+# For the extend_schema of the views using @idempotent
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    HEADER,
+    OpenApiTypes.STR,
+    OpenApiParameter.HEADER,
+    description="Unique per operation: retries with the same key get the first response",
+)
+
+
+def request_scope(request):
+    # The same key from another cart, or for another endpoint, is another
+    # request. A client without a cart gets one here: the key must belong to
+    # someone, and a retry carrying the new cart cookie finds it again.
+    return f"{request.path}|{get_or_create_cart_id(request)}"
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def find_key(key, scope):
+    record = IdempotencyKey.objects.filter(key=key, scope=scope).first()
+    if record is not None and record.expires_at <= timezone.now():
+        # Not purged yet: as good as gone
+        record.delete()
+        return None
+    return record
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"error": f"{HEADER} already used for a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(method):
+    """
+    Make a DRF view method safe to retry with an Idempotency-Key header: the
+    first request runs in one transaction with the recording of its response,
+    and later ones with the same key get that response back without running
+    again. Keys are scoped to the endpoint and to the cart of the client,
+    which a client without one gets first. A concurrent duplicate waits on
+    the unique key until the first one commits. Server errors are not
+    recorded, so they can be retried; neither are non-DRF responses (the form
+    redirects), which simply run again.
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"error": f"{HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = request_scope(request)
+        fingerprint = request_fingerprint(request)
+        record = find_key(key, scope)
+        if record is not None:
+            return replay(record, fingerprint)
+
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key=key,
+                    scope=scope,
+                    fingerprint=fingerprint,
+                    expires_at=timezone.now()
+                    + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+                response = method(self, request, *args, **kwargs)
+                if response.status_code >= 500 or not isinstance(response, Response):
+                    record.delete()
+                else:
+                    record.status_code = response.status_code
+                    record.response = response.data
+                    record.save(update_fields=["status_code", "response"])
+        except IntegrityError:
+            # A duplicate sent at the same time got there first
+            record = find_key(key, scope)
+            if record is None or record.status_code is None:
+                raise
+            return replay(record, fingerprint)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(batch_size=None, pause=0):
+    """Delete expired idempotency keys in batches; returns (rows deleted, seconds)."""
+    started = time.perf_counter()
+    deleted = delete_in_batches(
+        IdempotencyKey.objects.filter(expires_at__lte=timezone.now()),
+        batch_size or settings.CART_SWEEP_BATCH_SIZE,
+        pause,
+    )
+    return deleted, time.perf_counter() - started
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from orders.models import CartItem
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0):
+    """
+    Delete the rows of ``queryset`` a batch of primary keys at a time, so a
+    large purge never holds one long lock on the table. Returns the number of
+    rows deleted.
+    """
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        count, _ = queryset.model._base_manager.filter(pk__in=pks).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def expired_cart_items(ttl):
+    """
+    Rows of carts nobody added to for ``ttl``: a cart that is still being
+    filled keeps its older rows too.
+    """
+    cutoff = timezone.now() - ttl
+    active = CartItem.objects.filter(date_added__gte=cutoff).values("session_id")
+    return CartItem.objects.filter(date_added__lt=cutoff).exclude(session_id__in=active)
+
+
+def sweep_expired_carts(ttl=None, batch_size=None, pause=0):
+    """Delete expired cart rows in batches; returns (rows deleted, seconds)."""
+    ttl = ttl or timedelta(days=settings.CART_TTL_DAYS)
+    started = time.perf_counter()
+    deleted = delete_in_batches(
+        expired_cart_items(ttl), batch_size or settings.CART_SWEEP_BATCH_SIZE, pause
+    )
+    return deleted, time.perf_counter() - started
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.CART_SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        deleted, elapsed = purge_expired_keys(options["batch_size"], options["pause"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys in {elapsed:.2f}s")
+        )
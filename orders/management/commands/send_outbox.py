@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from orders.email import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Send the due emails of the outbox, once or as a long-running worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, checking the outbox every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.EMAIL_OUTBOX_INTERVAL or 30,
+            help="Seconds between checks with --loop",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["interval"] <= 0:
+            raise CommandError("--batch-size and --interval must be positive")
+
+        while True:
+            sent, failed = self.drain(options["batch_size"])
+            if sent or failed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Sent {sent} emails, {failed} failed")
+                )
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
+
+    def drain(self, batch_size):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_outbox(batch_size)
+            total_sent += sent
+            total_failed += failed
+            if not sent:
+                return total_sent, total_failed
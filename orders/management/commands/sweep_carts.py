@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.maintenance import sweep_expired_carts
+
+
+class Command(BaseCommand):
+    help = "Delete the items of carts nobody added to for longer than the cart TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl-days",
+            type=float,
+            default=settings.CART_TTL_DAYS,
+            help="Age of the last addition after which a cart expires",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.CART_SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches",
+        )
+
+    def handle(self, *args, **options):
+        if options["ttl_days"] <= 0 or options["batch_size"] < 1:
+            raise CommandError("--ttl-days and --batch-size must be positive")
+
+        deleted, elapsed = sweep_expired_carts(
+            timedelta(days=options["ttl_days"]), options["batch_size"], options["pause"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired cart items in {elapsed:.2f}s")
+        )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.reservations import sweep_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete the product reservations of carts whose hold has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.CART_SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        deleted, elapsed = sweep_expired_reservations(options["batch_size"], options["pause"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired reservations in {elapsed:.2f}s")
+        )
@@ -1,4 +1,4 @@
-from orders.models import CartItem
+from orders.cart import get_cart_count
 
 class CartMiddleware:
     def __init__(self, get_response):
@@ -6,14 +6,11 @@ class CartMiddleware:
 
     def __call__(self, request):
         # Code to be executed for each request before the view is called
-        if hasattr(request, 'session') and 'cart_id' in request.session:
-            session_id = request.session['cart_id']
-            cart_items = CartItem.objects.filter(session_id=session_id)
-            request.session['cart_items'] = sum(item.quantity for item in cart_items)
-        else:
-            request.session['cart_items'] = 0
+        # The count lives in the session; CartItem is only queried to rebuild
+        # it when it went missing
+        request.cart_count = get_cart_count(request)
 
         response = self.get_response(request)
         
         # Code to be executed for each request/response after the view is called
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('orders', 'CartItem')
+    kept = {}
+    for item in CartItem.objects.order_by('id'):
+        key = (item.session_id, item.product_id)
+        if key in kept:
+            kept[key].quantity += item.quantity
+            kept[key].save(update_fields=['quantity'])
+            item.delete()
+        else:
+            kept[key] = item
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_remove_orderitem_quantity_order_confirmed_and_more'),
+        ('product', '0018_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='session_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('session_id', 'product'), name='unique_cart_item_per_session'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartitem',
+            name='date_added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
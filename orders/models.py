@@ -1,11 +1,53 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from product.models import Product
+from django.db.models import F, OuterRef, Subquery, Sum, Window
+from django.utils import timezone
+from product.models import Product, ProductImage
+
+def first_image(product_ref):
+    """Subquery on the first image of the product ``product_ref`` points to."""
+    return (
+        ProductImage.objects.filter(product=OuterRef(product_ref))
+        .order_by('id')
+        .values('image')[:1]
+    )
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_summary(self):
+        """
+        Cart rows with their product, first image, line total and the cart
+        totals (repeated on every row), all in one query.
+        """
+        line_total = F('product__price') * F('quantity')
+        return (
+            self.select_related('product')
+            .annotate(
+                first_image=Subquery(first_image('product')),
+                line_total=line_total,
+                cart_items=Window(Sum('quantity')),
+                cart_total=Window(Sum(line_total)),
+            )
+            .order_by('id')
+        )
+
 
 class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     session_id = models.CharField(max_length=255)
-    date_added = models.DateTimeField(auto_now_add=True)
+    # Indexed for the expired cart sweep (sweep_carts)
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One row per product in a cart; also serves the session_id lookups
+            models.UniqueConstraint(
+                fields=['session_id', 'product'], name='unique_cart_item_per_session'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.quantity} x {self.product.title}"
@@ -14,12 +56,27 @@ class CartItem(models.Model):
     def total_price(self):
         return self.product.price * self.quantity
 
+class Reservation(models.Model):
+    """
+    A product held for the cart of ``session_id`` until ``expires_at``: every
+    product is one of a kind, so only one cart can hold it at a time.
+    """
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='reservation')
+    session_id = models.CharField(max_length=255, db_index=True)
+    # Indexed for the expired reservation sweep (sweep_reservations)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product_id} held by {self.session_id} until {self.expires_at}"
+
 class Order(models.Model):
     email = models.EmailField()
     label = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     created_date = models.DateTimeField(auto_now_add=True)
-    session_id = models.CharField(max_length=255)
+    session_id = models.CharField(max_length=255, db_index=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     confirmed = models.BooleanField(default=False)
     
@@ -39,4 +96,52 @@ class OrderItem(models.Model):
     
     @property
     def total_price(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent by the outbox worker (orders.email.deliver_outbox),
+    written in the same transaction as what it is about.
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When to try next; null once sent or given up
+    next_attempt_at = models.DateTimeField(null=True, db_index=True, default=timezone.now)
+    # Worker currently sending it, until its lease runs out
+    claim = models.CharField(max_length=32, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a request sent with an Idempotency-Key header, replayed
+    to retries of the same request until ``expires_at``.
+    """
+
+    key = models.CharField(max_length=255)
+    # Endpoint and cart the key was used for
+    scope = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Indexed for the purge (purge_idempotency_keys)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'scope'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
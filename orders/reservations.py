@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .maintenance import delete_in_batches
+from .models import Reservation
+
+
+def enabled():
+    return settings.CART_RESERVATION_MINUTES > 0
+
+
+def reserve(session_id, product_ids):
+    """
+    Hold ``product_ids`` for the cart of ``session_id`` for
+    CART_RESERVATION_MINUTES, renewing the holds it already has and taking
+    over expired ones. Three statements whatever the number of products, all
+    on the unique product index. Returns the ids of the products another cart
+    holds, which are left alone.
+    """
+    product_ids = list(product_ids)
+    if not enabled() or not product_ids:
+        return []
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=settings.CART_RESERVATION_MINUTES)
+    with transaction.atomic():
+        Reservation.objects.filter(product_id__in=product_ids).filter(
+            Q(session_id=session_id) | Q(expires_at__lte=now)
+        ).update(session_id=session_id, expires_at=expires_at)
+        # Those not reserved at all; a concurrent insert wins and shows up below
+        Reservation.objects.bulk_create(
+            [
+                Reservation(product_id=pk, session_id=session_id, expires_at=expires_at)
+                for pk in product_ids
+            ],
+            ignore_conflicts=True,
+        )
+        return held_by_others(session_id, product_ids)
+
+
+def held_by_others(session_id, product_ids):
+    """The ids among ``product_ids`` that another cart holds right now."""
+    if not enabled():
+        return []
+    return list(
+        Reservation.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+        .exclude(session_id=session_id)
+        .values_list("product_id", flat=True)
+    )
+
+
+def release(session_id, product_codes=None):
+    """Drop the holds of ``session_id``, all of them or on ``product_codes``."""
+    reservations = Reservation.objects.filter(session_id=session_id)
+    if product_codes is not None:
+        reservations = reservations.filter(product__code__in=product_codes)
+    reservations.delete()
+
+
+def sweep_expired_reservations(batch_size=None, pause=0):
+    """Delete expired reservations in batches; returns (rows deleted, seconds)."""
+    started = time.perf_counter()
+    deleted = delete_in_batches(
+        Reservation.objects.filter(expires_at__lte=timezone.now()),
+        batch_size or settings.CART_SWEEP_BATCH_SIZE,
+        pause,
+    )
+    return deleted, time.perf_counter() - started
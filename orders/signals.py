@@ -1,42 +1,72 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
+from django.utils import timezone
+from product.models import Product
+from product.signals import send_catalog_changed
 from .models import Order, OrderItem
 
+def set_products_available(product_ids, available):
+    # One UPDATE for all the products; updated_at by hand since it bypasses
+    # save(), and a single catalog_changed instead of one save per product
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    with transaction.atomic():
+        Product.objects.filter(pk__in=product_ids).update(
+            is_available=available, updated_at=timezone.now()
+        )
+        send_catalog_changed(Product, product_ids)
+
+def order_product_ids(order):
+    return order.items.values_list('product_id', flat=True)
+
+@receiver(post_init, sender=Order)
+def remember_confirmed(sender, instance, **kwargs):
+    # The value as loaded, so saving needs no query to spot a transition;
+    # None if the field was deferred
+    instance._loaded_confirmed = instance.__dict__.get('confirmed')
+
 @receiver(pre_save, sender=Order)
-def track_order_confirmation_change(sender, instance, **kwargs):
-    if instance.pk:
-        previous_order = Order.objects.get(pk=instance.pk)
-        instance._previous_confirmed = previous_order.confirmed
-    else:
-        instance._previous_confirmed = False
+def load_deferred_confirmed(sender, instance, **kwargs):
+    # Loaded without the field but assigned since: the stored value, read
+    # before this save overwrites it, is the one to compare with
+    if (
+        instance._loaded_confirmed is None
+        and not instance._state.adding
+        and 'confirmed' in instance.__dict__
+    ):
+        instance._loaded_confirmed = Order.objects.filter(pk=instance.pk).values_list(
+            'confirmed', flat=True
+        ).first()
 
 @receiver(post_save, sender=Order)
 def handle_order_confirmation(sender, instance, created, **kwargs):
-    # Handle transition transitions
-    previous_confirmed = getattr(instance, '_previous_confirmed', False)
-    
+    if 'confirmed' not in instance.__dict__:
+        # Still deferred: this save did not write it
+        return
+    previous_confirmed = False if created else bool(instance._loaded_confirmed)
+    instance._loaded_confirmed = instance.confirmed
+
     if instance.confirmed and not previous_confirmed:
         # Order just became confirmed: mark products as unavailable
-        for item in instance.items.all():
-            item.product.is_available = False
-            item.product.save()
+        set_products_available(order_product_ids(instance), False)
     elif not instance.confirmed and previous_confirmed:
         # Order was confirmed and now is unconfirmed: mark products as available
-        for item in instance.items.all():
-            item.product.is_available = True
-            item.product.save()
+        set_products_available(order_product_ids(instance), True)
 
-@receiver(post_delete, sender=Order)
+@receiver(pre_delete, sender=Order)
 def handle_order_deletion(sender, instance, **kwargs):
-    # If a confirmed order is deleted, mark its products as available
+    # If a confirmed order is deleted, mark its products as available. Done
+    # before the items are gone, for all of them at once.
     if instance.confirmed:
-        for item in instance.items.all():
-            item.product.is_available = True
-            item.product.save()
+        set_products_available(order_product_ids(instance), True)
 
 @receiver(post_delete, sender=OrderItem)
-def handle_order_item_deletion(sender, instance, **kwargs):
+def handle_order_item_deletion(sender, instance, origin=None, **kwargs):
+    # Part of deleting the whole order: handled above
+    if isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        return
     # if an item is removed from a confirmed order, mark it as available
     if instance.order.confirmed:
-        instance.product.is_available = True
-        instance.product.save()
+        set_products_available([instance.product_id], True)
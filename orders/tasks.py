@@ -0,0 +1,109 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from orders.email import deliver_outbox
+from orders.idempotency import purge_expired_keys
+from orders.maintenance import sweep_expired_carts
+from orders.reservations import sweep_expired_reservations
+
+logger = logging.getLogger(__name__)
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+_outbox_worker = None
+_outbox_wake = threading.Event()
+_outbox_lock = threading.Lock()
+
+
+def run_cart_sweeper(interval, stop):
+    while not stop.wait(interval):
+        try:
+            deleted, elapsed = sweep_expired_carts()
+            if deleted:
+                logger.info("Deleted %d expired cart items in %.2fs", deleted, elapsed)
+            deleted, elapsed = sweep_expired_reservations()
+            if deleted:
+                logger.info("Deleted %d expired reservations in %.2fs", deleted, elapsed)
+            deleted, elapsed = purge_expired_keys()
+            if deleted:
+                logger.info("Deleted %d expired idempotency keys in %.2fs", deleted, elapsed)
+        except Exception:
+            logger.exception("Expired cart sweep failed")
+        finally:
+            close_old_connections()
+
+
+def start_cart_sweeper():
+    """
+    Sweep expired carts, reservations and idempotency keys every
+    CART_SWEEP_INTERVAL seconds in a daemon thread of this worker. Off when
+    the interval is 0, e.g. when a cron job runs sweep_carts,
+    sweep_reservations and purge_idempotency_keys instead. Returns the event that stops the thread.
+    """
+    global _sweeper
+    interval = settings.CART_SWEEP_INTERVAL
+    if not interval:
+        return None
+    with _sweeper_lock:
+        if _sweeper is None:
+            stop = threading.Event()
+            thread = threading.Thread(
+                target=run_cart_sweeper, args=(interval, stop), name="cart-sweeper", daemon=True
+            )
+            thread.start()
+            _sweeper = stop
+        return _sweeper
+
+
+def run_outbox_worker(interval, stop, wake):
+    while not stop.is_set():
+        wake.wait(interval)
+        wake.clear()
+        if stop.is_set():
+            break
+        try:
+            # Drain the backlog, not just one batch
+            while True:
+                sent, failed = deliver_outbox()
+                if sent or failed:
+                    logger.info("Outbox: %d emails sent, %d failed", sent, failed)
+                if not sent:
+                    break
+        except Exception:
+            logger.exception("Outbox delivery failed")
+        finally:
+            close_old_connections()
+
+
+def wake_outbox_worker():
+    """Have this worker's outbox thread send right away, e.g. after a checkout."""
+    _outbox_wake.set()
+
+
+def start_outbox_worker():
+    """
+    Send the email outbox every EMAIL_OUTBOX_INTERVAL seconds, and whenever
+    woken, in a daemon thread of this worker. Off when the interval is 0, e.g.
+    when send_outbox runs as its own process instead. Returns the event that
+    stops the thread.
+    """
+    global _outbox_worker
+    interval = settings.EMAIL_OUTBOX_INTERVAL
+    if not interval:
+        return None
+    with _outbox_lock:
+        if _outbox_worker is None:
+            stop = threading.Event()
+            thread = threading.Thread(
+                target=run_outbox_worker,
+                args=(interval, stop, _outbox_wake),
+                name="email-outbox",
+                daemon=True,
+            )
+            thread.start()
+            _outbox_worker = stop
+        return _outbox_worker
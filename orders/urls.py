@@ -6,8 +6,10 @@ urlpatterns = [
     path('', views.CartView.as_view(), name='cart-api'),
     path('<int:code>/', views.ProductDetailView, name='product-detail'),
     path('add/', views.AddToCartView.as_view(), name='add-to-cart-api'),
+    path('add-batch/', views.AddManyToCartView.as_view(), name='add-many-to-cart-api'),
     path('remove/', views.RemoveFromCartView.as_view(), name='remove-from-cart-api'),
     path('make-checkout/', views.CheckoutView.as_view(), name='checkout-api'),
+    path('orders/confirm/', views.ConfirmOrdersView.as_view(), name='confirm-orders-api'),
     path('summary/', views.CartPageView, name='summary'),
     path('checkout/', views.CheckoutPageView, name='checkout'),
 ]
@@ -1,25 +1,27 @@
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from drf_spectacular.utils import extend_schema
+from django.db import transaction
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import ensure_csrf_cookie
 from product.models import Product, ProductImage
-from .models import CartItem, Order, OrderItem
-from .email import send_order_emails
+from .checkout import EmptyCart, ProductsUnavailable, place_order
+from .confirmation import set_orders_confirmed
+from .idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from . import reservations
+from .cart import (
+    adjust_cart_count,
+    get_cart_id,
+    get_or_create_cart_id,
+    rebuild_cart_count,
+    set_cart_count,
+)
+from .cart_backends import empty_summary, get_cart_backend
 from django.conf import settings
 
 
-# Utility function to get or create a cart session ID
-def get_or_create_cart_id(request):
-    if "cart_id" not in request.session or request.session["cart_id"] is None:
-        request.session["cart_id"] = (
-            request.session.session_key or request.session.create()
-        )
-    return request.session["cart_id"]
-
-
 class CartView(APIView):
     permission_classes = [AllowAny]
 
@@ -28,34 +30,15 @@ class CartView(APIView):
         description="Get the current cart contents",
     )
     def get(self, request):
-        session_id = get_or_create_cart_id(request)
-        cart_items = CartItem.objects.filter(session_id=session_id)
-
-        # Calculate cart totals
-        total_items = sum(item.quantity for item in cart_items)
-        total_price = sum(item.total_price for item in cart_items)
-
-        # Prepare cart items data
-        items = []
-        for item in cart_items:
-            images = ProductImage.objects.filter(product=item.product)
-            product_data = {
-                "id": item.product.id,
-                "code": item.product.code,
-                "title": item.product.title,
-                "price": item.product.price,
-                "penalty": item.product.penalty,
-                "quantity": item.quantity,
-                "total": item.total_price,
-                "image": images.first().image if images.exists() else None,
-            }
-            items.append(product_data)
-
-        cart_data = {
-            "items": items,
-            "total_items": total_items,
-            "total_price": total_price,
-        }
+        # Looking at an empty cart must not create a session
+        session_id = get_cart_id(request)
+        if not session_id:
+            return Response(empty_summary(), status=status.HTTP_200_OK)
+
+        cart_data = get_cart_backend().summary(session_id)
+
+        # Keep the counter read by CartMiddleware in line with the cart
+        set_cart_count(request, cart_data["total_items"])
 
         return Response(cart_data, status=status.HTTP_200_OK)
 
@@ -71,9 +54,15 @@ class AddToCartView(APIView):
                 "quantity": {"type": "integer", "default": 1},
             },
         },
-        responses={200: "Product added to cart", 404: "Product not found"},
-        description="Add a product to the cart",
+        responses={
+            200: "Product added to cart",
+            404: "Product not found",
+            409: "Product reserved by another customer",
+        },
+        description="Add a product to the cart, holding it for a while",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
     )
+    @idempotent
     def post(self, request):
         if request.data:
             product_code = request.data.get("product_code")
@@ -89,24 +78,40 @@ class AddToCartView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            product = Product.objects.get(code=product_code)
-        except Product.DoesNotExist:
+        if quantity < 1:
             return Response(
-                {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
+                {"error": "Quantity must be positive"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        session_id = get_or_create_cart_id(request)
-
-        print("Session ID:", session_id)
-
-        # Check if product already in cart
-        item, created = CartItem.objects.get_or_create(
-            product=product, session_id=session_id, defaults={"quantity": quantity}
+        cart = get_cart_backend()
+        session_id = get_cart_id(request)
+        holds = reservations.enabled()
+        # Already in the cart and no hold to renew: incremented without
+        # looking up the product
+        added = (
+            not holds
+            and session_id is not None
+            and cart.increment(session_id, product_code, quantity)
         )
-        if not created:
-            item.quantity += quantity
-            item.save()
+        if not added:
+            try:
+                product = Product.objects.get(code=product_code)
+            except Product.DoesNotExist:
+                return Response(
+                    {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            session_id = get_or_create_cart_id(request)
+            # Renewed for a line already in the cart too: its hold may have
+            # expired and gone to another cart in the meantime
+            if reservations.reserve(session_id, [product.pk]):
+                return Response(
+                    {"error": "Product is reserved by another customer"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if not (holds and cart.increment(session_id, product_code, quantity)):
+                cart.add(session_id, product, quantity)
+        adjust_cart_count(request, quantity)
 
         if is_api_call:
             return Response(
@@ -117,6 +122,96 @@ class AddToCartView(APIView):
             return redirect("product_detail", product_code=product_code)
 
 
+class AddManyToCartView(APIView):
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        request={
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "product_code": {"type": "string"},
+                            "quantity": {"type": "integer", "default": 1},
+                        },
+                    },
+                },
+            },
+        },
+        responses={
+            200: "Products added to cart",
+            400: "Invalid items",
+            404: "Products not found",
+            409: "Products reserved by another customer",
+        },
+        description="Add several products to the cart in one transaction",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+    )
+    @idempotent
+    def post(self, request):
+        items = request.data.get("items")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "items must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Quantities per product code, repeated codes added up
+        requested = {}
+        for item in items:
+            try:
+                product_code = str(item["product_code"])
+                quantity = int(item.get("quantity", 1))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return Response(
+                    {"error": "Each item needs a product_code and an integer quantity"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if quantity < 1:
+                return Response(
+                    {"error": "Quantity must be positive"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            requested[product_code] = requested.get(product_code, 0) + quantity
+
+        product_ids = dict(
+            Product.objects.filter(code__in=requested).values_list("code", "id")
+        )
+        missing = [code for code in requested if code not in product_ids]
+        if missing:
+            return Response(
+                {"error": "Products not found", "missing": missing},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        session_id = get_or_create_cart_id(request)
+        with transaction.atomic():
+            held = set(reservations.reserve(session_id, product_ids.values()))
+            if held:
+                # Nothing is added, so the holds just taken on the other
+                # products are rolled back rather than left to expire
+                transaction.set_rollback(True)
+        if held:
+            return Response(
+                {
+                    "error": "Products reserved by another customer",
+                    "reserved": [code for code, pk in product_ids.items() if pk in held],
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        get_cart_backend().add_many(session_id, product_ids, requested)
+        added = sum(requested.values())
+        adjust_cart_count(request, added)
+
+        return Response(
+            {"message": "Products added to cart", "quantity": added},
+            status=status.HTTP_200_OK,
+        )
+
+
 class RemoveFromCartView(APIView):
     permission_classes = [AllowAny]
 
@@ -131,23 +226,23 @@ class RemoveFromCartView(APIView):
         },
         responses={200: "Product removed from cart", 404: "Product not found in cart"},
         description="Remove a product from the cart",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
     )
+    @idempotent
     def post(self, request):
         product_code = request.data.get("product_code")
-        session_id = get_or_create_cart_id(request)
-        print("Session ID:", session_id)
-        print("Product Code:", product_code)
+        session_id = get_cart_id(request)
 
-        try:
-            product = Product.objects.get(code=product_code)
-            print("Product:", product)
-            cart_item = CartItem.objects.get(product=product, session_id=session_id)
-        except (Product.DoesNotExist, CartItem.DoesNotExist):
+        removed = None
+        if session_id:
+            removed = get_cart_backend().remove(session_id, product_code)
+            reservations.release(session_id, [product_code])
+        if removed is None:
             return Response(
                 {"error": "Product not found in cart"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        cart_item.delete()
+        adjust_cart_count(request, -removed)
 
         return Response(
             {"message": "Product removed from cart"}, status=status.HTTP_200_OK
@@ -162,9 +257,15 @@ class CheckoutView(APIView):
             "type": "object",
             "properties": {"email": {"type": "string", "format": "email"}},
         },
-        responses={200: "Order placed successfully", 400: "Invalid data or empty cart"},
+        responses={
+            200: "Order placed successfully",
+            400: "Invalid data or empty cart",
+            409: "Products no longer available",
+        },
         description="Complete the order with customer email",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
     )
+    @idempotent
     def post(self, request):
         email = request.data.get("email")
         if not email:
@@ -172,33 +273,27 @@ class CheckoutView(APIView):
                 {"error": "Email is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        session_id = get_or_create_cart_id(request)
-        cart_items = CartItem.objects.filter(session_id=session_id)
-
-        if not cart_items.exists():
+        session_id = get_cart_id(request)
+        if not session_id:
             return Response(
                 {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Calculate total
-        total = sum(item.total_price for item in cart_items)
-
-        # Create order
-        order = Order.objects.create(email=email, session_id=session_id, total=total)
-
-        # Send order emails
-        send_order_emails(order)
-
-        # Create order items
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                price=item.product.price,
+        try:
+            order = place_order(get_cart_backend(), session_id, email)
+        except EmptyCart:
+            return Response(
+                {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        except ProductsUnavailable as exc:
+            # The lines of deleted products were dropped from the cart
+            rebuild_cart_count(request)
+            return Response(
+                {"error": "Some products are no longer available", "unavailable": exc.codes},
+                status=status.HTTP_409_CONFLICT,
             )
 
-        # Clear cart
-        cart_items.delete()
+        set_cart_count(request, 0)
 
         return Response(
             {
@@ -210,6 +305,41 @@ class CheckoutView(APIView):
         )
 
 
+class ConfirmOrdersView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        request={
+            "type": "object",
+            "properties": {
+                "order_ids": {"type": "array", "items": {"type": "integer"}},
+                "confirmed": {"type": "boolean", "default": True},
+            },
+        },
+        responses={200: "Orders updated", 400: "Invalid data"},
+        description="Confirm or unconfirm several orders in one transaction",
+    )
+    def post(self, request):
+        order_ids = request.data.get("order_ids")
+        confirmed = request.data.get("confirmed", True)
+        if (
+            not isinstance(order_ids, list)
+            or not order_ids
+            or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in order_ids)
+            or not isinstance(confirmed, bool)
+        ):
+            return Response(
+                {"error": "order_ids must be a non-empty list of ids, confirmed a boolean"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        orders, products = set_orders_confirmed(order_ids, confirmed)
+
+        return Response(
+            {"orders": orders, "products": products}, status=status.HTTP_200_OK
+        )
+
+
 @extend_schema(exclude=True)
 @ensure_csrf_cookie
 def CartPageView(request):
@@ -1,6 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from . import models as product_models
+from . import barcodes, sheets, models as product_models
 from django.conf import settings
 import os
 from django_admin_multi_select_filter.filters import MultiSelectRelatedFieldListFilter
@@ -71,7 +71,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     def admin_barcode_actions(self, obj):
         import urllib.parse
-        download_url = f"/products/barcode/{obj.code}/"
+        download_url = f"/products/barcode/{obj.code}/?v={barcodes.options_digest()}"
         print_url = f"/products/print/?code={obj.code}&print=true"
         return format_html(
             '<a class="button" href="{}" download="{}_barcode.png" style="margin-right: 5px;">Download</a>'
@@ -84,11 +84,18 @@ class ProductAdmin(admin.ModelAdmin):
     admin_barcode_actions.short_description = 'Barcode Actions'
 
     def print_selected_barcodes(self, request, queryset):
-        from django.http import HttpResponseRedirect
-        # We will build the URL for the print page with the selected product IDs
-        ids = ",".join([str(obj.id) for obj in queryset])
-        url = f"/products/print/?ids={ids}&print=true"
-        return HttpResponseRedirect(url)
+        # One server-side PDF with every selected label
+        products = queryset.order_by('id').only('code', 'title')
+        invalid = sheets.unencodable_codes(products)
+        if invalid:
+            self.message_user(
+                request,
+                'Codes that cannot be printed as barcodes: '
+                + ', '.join(repr(code) for code in invalid),
+                messages.ERROR,
+            )
+            return None
+        return sheets.sheet_response(products, 'pdf', sheets.SheetLayout.from_params({}))
 
     print_selected_barcodes.short_description = 'Print Selected Barcodes'
 
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductConfig(AppConfig):
@@ -7,3 +8,6 @@ class ProductConfig(AppConfig):
 
     def ready(self):
         import product.signals
+        from product.cards import fill_empty_product_cards
+
+        post_migrate.connect(fill_empty_product_cards, sender=self)
@@ -0,0 +1,229 @@
+import heapq
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from product.cache import catalog_version
+from product.models import Product
+
+FIELDS = ("pk", "code", "title", "description", "is_available")
+# Candidates sharing the most trigrams with a misspelled query
+FUZZY_CANDIDATES = 50
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+class TrieNode:
+    __slots__ = ("children", "pks")
+
+    def __init__(self):
+        self.children = {}
+        self.pks = set()
+
+
+class AutocompleteIndex:
+    """
+    In-process index of product titles for the search box: a prefix trie on
+    the lowercased title plus trigram postings on title and description.
+    Results keep the ranking of ProductSearchView (title prefix, title,
+    description) and are followed by fuzzy title matches.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self._reset()
+
+    def _reset(self):
+        self.entries = {}
+        self.root = TrieNode()
+        self.title_postings = defaultdict(set)
+        self.description_postings = defaultdict(set)
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def load(self):
+        with self.lock:
+            version = catalog_version()
+            self._reset()
+            for row in Product.objects.values(*FIELDS).iterator(chunk_size=2000):
+                self._add(row)
+            self.version = version
+
+    def refresh(self, product_ids, previous, version):
+        """
+        Apply the change of ``product_ids`` that took the catalog from
+        ``previous`` to ``version`` (see catalog_version_change).
+        """
+        with self.lock:
+            if not self.loaded or self.version == version:
+                return
+            if self.version != previous:
+                # Another process changed the catalog since the last load
+                self.load()
+                return
+            rows = {
+                row["pk"]: row
+                for row in Product.objects.filter(pk__in=product_ids).values(*FIELDS)
+            }
+            for pk in product_ids:
+                self._remove(pk)
+                if pk in rows:
+                    self._add(rows[pk])
+            self.version = version
+
+    def _add(self, row):
+        title = row["title"].lower()
+        description = (row["description"] or "").lower()
+        self.entries[row["pk"]] = (row, title, description)
+
+        node = self.root
+        for char in title:
+            node = node.children.setdefault(char, TrieNode())
+        node.pks.add(row["pk"])
+        for gram in trigrams(title):
+            self.title_postings[gram].add(row["pk"])
+        for gram in trigrams(description):
+            self.description_postings[gram].add(row["pk"])
+
+    def _remove(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        _, title, description = entry
+
+        path = [self.root]
+        for char in title:
+            path.append(path[-1].children[char])
+        path[-1].pks.discard(pk)
+        # Prune the branches left empty
+        for depth in range(len(title), 0, -1):
+            node = path[depth]
+            if node.pks or node.children:
+                break
+            del path[depth - 1].children[title[depth - 1]]
+
+        for gram in trigrams(title):
+            self._discard(self.title_postings, gram, pk)
+        for gram in trigrams(description):
+            self._discard(self.description_postings, gram, pk)
+
+    @staticmethod
+    def _discard(postings, gram, pk):
+        pks = postings.get(gram)
+        if pks is not None:
+            pks.discard(pk)
+            if not pks:
+                del postings[gram]
+
+    def _prefix_matches(self, query):
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        found, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            found |= node.pks
+            stack.extend(node.children.values())
+        return found
+
+    def _contains(self, query, postings, field):
+        grams = trigrams(query)
+        if grams:
+            candidates = set.intersection(*(postings.get(g, set()) for g in grams))
+        else:
+            # Too short for trigrams
+            candidates = self.entries.keys()
+        return {pk for pk in candidates if query in self.entries[pk][field]}
+
+    def _fuzzy_matches(self, query, exclude):
+        overlap = Counter()
+        for gram in trigrams(query):
+            for pk in self.title_postings.get(gram, ()):
+                if pk not in exclude:
+                    overlap[pk] += 1
+        max_distance = 1 if len(query) <= 5 else 2
+
+        matches = {}
+        for pk, _ in overlap.most_common(FUZZY_CANDIDATES):
+            title = self.entries[pk][1]
+            words = title.split() + [title[: len(query)]]
+            distance = min(edit_distance(query, word) for word in words)
+            if distance <= max_distance:
+                matches[pk] = distance
+        return matches
+
+    def search(self, query, limit):
+        query = query.strip().lower()
+        with self.lock:
+            # The version is shared through the database: a change made by any
+            # worker or management command shows up here
+            if not self.loaded or self.version != catalog_version():
+                self.load()
+
+            results, seen = [], set()
+
+            def take(pks, key):
+                for pk in heapq.nsmallest(limit - len(results), pks - seen, key=key):
+                    seen.add(pk)
+                    results.append(self.entries[pk][0])
+
+            by_title = lambda pk: (self.entries[pk][0]["title"], self.entries[pk][0]["code"])
+            for matcher in (
+                lambda: self._prefix_matches(query),
+                lambda: self._contains(query, self.title_postings, 1),
+                lambda: self._contains(query, self.description_postings, 2),
+            ):
+                if len(results) == limit:
+                    break
+                take(matcher(), by_title)
+
+            if len(results) < limit and len(query) >= 3:
+                distances = self._fuzzy_matches(query, seen)
+                take(set(distances), lambda pk: (distances[pk], *by_title(pk)))
+
+        return [
+            {field: row[field] for field in FIELDS if field != "pk"} for row in results
+        ]
+
+
+index = AutocompleteIndex()
+
+
+def enabled():
+    return settings.PRODUCT_AUTOCOMPLETE_INDEX
+
+
+def warm_up():
+    """Load the index when a worker starts, if it is enabled."""
+    if not enabled():
+        return
+    try:
+        index.load()
+    except DatabaseError:
+        # Database not migrated yet: the first search loads it
+        pass
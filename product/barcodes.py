@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, NamedTuple
+
+from barcode import Code128
+from barcode.errors import BarcodeError
+from barcode.writer import ImageWriter, SVGWriter
+from django.conf import settings
+
+from product.conditional import make_etag
+
+BARCODE_DIR = "uploads/barcodes"
+DEFAULT_FORMAT = "png"
+# python-barcode's own defaults, used to size ZPL labels
+DEFAULT_MODULE_WIDTH_MM = 0.2
+DEFAULT_MODULE_HEIGHT_MM = 15.0
+
+
+# What Code128 raises for a code it cannot encode: IndexError when it is
+# empty, IllegalCharacterError for characters outside Code 128 such as "è"
+ENCODER_ERRORS = (BarcodeError, IndexError)
+
+
+def encodable(code):
+    try:
+        Code128(str(code)).build()
+    except ENCODER_ERRORS:
+        return False
+    return True
+
+
+def writer_options():
+    return dict(settings.BARCODE_WRITER_OPTIONS)
+
+
+def options_digest(options=None):
+    options = writer_options() if options is None else options
+    return hashlib.sha1(
+        json.dumps(options, sort_keys=True).encode(), usedforsecurity=False
+    ).hexdigest()[:12]
+
+
+def barcode_name(code, options=None, fmt=DEFAULT_FORMAT):
+    """Storage name of the barcode of ``code``, unique per code, options and format."""
+    # A hash of the code as it is: no two codes can share a file, whatever
+    # characters they contain
+    code_digest = hashlib.sha1(str(code).encode(), usedforsecurity=False).hexdigest()
+    return f"{BARCODE_DIR}/{code_digest}-{options_digest(options)}.{fmt}"
+
+
+def barcode_etag(code, options=None, fmt=DEFAULT_FORMAT):
+    return make_etag("barcode", code, options_digest(options), fmt)
+
+
+def render_png(code, options):
+    buffer = BytesIO()
+    Code128(str(code), writer=ImageWriter()).write(buffer, options=options)
+    return buffer.getvalue()
+
+
+def render_svg(code, options):
+    return Code128(str(code), writer=SVGWriter()).render(options)
+
+
+def zpl_field(text):
+    # ^FH_ lets the field carry ^ and ~, which ZPL would read as commands
+    return str(text).replace("_", "_5F").replace("^", "_5E").replace("~", "_7E")
+
+
+def zpl_label(code, options, title=None):
+    """ZPL for one Code 128 label: the printer draws it, nothing is rendered here."""
+    dots_per_mm = settings.BARCODE_ZPL_DPI / 25.4
+    module = max(1, round(options.get("module_width", DEFAULT_MODULE_WIDTH_MM) * dots_per_mm))
+    height = round(options.get("module_height", DEFAULT_MODULE_HEIGHT_MM) * dots_per_mm)
+    interpretation = "Y" if options.get("write_text", True) else "N"
+    lines = [
+        "^XA",
+        "^CI28",
+        f"^FO20,20^BY{module}^BCN,{height},{interpretation},N,N^FH_^FD{zpl_field(code)}^FS",
+    ]
+    if title:
+        lines.append(f"^FO20,{height + 70}^A0N,24,24^FH_^FD{zpl_field(title)}^FS")
+    lines.append("^XZ")
+    return "\n".join(lines) + "\n"
+
+
+def render_zpl(code, options):
+    return zpl_label(code, options).encode()
+
+
+class BarcodeFormat(NamedTuple):
+    content_type: str
+    render: Callable
+    # Kept under MEDIA_ROOT too; ZPL is cheaper to build than to read back
+    persist: bool
+
+
+FORMATS = {
+    "png": BarcodeFormat("image/png", render_png, True),
+    "svg": BarcodeFormat("image/svg+xml", render_svg, True),
+    "zpl": BarcodeFormat("application/zpl", render_zpl, False),
+}
+
+
+def accept_quality(accept, content_type):
+    """
+    The q-value ``accept`` gives ``content_type``, from its most specific
+    matching media range (exact, then ``type/*``, then ``*/*``); 0 if none.
+    """
+    main_type = content_type.split("/")[0]
+    best = (-1, 0.0)
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if media_type == content_type:
+            specificity = 2
+        elif media_type == f"{main_type}/*":
+            specificity = 1
+        elif media_type == "*/*":
+            specificity = 0
+        else:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        best = max(best, (specificity, quality))
+    return best[1]
+
+
+def negotiate_format(request):
+    """
+    ``?format=`` when given, otherwise PNG unless Accept prefers another
+    format over it. Browsers list image/svg+xml next to image/* in the Accept
+    of every <img>, which ties with PNG and so keeps PNG.
+    """
+    requested = request.GET.get("format")
+    if requested:
+        return requested if requested in FORMATS else None
+    accept = request.headers.get("Accept", "")
+    best = DEFAULT_FORMAT
+    best_quality = accept_quality(accept, FORMATS[DEFAULT_FORMAT].content_type)
+    for fmt, barcode_format in FORMATS.items():
+        quality = accept_quality(accept, barcode_format.content_type)
+        if quality > best_quality:
+            best, best_quality = fmt, quality
+    return best
+
+
+def render_barcode(code, options=None, fmt=DEFAULT_FORMAT):
+    options = writer_options() if options is None else options
+    return FORMATS[fmt].render(code, options)
+
+
+def write_file(name, data):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, so readers never see half a file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def ensure_barcode_file(code, options=None):
+    """Render the barcode of ``code`` to MEDIA_ROOT unless already there."""
+    name = barcode_name(code, options)
+    if not os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+        write_file(name, render_barcode(code, options))
+    return name
+
+
+class BarcodeCache:
+    """
+    Rendered barcodes by content (code + writer options + format): a bounded
+    LRU in memory in front of the files under MEDIA_ROOT, rendering only when
+    both miss.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.images = OrderedDict()
+
+    def lookup(self, code, options=None, fmt=DEFAULT_FORMAT):
+        """The cached barcode of ``code`` from memory or disk, None if never rendered."""
+        name = barcode_name(code, options, fmt)
+        with self.lock:
+            data = self.images.get(name)
+            if data is not None:
+                self.images.move_to_end(name)
+                return data
+        if not FORMATS[fmt].persist:
+            return None
+        try:
+            with open(os.path.join(settings.MEDIA_ROOT, name), "rb") as image:
+                data = image.read()
+        except FileNotFoundError:
+            return None
+        self._remember(name, data)
+        return data
+
+    def store(self, code, options, data, fmt=DEFAULT_FORMAT, persist=True):
+        """Keep ``data`` in memory, and on disk too unless ``persist`` is false."""
+        name = barcode_name(code, options, fmt)
+        if persist and FORMATS[fmt].persist:
+            write_file(name, data)
+        self._remember(name, data)
+
+    def get(self, code, options=None, fmt=DEFAULT_FORMAT, persist=True):
+        """
+        The barcode of ``code``, rendered on a miss. ``persist`` may be a
+        callable, only called on a miss, deciding whether to write the file.
+        """
+        data = self.lookup(code, options, fmt)
+        if data is None:
+            data = render_barcode(code, options, fmt)
+            if callable(persist):
+                persist = persist()
+            self.store(code, options, data, fmt, persist)
+        return data
+
+    def _remember(self, name, data):
+        with self.lock:
+            self.images[name] = data
+            self.images.move_to_end(name)
+            while len(self.images) > self.maxsize:
+                self.images.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+
+
+cache = BarcodeCache(settings.BARCODE_CACHE_SIZE)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from rest_framework import status
+from rest_framework.response import Response
+
+from product.models import CatalogVersion
+
+CATALOG_VERSION_PK = 1
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_key_locks = weakref.WeakValueDictionary()
+_key_locks_lock = threading.Lock()
+
+
+def catalog_version():
+    """
+    The catalog version token, shared by every process through the database:
+    a change made by one worker, or by a management command, retires the
+    cached responses and indexes of all of them.
+    """
+    version = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).values_list(
+        "version", flat=True
+    ).first()
+    if version is None:
+        bump_catalog_version()
+        return catalog_version()
+    return str(version)
+
+
+def catalog_last_modified(version=None):
+    # The version token is the time of the last change, in nanoseconds
+    version = version or catalog_version()
+    return datetime.fromtimestamp(int(version) / 1e9, tz=timezone.utc)
+
+
+def bump_catalog_version():
+    # Never backwards, even if the clocks of two servers disagree
+    now = time.time_ns()
+    updated = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).update(
+        previous_version=F("version"), version=Greatest(F("version") + 1, Value(now))
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(
+            pk=CATALOG_VERSION_PK, defaults={"version": now}
+        )
+
+
+def catalog_version_change():
+    """
+    ``(previous, version)`` of the last bump. Read in the transaction of a
+    change, after its bump, it tells an in-memory index that was at
+    ``previous`` whether applying just this change brings it to ``version``.
+    """
+    previous, version = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).values_list(
+        "previous_version", "version"
+    ).get()
+    return str(previous), str(version)
+
+
+def normalize_params(request, names):
+    params = {}
+    for name in names:
+        value = request.query_params.get(name, "").strip()
+        if name == "tags":
+            value = ",".join(sorted({tag.strip() for tag in value.split(",") if tag.strip()}))
+        params[name] = value
+    return params
+
+
+def response_cache_key(namespace, params, version=None):
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"catalog:{namespace}:{version or catalog_version()}:{digest}"
+
+
+def _count(name, namespace):
+    with _stats_lock:
+        _stats[name] += 1
+        _stats[f"{namespace}.{name}"] += 1
+
+
+def _lock_for(key):
+    with _key_locks_lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _key_locks[key] = lock
+        return lock
+
+
+def cached_response(namespace, params, build, version=None):
+    """
+    Return the payload for ``params`` from the cache, calling ``build`` on a
+    miss. Concurrent misses for the same key wait for a single build.
+    ``version`` saves reading the catalog version again when the caller
+    already has it.
+    """
+    key = response_cache_key(namespace, params, version)
+    data = cache.get(key)
+    if data is None:
+        with _lock_for(key):
+            data = cache.get(key)
+            if data is None:
+                _count("misses", namespace)
+                data = build()
+                cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+                response = Response(data, status=status.HTTP_200_OK)
+                response["X-Cache"] = "MISS"
+                return response
+
+    _count("hits", namespace)
+    response = Response(data, status=status.HTTP_200_OK)
+    response["X-Cache"] = "HIT"
+    return response
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,108 @@
+from django.db import connection
+
+from product.cache import bump_catalog_version
+from product.models import CatalogVersion, Product, ProductCard
+
+CARD_FIELDS = ["code", "price", "is_available", "data"]
+
+
+def build_cards(products):
+    # Imported here: the serializers module imports the signals, which import us
+    from product.serializers import ProductSerializer
+
+    return [
+        ProductCard(
+            product=product,
+            code=product.code,
+            price=product.price,
+            is_available=product.is_available,
+            data=ProductSerializer(product).data,
+        )
+        for product in products
+    ]
+
+
+def save_cards(products):
+    if products:
+        ProductCard.objects.bulk_create(
+            build_cards(products),
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=CARD_FIELDS,
+        )
+
+
+def refresh_product_cards(product_ids):
+    """Rebuild the cards of ``product_ids``, dropping those of deleted products."""
+    product_ids = [pk for pk in product_ids if pk is not None]
+    if not product_ids:
+        return
+    products = list(
+        Product.objects.with_catalog_relations().filter(pk__in=product_ids)
+    )
+    save_cards(products)
+    if len(products) < len(set(product_ids)):
+        ProductCard.objects.filter(pk__in=product_ids).exclude(
+            pk__in=[product.pk for product in products]
+        ).delete()
+
+
+def iter_product_chunks(chunk_size):
+    last_pk = 0
+    while True:
+        products = list(
+            Product.objects.with_catalog_relations()
+            .filter(pk__gt=last_pk)
+            .order_by("pk")[:chunk_size]
+        )
+        if not products:
+            return
+        yield products
+        last_pk = products[-1].pk
+
+
+def rebuild_product_cards(chunk_size=500):
+    rebuilt = 0
+    for products in iter_product_chunks(chunk_size):
+        save_cards(products)
+        rebuilt += len(products)
+    orphans, _ = ProductCard.objects.exclude(
+        product__in=Product.objects.values("pk")
+    ).delete()
+    bump_catalog_version()
+    return rebuilt, orphans
+
+
+def fill_empty_product_cards(**kwargs):
+    """
+    post_migrate receiver: build every card when the table is empty but the
+    catalog is not, as right after the migration creating it, so the product
+    list never serves an empty catalog. Returns the number of cards built.
+    """
+    tables = connection.introspection.table_names()
+    if ProductCard._meta.db_table not in tables or CatalogVersion._meta.db_table not in tables:
+        # Migrated back to before the cards
+        return 0
+    if ProductCard.objects.exists() or not Product.objects.exists():
+        return 0
+    rebuilt, _ = rebuild_product_cards()
+    return rebuilt
+
+
+def find_card_drift(chunk_size=500):
+    """Codes of products whose card is missing or differs from a fresh build."""
+    missing, stale = [], []
+    for products in iter_product_chunks(chunk_size):
+        stored = {
+            card.pk: card
+            for card in ProductCard.objects.filter(
+                pk__in=[product.pk for product in products]
+            )
+        }
+        for expected in build_cards(products):
+            card = stored.get(expected.pk)
+            if card is None:
+                missing.append(expected.code)
+            elif any(getattr(card, f) != getattr(expected, f) for f in CARD_FIELDS):
+                stale.append(expected.code)
+    return missing, stale
@@ -0,0 +1,28 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(
+        "|".join(str(part) for part in parts).encode(), usedforsecurity=False
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def conditional_response(request, etag, last_modified, build):
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` with a 304 before ``build``
+    is called, otherwise return its response tagged with the validators.
+    """
+    timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(timestamp)
+        # Let browsers and CDNs keep the body but revalidate on every use
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
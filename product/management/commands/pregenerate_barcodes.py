@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from product import barcodes
+from product.models import Product
+from product.signals import send_catalog_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the barcodes of products whose file is missing or was made for "
+        "another code, and record them on Product.barcode"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Render processes; 1 renders in this process",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be positive")
+
+        self.writer_options = barcodes.writer_options()
+        started = time.perf_counter()
+        rendered = updated = scanned = 0
+        pool = None
+        if options["workers"] > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        try:
+            for products in self.iter_chunks(options["chunk_size"]):
+                scanned += len(products)
+                chunk_rendered, chunk_updated = self.process_chunk(products, pool)
+                rendered += chunk_rendered
+                updated += chunk_updated
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scanned {scanned} products: rendered {rendered} barcodes, "
+                f"updated {updated} products in {elapsed:.1f}s ({rate:.0f} barcodes/s)"
+            )
+        )
+
+    def iter_chunks(self, chunk_size):
+        last_pk = 0
+        while True:
+            products = list(
+                Product.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("pk", "code", "barcode")[:chunk_size]
+            )
+            if not products:
+                return
+            yield products
+            last_pk = products[-1].pk
+
+    def is_missing(self, name):
+        return not os.path.exists(os.path.join(settings.MEDIA_ROOT, name))
+
+    def process_chunk(self, products, pool):
+        # Codes Code 128 cannot encode get no barcode, as in Product.save()
+        names = {
+            product.code: barcodes.barcode_name(product.code, self.writer_options)
+            if barcodes.encodable(product.code)
+            else ""
+            for product in products
+        }
+        missing = [code for code, name in names.items() if name and self.is_missing(name)]
+        if pool is None:
+            images = (barcodes.render_barcode(code, self.writer_options) for code in missing)
+        else:
+            images = pool.map(
+                barcodes.render_barcode, missing, repeat(self.writer_options), chunksize=16
+            )
+        for code, image in zip(missing, images):
+            barcodes.write_file(names[code], image)
+
+        # Products pointing at another code's file, or at nothing yet
+        changed = [
+            product
+            for product in products
+            if (product.barcode.name or "") != names[product.code]
+        ]
+        if changed:
+            now = timezone.now()
+            for product in changed:
+                product.barcode.name = names[product.code]
+                product.updated_at = now
+            Product.objects.bulk_update(changed, ["barcode", "updated_at"])
+            # The barcode URL is part of the serialized product
+            send_catalog_changed(Product, [product.pk for product in changed])
+        return len(missing), len(changed)
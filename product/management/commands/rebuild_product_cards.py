@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from product.cards import find_card_drift, rebuild_product_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized product cards served by the product list"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report cards that are missing or out of date",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            missing, stale = find_card_drift(options["chunk_size"])
+            if missing or stale:
+                raise CommandError(
+                    f"{len(missing)} missing cards {missing[:20]}, "
+                    f"{len(stale)} stale cards {stale[:20]}"
+                )
+            self.stdout.write(self.style.SUCCESS("Product cards are up to date"))
+            return
+
+        rebuilt, orphans = rebuild_product_cards(options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} product cards, removed {orphans} orphans")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from product.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {backend.name} search index ({indexed} products)")
+        )
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+PRICE_NULLS_FIRST_INDEX = "product_price_nulls_first_idx"
+
+
+def remove_duplicate_product_tags(apps, schema_editor):
+    ProductTag = apps.get_model('product', 'ProductTag')
+    seen = set()
+    duplicates = []
+    for pk, product_id, tag_id in ProductTag.objects.order_by('id').values_list(
+        'id', 'product_id', 'tag_id'
+    ):
+        if (product_id, tag_id) in seen:
+            duplicates.append(pk)
+        seen.add((product_id, tag_id))
+    ProductTag.objects.filter(pk__in=duplicates).delete()
+
+
+def create_price_nulls_first_index(apps, schema_editor):
+    # The list orders by price ASC NULLS FIRST / DESC NULLS LAST. SQLite puts
+    # NULLs first anyway, Postgres needs a matching index to skip the sort
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PRICE_NULLS_FIRST_INDEX} "
+            "ON product_product (price ASC NULLS FIRST, id)"
+        )
+
+
+def drop_price_nulls_first_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PRICE_NULLS_FIRST_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0017_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producthistory',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['code', 'id'], name='product_code_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.RunPython(
+            create_price_nulls_first_index, drop_price_nulls_first_index
+        ),
+        migrations.RunPython(
+            remove_duplicate_product_tags, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='producttag',
+            constraint=models.UniqueConstraint(fields=('product', 'tag'), name='unique_product_tag'),
+        ),
+    ]
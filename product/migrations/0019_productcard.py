@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PRICE_NULLS_FIRST_INDEX = "productcard_price_nulls_first_idx"
+
+
+def create_price_nulls_first_index(apps, schema_editor):
+    # Same as product_price_nulls_first_idx in 0018, for the card table
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PRICE_NULLS_FIRST_INDEX} "
+            "ON product_productcard (price ASC NULLS FIRST, product_id)"
+        )
+
+
+def drop_price_nulls_first_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PRICE_NULLS_FIRST_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0018_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='product.product')),
+                ('code', models.CharField(max_length=16)),
+                ('price', models.FloatField(blank=True, null=True)),
+                ('is_available', models.BooleanField(default=True)),
+                ('data', models.JSONField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['code', 'product'], name='productcard_code_idx'), models.Index(fields=['price', 'product'], name='productcard_price_idx')],
+            },
+        ),
+        migrations.RunPython(
+            create_price_nulls_first_index, drop_price_nulls_first_index
+        ),
+    ]
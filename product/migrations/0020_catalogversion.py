@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:02
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    CatalogVersion = apps.get_model('product', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1, defaults={'version': time.time_ns()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0019_productcard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0020_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='previous_version',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
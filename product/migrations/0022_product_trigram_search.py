@@ -0,0 +1,67 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = "product_product_fts"
+GIN_INDEX = "product_product_search_gin"
+TSVECTOR_SQL = (
+    "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+TRIGRAM_INDEXES = {
+    "product_title_trgm_idx": "title",
+    "product_description_trgm_idx": "description",
+}
+
+
+def create_fts_table(schema_editor, tokenize):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, description, tokenize = '{tokenize}')"
+        )
+    except OperationalError:
+        # FTS5, or its trigram tokenizer (SQLite 3.34+), missing from this
+        # build: search falls back to the scan backend
+        return
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+        "SELECT id, title, COALESCE(description, '') FROM product_product"
+    )
+
+
+def create_trigram_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        create_fts_table(schema_editor, "trigram")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, column in TRIGRAM_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON product_product USING GIN ({column} gin_trgm_ops)"
+            )
+        schema_editor.execute(f"DROP INDEX IF EXISTS {GIN_INDEX}")
+
+
+def drop_trigram_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        create_fts_table(schema_editor, "unicode61 remove_diacritics 2")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} "
+            f"ON product_product USING GIN ({TSVECTOR_SQL})"
+        )
+        for name in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0021_catalogversion_previous_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,12 +1,28 @@
+import logging
+
 from django.db import models
-from django.core.files import File
-from barcode import Code128
-from barcode.writer import ImageWriter
-from io import BytesIO
 from django.utils import timezone
+from product.barcodes import ENCODER_ERRORS, ensure_barcode_file
+
+logger = logging.getLogger(__name__)
 
 # tag deve stare dentro a product in admi
 
+class ProductQuerySet(models.QuerySet):
+    def with_catalog_relations(self):
+        # Carica tag e immagini di tutta la pagina con una query per relazione
+        return self.prefetch_related(
+            models.Prefetch(
+                'producttag_set',
+                queryset=ProductTag.objects.select_related('tag').order_by('id'),
+            ),
+            models.Prefetch(
+                'productimage_set',
+                queryset=ProductImage.objects.order_by('id'),
+            ),
+        )
+
+
 class Product(models.Model):
     code = models.CharField(max_length=16)
     price = models.FloatField(null=True, blank=True)
@@ -15,11 +31,36 @@ class Product(models.Model):
     barcode = models.ImageField(upload_to='uploads/barcodes/', blank=True, null=True)
     penalty = models.FloatField(default=0)
     is_available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Lookup per codice (carrello, dettagli, barcode) e ordinamento per anno
+            models.Index(fields=['code', 'id'], name='product_code_id_idx'),
+            # Ordinamento per prezzo; su Postgres la migrazione 0018 aggiunge
+            # anche la variante NULLS FIRST usata dalla lista
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.code}"
 
     def save(self, *args, **kwargs):
+        # Il file dipende solo da codice e opzioni: si rigenera quando cambiano
+        try:
+            barcode = ensure_barcode_file(self.code)
+        except ENCODER_ERRORS:
+            # Codice non rappresentabile in Code 128 (vuoto, lettere accentate):
+            # il prodotto si salva comunque, senza barcode
+            logger.warning("Cannot encode product code %r as a barcode", self.code)
+            barcode = ''
+        if self.barcode.name != barcode:
+            self.barcode.name = barcode
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'barcode'}
         super().save(*args, **kwargs)
 
     # def get_category(self):
@@ -28,8 +69,44 @@ class Product(models.Model):
         # return None
     
     def get_tags(self):
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'producttag_set' in prefetched:
+            return [product_tag.tag.name for product_tag in prefetched['producttag_set']]
         return ProductTag.objects.filter(product=self).values_list('tag__name', flat=True)
 
+
+
+class ProductCard(models.Model):
+    # Proiezione denormalizzata usata dalla lista prodotti: una riga per
+    # prodotto con il payload gia' serializzato, aggiornata dai segnali
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='card'
+    )
+    code = models.CharField(max_length=16)
+    price = models.FloatField(null=True, blank=True)
+    is_available = models.BooleanField(default=True)
+    data = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['code', 'product'], name='productcard_code_idx'),
+            models.Index(fields=['price', 'product'], name='productcard_price_idx'),
+        ]
+
+    def __str__(self):
+        return self.code
+
+
+class CatalogVersion(models.Model):
+    # Riga unica con la versione del catalogo (istante dell'ultima modifica in
+    # nanosecondi): nel database, cosi' la vedono tutti i processi.
+    # previous_version e' quella che c'era prima dell'ultimo aggiornamento
+    version = models.BigIntegerField()
+    previous_version = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return str(self.version)
+
     
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -51,7 +128,7 @@ class ProductHistory(models.Model):
     title = models.CharField(max_length=15, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         local_timestamp = timezone.localtime(self.timestamp)  # Converte il timestamp in orario locale
@@ -77,7 +154,7 @@ class ProductHistory(models.Model):
 #         super().save(*args, **kwargs)
 
 class Tag(models.Model):
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, db_index=True)
 
     def __str__(self):
         return f"{self.id} - {self.name}"
@@ -86,5 +163,10 @@ class ProductTag(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'tag'], name='unique_product_tag'),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.product.code} - {self.tag.name}"
\ No newline at end of file
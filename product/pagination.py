@@ -0,0 +1,104 @@
+import base64
+import binascii
+import json
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# sort -> (field, descending). pk breaks ties so the order is stable
+PRODUCT_SORTS = {
+    "-id": ("pk", True),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "year_asc": ("code", False),
+    "year_desc": ("code", True),
+}
+DEFAULT_PRODUCT_SORT = "-id"
+
+
+def product_ordering(sort):
+    field, descending = PRODUCT_SORTS[sort]
+    if field == "pk":
+        return [F("pk").desc() if descending else F("pk").asc()]
+    # Pin NULL prices to the same end on SQLite and Postgres
+    if descending:
+        return [F(field).desc(nulls_last=True), F("pk").desc()]
+    return [F(field).asc(nulls_first=True), F("pk").asc()]
+
+
+def _after_position(sort, value, pk):
+    field, descending = PRODUCT_SORTS[sort]
+    after_pk = Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+    if field == "pk":
+        return after_pk
+    if value is None:
+        if descending:
+            return Q(**{f"{field}__isnull": True}) & after_pk
+        return (Q(**{f"{field}__isnull": True}) & after_pk) | Q(
+            **{f"{field}__isnull": False}
+        )
+    lookup = "lt" if descending else "gt"
+    position = Q(**{f"{field}__{lookup}": value}) | (Q(**{field: value}) & after_pk)
+    if descending:
+        position |= Q(**{f"{field}__isnull": True})
+    return position
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for the product list: no COUNT(*) and no OFFSET, each
+    page starts right after the last row of the previous one.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 12
+
+    def __init__(self, sort=DEFAULT_PRODUCT_SORT, page_size=None):
+        self.sort = sort
+        if page_size:
+            self.page_size = page_size
+
+    def encode_cursor(self, product):
+        field, _ = PRODUCT_SORTS[self.sort]
+        value = product.pk if field == "pk" else getattr(product, field)
+        payload = json.dumps({"s": self.sort, "v": value, "pk": product.pk})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            sort, value, pk = payload["s"], payload["v"], int(payload["pk"])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound("Invalid cursor")
+        if sort != self.sort or not isinstance(value, (str, int, float, type(None))):
+            raise NotFound("Invalid cursor")
+        return value, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*product_ordering(self.sort))
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            value, pk = self.decode_cursor(encoded)
+            queryset = queryset.filter(_after_position(self.sort, value, pk))
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
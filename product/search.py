@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from product.models import Product
+
+FTS_TABLE = "product_product_fts"
+TRIGRAM_INDEXES = ("product_title_trgm_idx", "product_description_trgm_idx")
+# Shortest query a trigram index can narrow down
+TRIGRAM_MIN_LENGTH = 3
+
+
+def like_pattern(query):
+    """``%query%`` with the LIKE wildcards of ``query`` escaped by backslash."""
+    escaped = re.sub(r"([\\%_])", r"\\\1", query)
+    return f"%{escaped}%"
+
+
+class ScanSearchBackend:
+    """Substring scan over title and description, works on any database."""
+
+    name = "scan"
+
+    def filter(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) | Q(description__icontains=query)
+        )
+
+    def index_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteFTSSearchBackend(ScanSearchBackend):
+    """
+    Substring matching, like the scan, through an FTS5 table keyed by
+    product id and tokenized into trigrams.
+    """
+
+    name = "sqlite_fts"
+
+    def filter(self, queryset, query):
+        if len(query) < TRIGRAM_MIN_LENGTH:
+            return super().filter(queryset, query)
+        # One quoted phrase: its trigrams in a row, i.e. the query as a substring
+        phrase = '"{}"'.format(query.replace('"', '""'))
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [phrase]
+            )
+        )
+
+    def index_products(self, product_ids):
+        product_ids = [pk for pk in product_ids if pk is not None]
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                product_ids,
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+                f"SELECT id, title, COALESCE(description, '') "
+                f"FROM {Product._meta.db_table} WHERE id IN ({placeholders})",
+                product_ids,
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+                f"SELECT id, title, COALESCE(description, '') "
+                f"FROM {Product._meta.db_table}"
+            )
+            return cursor.rowcount
+
+
+class PostgresSearchBackend(ScanSearchBackend):
+    """Substring ILIKE over pg_trgm GIN indexes, maintained by Postgres."""
+
+    name = "postgres"
+
+    def filter(self, queryset, query):
+        pattern = like_pattern(query)
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT id FROM {Product._meta.db_table} "
+                "WHERE title ILIKE %s OR description ILIKE %s",
+                [pattern, pattern],
+            )
+        )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            for name in TRIGRAM_INDEXES:
+                cursor.execute(f"REINDEX INDEX {name}")
+        return Product.objects.count()
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (ScanSearchBackend, SQLiteFTSSearchBackend, PostgresSearchBackend)
+}
+
+
+@lru_cache(maxsize=1)
+def _auto_backend_name():
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend.name
+    if connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+        return SQLiteFTSSearchBackend.name
+    # FTS5 missing from this SQLite build, or an unsupported database
+    return ScanSearchBackend.name
+
+
+def get_search_backend():
+    name = settings.PRODUCT_SEARCH_BACKEND
+    if name == "auto":
+        name = _auto_backend_name()
+    return BACKENDS[name]()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from product import models as product_models
+from product.signals import send_catalog_changed
 import base64
 
 
@@ -49,9 +50,10 @@ class ProductSerializer(serializers.ModelSerializer):
         # fields = '__all__'
 
     def get_tags(self, obj):
-        if obj.get_tags() is None:
+        tags = obj.get_tags()
+        if tags is None:
             return []
-        return obj.get_tags()
+        return list(tags)
 
     def create(self, validated_data):
         uploaded_images = validated_data.pop("uploaded_images", [])
@@ -86,6 +88,9 @@ class ProductSerializer(serializers.ModelSerializer):
             ]
         )
 
+        # bulk_create non invia post_save: avvisiamo la cache del catalogo
+        send_catalog_changed(product_models.Product, [product.pk])
+
         return product
 
     # def create(self, validated_data):
@@ -0,0 +1,350 @@
+import atexit
+import html
+import multiprocessing
+import re
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from itertools import repeat
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from PIL import Image
+
+from product import barcodes
+
+SHEET_FORMATS = ("pdf", "svg", "zpl")
+# Paper sizes in millimetres
+PAPER_SIZES = {
+    "A4": (210, 297),
+    "A5": (148, 210),
+    "Letter": (215.9, 279.4),
+}
+POINTS_PER_MM = 72 / 25.4
+CAPTION_FONT_SIZE = 7
+# Average Helvetica glyph width, in font sizes, used to shorten long titles
+CAPTION_CHAR_WIDTH = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    paper: str = "A4"
+    columns: int = 3
+    rows: int = 8
+    dpi: int = 300
+    margin_mm: float = 10
+
+    LIMITS = {"columns": (1, 10), "rows": (1, 30), "dpi": (72, 1200)}
+
+    @classmethod
+    def from_params(cls, params):
+        """Layout from settings.BARCODE_SHEET overridden by request ``params``."""
+        values = {**settings.BARCODE_SHEET}
+        paper = params.get("paper")
+        if paper:
+            matches = [name for name in PAPER_SIZES if name.lower() == paper.lower()]
+            if not matches:
+                raise ValueError(f"Unknown paper size: {paper}")
+            values["paper"] = matches[0]
+        for name, (low, high) in cls.LIMITS.items():
+            if params.get(name):
+                try:
+                    value = int(params[name])
+                except ValueError:
+                    raise ValueError(f"{name} must be an integer") from None
+                if not low <= value <= high:
+                    raise ValueError(f"{name} must be between {low} and {high}")
+                values[name] = value
+        return cls(**values)
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    @property
+    def page_size_mm(self):
+        return PAPER_SIZES[self.paper]
+
+    @property
+    def cell_size_mm(self):
+        width, height = self.page_size_mm
+        return (
+            (width - 2 * self.margin_mm) / self.columns,
+            (height - 2 * self.margin_mm) / self.rows,
+        )
+
+    def writer_options(self):
+        return {**barcodes.writer_options(), "dpi": self.dpi}
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the web worker may be running threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.BARCODE_SHEET_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def render_many(render, codes, options):
+    """``render(code, options)`` for each code, in order, in parallel if many."""
+    if len(codes) < settings.BARCODE_SHEET_PARALLEL_MIN:
+        return (render(code, options) for code in codes)
+    return get_pool().map(render, codes, repeat(options), chunksize=8)
+
+
+def render_svg_label(code, options):
+    svg = barcodes.render_svg(code, options).decode()
+    svg = svg[svg.index("<svg") :].replace(' id="barcode_group"', "")
+    # Scale with the grid cell: the writer only sets a size in millimetres
+    width, height = (
+        float(value)
+        for value in re.search(r'width="([\d.]+)mm" height="([\d.]+)mm"', svg).groups()
+    )
+    return re.sub(
+        r'width="[\d.]+mm" height="[\d.]+mm"',
+        f'viewBox="0 0 {width * 96 / 25.4:.3f} {height * 96 / 25.4:.3f}"',
+        svg,
+        count=1,
+    )
+
+
+def label_images(codes, options):
+    """PNG labels in order: cached ones as they are, the others rendered."""
+    cached = {code: barcodes.cache.lookup(code, options) for code in set(codes)}
+    missing = [code for code in dict.fromkeys(codes) if cached[code] is None]
+    rendered = iter(render_many(barcodes.render_barcode, missing, options))
+    for code in codes:
+        if cached[code] is None:
+            cached[code] = next(rendered)
+            barcodes.cache.store(code, options, cached[code])
+        yield cached[code]
+
+
+def pdf_text(text, max_width):
+    max_chars = int(max_width / (CAPTION_FONT_SIZE * CAPTION_CHAR_WIDTH))
+    if len(text) > max_chars:
+        text = text[: max(max_chars - 3, 0)] + "..."
+    encoded = text.encode("cp1252", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class PdfStream:
+    """
+    Minimal PDF writer emitting objects as they are produced, so a sheet is
+    sent page by page instead of being built in memory first.
+    """
+
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.next_id = self.FONT + 1
+        self.page_ids = []
+
+    def emit(self, data):
+        self.position += len(data)
+        return data
+
+    def obj(self, obj_id, body):
+        self.offsets[obj_id] = self.position
+        return self.emit(b"%d 0 obj\n%s\nendobj\n" % (obj_id, body))
+
+    def stream(self, obj_id, entries, data):
+        return self.obj(
+            obj_id,
+            b"<< %s /Length %d >>\nstream\n%s\nendstream" % (entries, len(data), data),
+        )
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def header(self):
+        return self.emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n") + self.obj(
+            self.FONT,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+            b"/Encoding /WinAnsiEncoding >>",
+        )
+
+    def image(self, png):
+        image = Image.open(BytesIO(png)).convert("L").point(lambda v: 255 * (v > 127), "1")
+        obj_id = self.new_id()
+        data = self.stream(
+            obj_id,
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode"
+            % image.size,
+            zlib.compress(image.tobytes()),
+        )
+        return obj_id, image.size, data
+
+    def page(self, width, height, content, image_ids):
+        chunks = []
+        content_id = self.new_id()
+        chunks.append(
+            self.stream(content_id, b"/Filter /FlateDecode", zlib.compress(content))
+        )
+        page_id = self.new_id()
+        xobjects = b" ".join(b"/Im%d %d 0 R" % (i, i) for i in image_ids)
+        chunks.append(
+            self.obj(
+                page_id,
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+                b"/Resources << /Font << /F1 %d 0 R >> /XObject << %s >> >> "
+                b"/Contents %d 0 R >>"
+                % (self.PAGES, width, height, self.FONT, xobjects, content_id),
+            )
+        )
+        self.page_ids.append(page_id)
+        return b"".join(chunks)
+
+    def trailer(self):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        chunks = [
+            self.obj(
+                self.PAGES,
+                b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)),
+            ),
+            self.obj(self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES),
+        ]
+        xref_position = self.position
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        xref += [b"%010d 00000 n \n" % self.offsets[obj_id] for obj_id in range(1, size)]
+        chunks.append(self.emit(b"".join(xref)))
+        chunks.append(
+            self.emit(
+                b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (size, self.CATALOG, xref_position)
+            )
+        )
+        return b"".join(chunks)
+
+
+def pdf_sheet(labels, layout):
+    """Stream a PDF of ``labels`` ((code, title) pairs) laid out on a grid."""
+    pdf = PdfStream()
+    yield pdf.header()
+
+    page_width, page_height = (mm * POINTS_PER_MM for mm in layout.page_size_mm)
+    margin = layout.margin_mm * POINTS_PER_MM
+    cell_width, cell_height = (mm * POINTS_PER_MM for mm in layout.cell_size_mm)
+    padding = min(cell_width, cell_height) * 0.05
+    images = label_images([code for code, _ in labels], layout.writer_options())
+
+    for start in range(0, len(labels), layout.per_page):
+        content, image_ids, chunks = [], [], []
+        for slot, (code, title) in enumerate(labels[start : start + layout.per_page]):
+            column, row = slot % layout.columns, slot // layout.columns
+            left = margin + column * cell_width
+            bottom = page_height - margin - (row + 1) * cell_height
+            caption = CAPTION_FONT_SIZE + 2 if title else 0
+
+            image_id, (width, height), data = pdf.image(next(images))
+            chunks.append(data)
+            image_ids.append(image_id)
+            # Fit the label in the cell keeping its aspect ratio, centred
+            scale = min(
+                (cell_width - 2 * padding) / width,
+                (cell_height - 2 * padding - caption) / height,
+            )
+            x = left + (cell_width - width * scale) / 2
+            y = bottom + padding + caption
+            content.append(
+                b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q"
+                % (width * scale, height * scale, x, y, image_id)
+            )
+            if title:
+                content.append(
+                    b"BT /F1 %d Tf %.2f %.2f Td (%s) Tj ET"
+                    % (
+                        CAPTION_FONT_SIZE,
+                        left + padding,
+                        bottom + padding,
+                        pdf_text(title, cell_width - 2 * padding),
+                    )
+                )
+        chunks.append(pdf.page(page_width, page_height, b"\n".join(content), image_ids))
+        yield b"".join(chunks)
+
+    yield pdf.trailer()
+
+
+def svg_sheet(labels, layout):
+    """Stream an HTML page with every label as inline SVG, one grid per page."""
+    page_width, page_height = layout.page_size_mm
+    cell_width, cell_height = layout.cell_size_mm
+    yield (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+        "<title>Print Barcodes</title>\n<style>\n"
+        f"@page {{ size: {page_width}mm {page_height}mm; margin: {layout.margin_mm}mm; }}\n"
+        "body { margin: 0; font-family: sans-serif; }\n"
+        f".sheet {{ display: grid; grid-template-columns: repeat({layout.columns}, "
+        f"{cell_width:.2f}mm); grid-auto-rows: {cell_height:.2f}mm; "
+        "break-after: page; }\n"
+        ".label { display: flex; flex-direction: column; align-items: center; "
+        "justify-content: center; overflow: hidden; padding: 1mm; box-sizing: border-box; }\n"
+        ".label svg { flex: 1; min-height: 0; max-width: 100%; }\n"
+        ".label div { font-size: 7pt; white-space: nowrap; overflow: hidden; "
+        "text-overflow: ellipsis; max-width: 100%; }\n"
+        "</style>\n</head>\n<body>\n"
+    )
+    svgs = render_many(
+        render_svg_label, [code for code, _ in labels], barcodes.writer_options()
+    )
+    for start in range(0, len(labels), layout.per_page):
+        page = ['<div class="sheet">\n']
+        for _, title in labels[start : start + layout.per_page]:
+            page.append(
+                f'<div class="label">{next(svgs)}<div>{html.escape(title or "")}</div></div>\n'
+            )
+        page.append("</div>\n")
+        yield "".join(page)
+    yield "</body>\n</html>\n"
+
+
+def zpl_sheet(labels, layout):
+    """One ZPL label per product, for thermal printers that feed label by label."""
+    options = barcodes.writer_options()
+    for code, title in labels:
+        yield barcodes.zpl_label(code, options, title)
+
+
+def unencodable_codes(products):
+    """
+    Codes of ``products`` Code 128 cannot encode. A sheet is checked for them
+    before streaming: once the 200 headers are sent a failing label can only
+    truncate the body.
+    """
+    return [product.code for product in products if not barcodes.encodable(product.code)]
+
+
+def sheet_response(products, sheet_format, layout):
+    """Streamed sheet of ``products`` in one of SHEET_FORMATS; see unencodable_codes()."""
+    labels = [(product.code, product.title) for product in products]
+    if sheet_format == "pdf":
+        response = StreamingHttpResponse(
+            pdf_sheet(labels, layout), content_type="application/pdf"
+        )
+        response["Content-Disposition"] = 'inline; filename="barcodes.pdf"'
+    elif sheet_format == "zpl":
+        response = StreamingHttpResponse(
+            zpl_sheet(labels, layout), content_type=barcodes.FORMATS["zpl"].content_type
+        )
+        response["Content-Disposition"] = 'attachment; filename="barcodes.zpl"'
+    else:
+        response = StreamingHttpResponse(
+            svg_sheet(labels, layout), content_type="text/html; charset=utf-8"
+        )
+    return response
@@ -1,6 +1,23 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from .models import Product, ProductHistory
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+from .models import Product, ProductHistory, ProductImage, ProductTag, Tag
+from .cache import bump_catalog_version, catalog_version_change
+from .search import get_search_backend
+from . import autocomplete, tag_index
+from .cards import refresh_product_cards
+
+# Sent whenever data shown by the catalog API changes, with the ids of the
+# affected products
+catalog_changed = Signal()
+
+def send_catalog_changed(sender, product_ids):
+    # All the receivers in one transaction, also when the change itself was
+    # saved in autocommit: the version bump becomes visible together with the
+    # rebuilt cards, never before them
+    with transaction.atomic():
+        catalog_changed.send(sender=sender, product_ids=product_ids)
 
 @receiver(post_save, sender=Product)
 def create_product_history_on_create(sender, instance, created, **kwargs):
@@ -24,3 +41,67 @@ def create_product_history_on_delete(sender, instance, **kwargs):
         description=instance.description,
         action='deleted'
     )
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    get_search_backend().index_products([instance.pk])
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    send_catalog_changed(sender, [instance.pk])
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_relation_changed(sender, instance, **kwargs):
+    send_catalog_changed(sender, [instance.product_id])
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    product_ids = list(
+        ProductTag.objects.filter(tag=instance).values_list('product_id', flat=True)
+    )
+    send_catalog_changed(sender, product_ids)
+
+@receiver(catalog_changed)
+def invalidate_catalog_cache(sender, **kwargs):
+    # In the transaction of send_catalog_changed: the new version becomes
+    # visible to the other processes together with the rows it stands for
+    bump_catalog_version()
+
+@receiver(catalog_changed)
+def refresh_cards(sender, product_ids, **kwargs):
+    # Same transaction as the change, so the list never serves a stale card
+    refresh_product_cards(product_ids)
+
+@receiver(catalog_changed)
+def touch_changed_products(sender, product_ids, **kwargs):
+    # Product.save() already refreshes updated_at through auto_now
+    if sender is not Product and product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+@receiver(catalog_changed)
+def refresh_autocomplete_index(sender, product_ids, **kwargs):
+    if autocomplete.enabled() and product_ids:
+        # After invalidate_catalog_cache, so this is the bump of this change
+        previous, version = catalog_version_change()
+        transaction.on_commit(
+            lambda: autocomplete.index.refresh(product_ids, previous, version)
+        )
+
+@receiver(catalog_changed)
+def refresh_tag_index(sender, product_ids, **kwargs):
+    if tag_index.index.version is None:
+        return
+    if sender is Tag:
+        transaction.on_commit(tag_index.index.load)
+    else:
+        # After invalidate_catalog_cache, so this is the bump of this change
+        previous, version = catalog_version_change()
+        transaction.on_commit(
+            lambda: tag_index.index.refresh(product_ids, previous, version)
+        )
@@ -0,0 +1,152 @@
+import threading
+from collections import defaultdict
+
+from django.db.models import Q
+
+from product.cache import catalog_version
+from product.models import ProductTag, Tag
+
+MATCH_ANY = "any"
+MATCH_ALL = "all"
+
+
+def bitmap_from_ids(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def ids_from_bitmap(bitmap):
+    bits = bin(bitmap)[:1:-1]
+    ids, position = [], bits.find("1")
+    while position != -1:
+        ids.append(position)
+        position = bits.find("1", position + 1)
+    return ids
+
+
+class TagBitmapIndex:
+    """
+    Tag -> product id bitsets (one Python int per tag, bit n set when product
+    n carries the tag), used to filter the product list by tags and to count
+    facets without joining ProductTag.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self.names = {}
+        self.ids_by_name = {}
+        self.bitmaps = {}
+
+    def load(self):
+        with self.lock:
+            version = catalog_version()
+            self.names = dict(Tag.objects.values_list("id", "name"))
+            self.ids_by_name = defaultdict(set)
+            for tag_id, name in self.names.items():
+                self.ids_by_name[name].add(tag_id)
+
+            products = defaultdict(list)
+            for tag_id, product_id in ProductTag.objects.values_list(
+                "tag_id", "product_id"
+            ).iterator(chunk_size=5000):
+                products[tag_id].append(product_id)
+            self.bitmaps = {
+                tag_id: bitmap_from_ids(products[tag_id]) for tag_id in self.names
+            }
+            self.version = version
+
+    def refresh(self, product_ids, previous, version):
+        """
+        Apply the change of ``product_ids`` that took the catalog from
+        ``previous`` to ``version`` (see catalog_version_change).
+        """
+        with self.lock:
+            if self.version is None or self.version == version:
+                # Not in use, or already loaded with the change
+                return
+            if self.version != previous:
+                # Another process changed the catalog since the last load
+                self.load()
+                return
+            mask = bitmap_from_ids(product_ids)
+            for tag_id in self.bitmaps:
+                self.bitmaps[tag_id] &= ~mask
+            pairs = defaultdict(list)
+            for tag_id, product_id in ProductTag.objects.filter(
+                product_id__in=product_ids
+            ).values_list("tag_id", "product_id"):
+                pairs[tag_id].append(product_id)
+            for tag_id, ids in pairs.items():
+                if tag_id not in self.bitmaps:
+                    # A tag created in the meantime: its name is needed too
+                    self.load()
+                    return
+                self.bitmaps[tag_id] |= bitmap_from_ids(ids)
+            self.version = version
+
+    def ensure_loaded(self):
+        with self.lock:
+            # The version is shared, so this also catches the changes made by
+            # the other workers and by management commands
+            if self.version is None or self.version != catalog_version():
+                self.load()
+
+    def resolve(self, value):
+        """Tag ids a request value refers to, by name or by numeric id."""
+        tag_ids = set(self.ids_by_name.get(value, ()))
+        if value.isdigit() and int(value) in self.names:
+            tag_ids.add(int(value))
+        return tag_ids
+
+    def match(self, values, mode=MATCH_ANY):
+        self.ensure_loaded()
+        with self.lock:
+            groups = [self.resolve(value) for value in values]
+            bitmaps = [self._union(tag_ids) for tag_ids in groups]
+        if not bitmaps:
+            return 0
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if mode == MATCH_ALL else result | bitmap
+        return result
+
+    def product_filter(self, values, mode=MATCH_ANY):
+        """The same selection as ``match`` as a Q, for results too large for IN."""
+        self.ensure_loaded()
+        with self.lock:
+            groups = [self.resolve(value) for value in values]
+        conditions = [
+            Q(pk__in=ProductTag.objects.filter(tag_id__in=tag_ids).values("product_id"))
+            for tag_ids in groups
+        ]
+        condition = conditions[0]
+        for other in conditions[1:]:
+            condition = condition & other if mode == MATCH_ALL else condition | other
+        return condition
+
+    def _union(self, tag_ids):
+        bitmap = 0
+        for tag_id in tag_ids:
+            bitmap |= self.bitmaps.get(tag_id, 0)
+        return bitmap
+
+    def facets(self, bitmap=None):
+        """Products per tag name, within ``bitmap`` when given."""
+        self.ensure_loaded()
+        with self.lock:
+            counts = {}
+            for name, tag_ids in self.ids_by_name.items():
+                tag_bitmap = self._union(tag_ids)
+                if bitmap is not None:
+                    tag_bitmap &= bitmap
+                counts[name] = tag_bitmap.bit_count()
+        return counts
+
+
+index = TagBitmapIndex()
@@ -6,6 +6,10 @@ from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from product import serializers as product_serializers
 from product import models as product_models
+from product import cache as catalog_cache
+from product.conditional import conditional_response, make_etag
+from product.search import get_search_backend
+from product import autocomplete, barcodes, sheets, tag_index
 from orders import models as orders_models
 from django.shortcuts import render, get_object_or_404
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -14,10 +18,22 @@ from django.db.models import Q, Case, When, Value, IntegerField
 import json
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger, InvalidPage
 from rest_framework.pagination import PageNumberPagination
-from django.http import HttpResponse
-from barcode import Code128
-from barcode.writer import ImageWriter
-from io import BytesIO
+from product.pagination import (
+    DEFAULT_PRODUCT_SORT,
+    PRODUCT_SORTS,
+    ProductCursorPagination,
+    product_ordering,
+)
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+
+# Above this many matches the tag filter runs as a subquery instead of IN (...)
+TAG_FILTER_MAX_IDS = 5000
 
 
 class ProductView(APIView):
@@ -55,61 +71,127 @@ class ProductView(APIView):
                 description="Comma-separated list of tag IDs",
                 required=False,
             ),
+            OpenApiParameter(
+                name="match",
+                type=str,
+                description='Tag matching: "any" (default) or "all"',
+                required=False,
+            ),
             OpenApiParameter(
                 name="order_by_price",
                 type=str,
                 description='Order by price: "asc" or "desc"',
                 required=False,
             ),
+            OpenApiParameter(
+                name="pagination",
+                type=str,
+                description='Set to "cursor" for keyset pagination (no count, follow "next")',
+                required=False,
+            ),
+            OpenApiParameter(
+                name="cursor",
+                type=str,
+                description="Opaque cursor taken from the previous page's next link",
+                required=False,
+            ),
         ],
         responses=product_serializers.ProductSerializer(many=True),
         description="Retrieve the list of all products with images, with optional filtering and ordering.",
     )
     def get(self, request):
+        params = catalog_cache.normalize_params(
+            request,
+            [
+                "tags",
+                "match",
+                "sort",
+                "order_by_price",
+                "page",
+                "page_size",
+                "pagination",
+                "cursor",
+            ],
+        )
+        # Pagination links are absolute, so the host is part of the key
+        params["host"] = request.get_host()
+        # One read of the shared version for the validators and the cache key
+        version = catalog_cache.catalog_version()
+        return conditional_response(
+            request,
+            make_etag(catalog_cache.response_cache_key("products", params, version)),
+            catalog_cache.catalog_last_modified(version),
+            lambda: catalog_cache.cached_response(
+                "products", params, lambda: self.list_products(request), version
+            ),
+        )
+
+    def list_products(self, request):
         # Get query parameters
-        tag_ids = request.query_params.get("tags", "").split(",")
+        tag_ids = [
+            t.strip() for t in request.query_params.get("tags", "").split(",") if t.strip()
+        ]
+        match = request.query_params.get("match", tag_index.MATCH_ANY)
+        if match not in (tag_index.MATCH_ANY, tag_index.MATCH_ALL):
+            match = tag_index.MATCH_ANY
         order_by_price = request.query_params.get("order_by_price", None)
 
-        # Start with all products
-        queryset = product_models.Product.objects.all().order_by("-id")
+        # Start with all products, read from the denormalized cards
+        queryset = product_models.ProductCard.objects.only(
+            "pk", "code", "price", "data"
+        )
 
-        # Filter by tags if provided
-        if tag_ids and tag_ids[0]:  # Check if there are any tag IDs
+        # Filter by tags if provided, through the tag bitmap index
+        if tag_ids:
             # Support both tag names (frontend) and tag IDs (tests)
-            q_filter = Q(producttag__tag__name__in=tag_ids) | Q(producttag__tag__id__in=[t for t in tag_ids if t.isdigit()])
-            queryset = queryset.filter(q_filter).distinct()
+            bitmap = tag_index.index.match(tag_ids, match)
+            product_ids = tag_index.ids_from_bitmap(bitmap)
+            if len(product_ids) <= TAG_FILTER_MAX_IDS:
+                queryset = queryset.filter(pk__in=product_ids)
+            else:
+                queryset = queryset.filter(tag_index.index.product_filter(tag_ids, match))
+            facets = tag_index.index.facets(bitmap)
+        else:
+            facets = tag_index.index.facets()
 
         # Order by price if specified
         sort = request.query_params.get("sort", None)
-        if sort:
-            if sort == "price_asc":
-                queryset = queryset.order_by("price")
-            elif sort == "price_desc":
-                queryset = queryset.order_by("-price")
-            elif sort == "year_asc":
-                queryset = queryset.order_by("code")
-            elif sort == "year_desc":
-                queryset = queryset.order_by("-code")
-        elif order_by_price:  # Legacy support
-            order_field = "price" if order_by_price.lower() == "asc" else "-price"
-            queryset = queryset.order_by(order_field)
+        if sort not in PRODUCT_SORTS:
+            sort = DEFAULT_PRODUCT_SORT
+            if order_by_price:  # Legacy support
+                sort = "price_asc" if order_by_price.lower() == "asc" else "price_desc"
+        queryset = queryset.order_by(*product_ordering(sort))
+
+        page_size = int(request.query_params.get("page_size", 12))
+
+        # Keyset pagination: no COUNT(*) and no OFFSET, for infinite scroll
+        if (
+            request.query_params.get("pagination") == "cursor"
+            or "cursor" in request.query_params
+        ):
+            paginator = ProductCursorPagination(sort=sort, page_size=page_size)
+            page = paginator.paginate_queryset(queryset, request)
+            data = paginator.get_paginated_response([card.data for card in page]).data
+            data["facets"] = facets
+            return data
 
         # Apply pagination using DRF's PageNumberPagination
         paginator = PageNumberPagination()
-        paginator.page_size = int(request.query_params.get("page_size", 12))
+        paginator.page_size = page_size
         
         paginated_queryset = paginator.paginate_queryset(queryset, request)
         if paginated_queryset is not None:
-            serializer = product_serializers.ProductSerializer(paginated_queryset, many=True)
-            response = paginator.get_paginated_response(serializer.data)
+            response = paginator.get_paginated_response(
+                [card.data for card in paginated_queryset]
+            )
             # Add extra metadata for numbered pagination
             response.data["current_page"] = paginator.page.number
             response.data["total_pages"] = paginator.page.paginator.num_pages
-            return response
+            response.data["facets"] = facets
+            return response.data
 
         # Fallback if pagination is not applied
-        serializer = product_serializers.ProductSerializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return [card.data for card in queryset]
 
 
 class ProductDeleteView(APIView):
@@ -186,7 +268,20 @@ class ProductDetailsUpdateView(APIView):
     serializer_class = product_serializers.ProductSerializer
 
     def get(self, request, code):
-        product = get_object_or_404(product_models.Product, code=code)
+        # Validators come from a narrow query; the product is serialized only
+        # when the client copy is stale
+        pk, updated_at = get_object_or_404(
+            product_models.Product.objects.values_list("pk", "updated_at"), code=code
+        )
+        return conditional_response(
+            request,
+            make_etag("product", pk, updated_at.isoformat()),
+            updated_at,
+            lambda: self.retrieve_product(pk),
+        )
+
+    def retrieve_product(self, pk):
+        product = product_models.Product.objects.with_catalog_relations().get(pk=pk)
         serializer = product_serializers.ProductSerializer(product)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -234,9 +329,35 @@ class ProductDetailsUpdateView(APIView):
 class TagListView(APIView):
     permission_classes = [AllowAny]
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="with_counts",
+                type=bool,
+                description="Return name and product count for each tag",
+                required=False,
+            ),
+        ],
+    )
     def get(self, request):
+        params = catalog_cache.normalize_params(request, ["with_counts"])
+        with_counts = params["with_counts"].lower() in ("1", "true")
+        version = catalog_cache.catalog_version()
+        return conditional_response(
+            request,
+            make_etag(catalog_cache.response_cache_key("tags", params, version)),
+            catalog_cache.catalog_last_modified(version),
+            lambda: catalog_cache.cached_response(
+                "tags", params, lambda: self.list_tags(with_counts), version
+            ),
+        )
+
+    def list_tags(self, with_counts=False):
         tags = product_models.Tag.objects.all()
-        return Response([tag.name for tag in tags], status=status.HTTP_200_OK)
+        if with_counts:
+            counts = tag_index.index.facets()
+            return [{"name": tag.name, "count": counts.get(tag.name, 0)} for tag in tags]
+        return [tag.name for tag in tags]
 
 
 class ProductSearchView(APIView):
@@ -273,10 +394,21 @@ class ProductSearchView(APIView):
         if not query:
             return Response({"results": []}, status=status.HTTP_200_OK)
 
+        if autocomplete.enabled():
+            results = autocomplete.index.search(query, limit)
+            return Response({"results": results}, status=status.HTTP_200_OK)
+
+        params = {"q": query.lower(), "limit": limit}
+        return catalog_cache.cached_response(
+            "search", params, lambda: self.search_products(query, limit)
+        )
+
+    def search_products(self, query, limit):
+        # The backend narrows the candidates through its index, the rank below
+        # only runs on the matching rows
         queryset = (
-            product_models.Product.objects.filter(
-                Q(title__icontains=query) | Q(description__icontains=query)
-            )
+            get_search_backend()
+            .filter(product_models.Product.objects.all(), query)
             .annotate(
                 search_rank=Case(
                     When(title__istartswith=query, then=Value(0)),
@@ -290,15 +422,7 @@ class ProductSearchView(APIView):
         )
 
         serializer = product_serializers.ProductSearchSerializer(queryset, many=True)
-        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
-
-
-def get_or_create_cart_id(request):
-    if "cart_id" not in request.session:
-        request.session["cart_id"] = (
-            request.session.session_key or request.session.create()
-        )
-    return request.session["cart_id"]
+        return {"results": serializer.data}
 
 
 @extend_schema(exclude=True)
@@ -341,21 +465,73 @@ def PrintBarcodesView(request):
     ids_str = request.GET.get("ids", "")
     if ids_str:
         ids = ids_str.split(",")
-        products = product_models.Product.objects.filter(id__in=ids)
+        products = product_models.Product.objects.filter(id__in=ids).order_by("id")
     else:
         # Fallback to single product by code if needed, but for now we use ids
         code = request.GET.get("code")
         if code:
             products = product_models.Product.objects.filter(code=code)
         else:
-            products = []
-            
-    return render(request, "product/print_barcodes.html", {"products": products})
+            products = product_models.Product.objects.none()
+
+    # ?sheet=pdf|svg|zpl renders every label server side into one document
+    sheet_format = request.GET.get("sheet")
+    if sheet_format:
+        if sheet_format not in sheets.SHEET_FORMATS:
+            return HttpResponseBadRequest(f"Unknown sheet format: {sheet_format}")
+        try:
+            layout = sheets.SheetLayout.from_params(request.GET)
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+        products = products.only("code", "title")
+        invalid = sheets.unencodable_codes(products)
+        if invalid:
+            return HttpResponseBadRequest(
+                "Codes that cannot be printed as barcodes: "
+                + ", ".join(repr(code) for code in invalid)
+            )
+        return sheets.sheet_response(products, sheet_format, layout)
+
+    # Image format of the per-label <img> tags
+    image_format = request.GET.get("format", barcodes.DEFAULT_FORMAT)
+    if image_format not in ("png", "svg"):
+        return HttpResponseBadRequest(f"Unknown image format: {image_format}")
+    return render(
+        request,
+        "product/print_barcodes.html",
+        {
+            "products": products,
+            "barcode_version": barcodes.options_digest(),
+            "barcode_format": image_format,
+        },
+    )
+
+
+# Barcode URLs carry the writer options digest, so their content never changes
+BARCODE_MAX_AGE = 60 * 60 * 24 * 365
 
 
 def BarcodeGenerateView(request, code):
-    # Generate barcode and return as PNG response
-    buffer = BytesIO()
-    barcode_image = Code128(str(code), writer=ImageWriter())
-    barcode_image.write(buffer)
-    return HttpResponse(buffer.getvalue(), content_type="image/png")
+    # PNG by default; SVG or ZPL through ?format= or the Accept header
+    fmt = barcodes.negotiate_format(request)
+    if fmt is None:
+        return HttpResponseBadRequest(f"Unknown barcode format: {request.GET['format']}")
+    etag = barcodes.barcode_etag(code, fmt=fmt)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        # Anyone can ask for any code: only those of a product are written to
+        # MEDIA_ROOT, the others just pass through the bounded memory cache
+        try:
+            data = barcodes.cache.get(
+                code,
+                fmt=fmt,
+                persist=lambda: product_models.Product.objects.filter(code=code).exists(),
+            )
+        except barcodes.ENCODER_ERRORS:
+            return HttpResponseBadRequest(f"Cannot encode {code!r} as Code 128")
+        response = HttpResponse(data, content_type=barcodes.FORMATS[fmt].content_type)
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=BARCODE_MAX_AGE, immutable=True)
+    if "format" not in request.GET:
+        patch_vary_headers(response, ["Accept"])
+    return response
@@ -1,6 +1,24 @@
 import pytest
+from django.core.cache import cache
+from django.urls import reverse
 from rest_framework.test import APIClient
-from product.models import Product, Tag, ProductTag
+from product import barcodes
+from product.models import Product, ProductImage, Tag, ProductTag
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # Product.save renders the barcode PNG under MEDIA_ROOT
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    yield settings.MEDIA_ROOT
+    barcodes.cache.clear()
 
 
 @pytest.fixture
@@ -22,3 +40,47 @@ def product_factory(db):
         return Product.objects.create(**defaults)
 
     return create_product
+
+
+@pytest.fixture
+def fill_cart(product_factory):
+    # Products {prefix}0..{prefix}{count-1} at 10.0 + i, added i + 1 times,
+    # with an image per suffix in ``images``
+    def fill(client, count, prefix="K", images=()):
+        for i in range(count):
+            product = product_factory(code=f"{prefix}{i}", price=10.0 + i)
+            for suffix in images:
+                ProductImage.objects.create(product=product, image=f"img/{i}-{suffix}.jpg")
+            client.post(
+                reverse("add-to-cart-api"),
+                {"product_code": product.code, "quantity": i + 1},
+                format="json",
+            )
+
+    return fill
+
+
+@pytest.fixture
+def cart_client(api_client, fill_cart):
+    # A saved session whose cart holds K0 once and K1 twice
+    session = api_client.session
+    session.create()
+    session.save()
+    fill_cart(api_client, 2)
+    return api_client
+
+
+@pytest.fixture
+def cart_queries():
+    # The SQL of a CaptureQueriesContext without the session and savepoint
+    # statements; only the statements on ``table`` if given
+    def queries(context, table=None):
+        return [
+            q["sql"]
+            for q in context.captured_queries
+            if "django_session" not in q["sql"]
+            and "SAVEPOINT" not in q["sql"]
+            and (table is None or table in q["sql"])
+        ]
+
+    return queries
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import pytest
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from product import autocomplete
+from product.cache import bump_catalog_version
+from product.models import CatalogVersion, Product
+
+
+@pytest.fixture
+def index(settings):
+    settings.PRODUCT_AUTOCOMPLETE_INDEX = True
+    autocomplete.index.version = None
+    yield autocomplete.index
+    autocomplete.index.version = None
+
+
+def search(api_client, q, limit=8):
+    response = api_client.get(reverse("product-search"), {"q": q, "limit": limit})
+    assert response.status_code == 200
+    return [item["code"] for item in response.data["results"]]
+
+
+@pytest.mark.django_db
+class TestAutocompleteIndex:
+    @pytest.fixture
+    def catalog(self, product_factory):
+        product_factory(code="P300", title="Velvet Coat", description="Warm")
+        product_factory(code="P301", title="Coat Dress", description="Formal")
+        product_factory(code="P302", title="Trench", description="A smart coat")
+        product_factory(code="P303", title="CREWNECK SWEATER", description="Wool")
+        product_factory(code="P304", title="Crew Socks", description="Cotton")
+
+    @pytest.mark.parametrize("q", ["coat", "co", "crew", "wool", "c"])
+    def test_matches_database_ranking(self, api_client, settings, catalog, q):
+        from_database = search(api_client, q)
+        settings.PRODUCT_AUTOCOMPLETE_INDEX = True
+        autocomplete.index.version = None
+
+        assert search(api_client, q) == from_database
+
+    def test_fuzzy_match_for_misspelling(self, api_client, index, catalog):
+        assert search(api_client, "crewnek") == ["P303"]
+
+    def test_limit(self, api_client, index, catalog):
+        assert search(api_client, "c", limit=2) == ["P303", "P301"]
+
+    def test_search_does_not_query_database(self, api_client, index, catalog):
+        index.load()
+
+        with CaptureQueriesContext(connection) as queries:
+            search(api_client, "coat")
+
+        assert not [
+            q
+            for q in queries.captured_queries
+            if "product_" in q["sql"] and "product_catalogversion" not in q["sql"]
+        ]
+
+    def test_signals_update_index(
+        self, api_client, index, catalog, django_capture_on_commit_callbacks
+    ):
+        index.load()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product = Product.objects.get(code="P302")
+            product.title = "Trench Coat"
+            product.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            Product.objects.get(code="P300").delete()
+
+        assert search(api_client, "trench c") == ["P302"]
+        assert "P300" not in search(api_client, "velvet")
+        assert "P300" not in index.entries
+
+    def test_reloads_when_catalog_changed_elsewhere(
+        self, api_client, index, catalog
+    ):
+        index.load()
+        # Another process: a write without signals, then its version bump
+        Product.objects.filter(code="P302").update(title="Parka")
+        CatalogVersion.objects.update(version=F("version") + 1)
+
+        assert search(api_client, "parka") == ["P302"]
+
+    def test_refresh_after_a_missed_change_reloads(
+        self, api_client, index, catalog, django_capture_on_commit_callbacks
+    ):
+        index.load()
+        Product.objects.filter(code="P302").update(title="Parka")
+        bump_catalog_version()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product = Product.objects.get(code="P300")
+            product.title = "Parka Vest"
+            product.save()
+
+        assert sorted(search(api_client, "parka")) == ["P300", "P302"]
+
+
+def test_edit_distance():
+    assert autocomplete.edit_distance("crewnek", "crewneck") == 1
+    assert autocomplete.edit_distance("", "abc") == 3
+    assert autocomplete.edit_distance("kitten", "sitting") == 3
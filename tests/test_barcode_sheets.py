@@ -0,0 +1,136 @@
+import re
+
+import pytest
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from django.urls import reverse
+
+from product import sheets
+from product.models import Product
+
+
+def xref_offsets_match(pdf):
+    """Every xref entry points at the start of its object."""
+    start = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    lines = pdf[start:].split(b"trailer")[0].split(b"\n")
+    size = int(lines[1].split()[1])
+    return all(
+        pdf[int(line[:10]) :].startswith(b"%d 0 obj" % obj_id)
+        for obj_id, line in enumerate(lines[3 : 2 + size], 1)
+    )
+
+
+@pytest.fixture
+def labelled_products(db):
+    return [
+        Product.objects.create(code=str(5000 + i), title=f"Piatto <{i}>", price=1)
+        for i in range(5)
+    ]
+
+
+@pytest.mark.django_db
+class TestBarcodeSheets:
+    def sheet(self, client, products, **params):
+        ids = ",".join(str(product.pk) for product in products)
+        return client.get(reverse("print-barcodes"), {"ids": ids, **params})
+
+    def test_pdf_sheet_is_one_streamed_document(self, client, labelled_products):
+        response = self.sheet(client, labelled_products, sheet="pdf", columns=2, rows=2)
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response["Content-Type"] == "application/pdf"
+        pdf = b"".join(response.streaming_content)
+        assert pdf.startswith(b"%PDF-1.4")
+        assert pdf.rstrip().endswith(b"%%EOF")
+        # Five labels on a 2x2 grid
+        assert b"/Count 2" in pdf
+        assert pdf.count(b"/Subtype /Image") == 5
+        assert xref_offsets_match(pdf)
+
+    def test_pdf_page_size_follows_paper(self, client, labelled_products):
+        response = self.sheet(client, labelled_products, sheet="pdf", paper="letter")
+
+        assert b"/MediaBox [0 0 612.00 792.00]" in b"".join(response.streaming_content)
+
+    def test_svg_sheet_inlines_every_label(self, client, labelled_products):
+        response = self.sheet(client, labelled_products, sheet="svg", columns=4)
+
+        html = b"".join(response.streaming_content).decode()
+        assert response["Content-Type"] == "text/html; charset=utf-8"
+        assert html.count("<svg") == 5
+        assert "repeat(4," in html
+        assert "Piatto &lt;0&gt;" in html
+        assert "<img" not in html
+
+    def test_zpl_sheet_has_one_label_per_product(self, client, labelled_products):
+        response = self.sheet(client, labelled_products, sheet="zpl")
+
+        zpl = b"".join(response.streaming_content).decode()
+        assert response["Content-Type"] == "application/zpl"
+        assert zpl.count("^XA") == zpl.count("^XZ") == 5
+        assert "^FDPiatto <0>^FS" in zpl
+
+    def test_html_sheet_can_use_svg_images(self, client, labelled_products):
+        response = self.sheet(client, labelled_products, format="svg")
+
+        assert response.content.decode().count("&format=svg") == 5
+
+    @pytest.mark.parametrize(
+        "params",
+        [{"sheet": "docx"}, {"sheet": "pdf", "columns": "0"}, {"sheet": "pdf", "paper": "A0"}],
+    )
+    def test_invalid_sheet_params(self, client, labelled_products, params):
+        assert self.sheet(client, labelled_products, **params).status_code == 400
+
+    def test_large_selection_renders_in_process_pool(
+        self, client, labelled_products, settings
+    ):
+        settings.BARCODE_SHEET_PARALLEL_MIN = 2
+
+        response = self.sheet(client, labelled_products, sheet="pdf")
+
+        pdf = b"".join(response.streaming_content)
+        assert sheets._pool is not None
+        assert pdf.count(b"/Subtype /Image") == 5
+
+    def test_admin_action_returns_pdf(self, admin_user, labelled_products):
+        request = RequestFactory().post("/admin/product/product/")
+        request.user = admin_user
+        model_admin = site._registry[Product]
+
+        response = model_admin.print_selected_barcodes(
+            request, Product.objects.filter(pk__in=[p.pk for p in labelled_products])
+        )
+
+        assert response["Content-Type"] == "application/pdf"
+        assert b"".join(response.streaming_content).count(b"/Subtype /Image") == 5
+
+    @pytest.mark.parametrize("sheet_format", sheets.SHEET_FORMATS)
+    def test_unencodable_code_is_rejected_before_streaming(
+        self, client, labelled_products, sheet_format
+    ):
+        product = Product.objects.create(code="è1", title="Accentato", price=1)
+
+        response = self.sheet(client, [*labelled_products, product], sheet=sheet_format)
+
+        assert response.status_code == 400
+        assert not response.streaming
+        assert "'è1'" in response.content.decode()
+
+    def test_admin_action_reports_unencodable_codes(self, admin_client, labelled_products):
+        product = Product.objects.create(code="è1", title="Accentato", price=1)
+
+        response = admin_client.post(
+            reverse("admin:product_product_changelist"),
+            {
+                "action": "print_selected_barcodes",
+                "_selected_action": [labelled_products[0].pk, product.pk],
+            },
+            follow=True,
+        )
+
+        assert not response.streaming
+        assert [str(m) for m in response.context["messages"]] == [
+            "Codes that cannot be printed as barcodes: 'è1'"
+        ]
@@ -0,0 +1,201 @@
+import os
+
+import pytest
+from django.urls import reverse
+
+from product import barcodes
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.mark.django_db
+class TestProductBarcodeField:
+    def test_save_fills_barcode_file(self, product_factory, media_root):
+        product = product_factory(code="4242")
+
+        assert product.barcode.name == barcodes.barcode_name("4242")
+        path = os.path.join(media_root, product.barcode.name)
+        with open(path, "rb") as image:
+            assert image.read().startswith(PNG_SIGNATURE)
+
+    def test_code_change_points_to_new_file(self, product_factory):
+        product = product_factory(code="4242")
+        product.code = "4343"
+        product.save(update_fields=["code"])
+
+        product.refresh_from_db()
+        assert product.barcode.name == barcodes.barcode_name("4343")
+
+    def test_name_depends_on_writer_options(self, settings):
+        default = barcodes.barcode_name("4242")
+        settings.BARCODE_WRITER_OPTIONS = {"module_height": 8}
+
+        assert barcodes.barcode_name("4242") != default
+
+    @pytest.mark.parametrize("code", ["", "caffè"])
+    def test_unencodable_code_saves_without_barcode(self, product_factory, code, caplog):
+        product = product_factory(code=code)
+
+        product.refresh_from_db()
+        assert product.barcode.name == ""
+        assert "Cannot encode product code" in caplog.text
+
+    def test_codes_differing_in_punctuation_get_their_own_file(self):
+        assert barcodes.barcode_name("AB 1") != barcodes.barcode_name("AB.1")
+        assert barcodes.barcode_name("AB/1") != barcodes.barcode_name("AB_1")
+
+
+@pytest.mark.django_db
+class TestBarcodeGenerateView:
+    def test_serves_png_with_immutable_caching(self, client):
+        response = client.get(reverse("barcode-generate", args=["4242"]))
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/png"
+        assert response.content.startswith(PNG_SIGNATURE)
+        assert response["ETag"] == barcodes.barcode_etag("4242")
+        assert "immutable" in response["Cache-Control"]
+        assert "max-age=31536000" in response["Cache-Control"]
+
+    def test_matching_etag_returns_304(self, client):
+        url = reverse("barcode-generate", args=["4242"])
+        etag = client.get(url)["ETag"]
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_renders_once_then_serves_from_cache(
+        self, client, monkeypatch, media_root, product_factory
+    ):
+        product_factory(code="4242")
+        url = reverse("barcode-generate", args=["4242"])
+        first = client.get(url).content
+
+        def fail(*args, **kwargs):
+            raise AssertionError("barcode rendered again")
+
+        monkeypatch.setattr(barcodes, "render_barcode", fail)
+        assert client.get(url).content == first
+        # Evicted from memory: read back from MEDIA_ROOT
+        barcodes.cache.clear()
+        assert client.get(url).content == first
+        assert os.path.exists(os.path.join(media_root, barcodes.barcode_name("4242")))
+
+    def test_unknown_codes_are_not_written_to_disk(self, client, media_root, product_factory):
+        product_factory(code="4242")
+
+        for code in ("nope-1", "nope-2"):
+            response = client.get(reverse("barcode-generate", args=[code]))
+            assert response.content.startswith(PNG_SIGNATURE)
+            assert not os.path.exists(os.path.join(media_root, barcodes.barcode_name(code)))
+        # Served again from memory
+        assert barcodes.barcode_name("nope-1") in barcodes.cache.images
+
+    def test_product_codes_are_written_on_a_miss(self, client, media_root, product_factory):
+        product = product_factory(code="4242")
+        os.remove(os.path.join(media_root, product.barcode.name))
+
+        client.get(reverse("barcode-generate", args=["4242"]))
+
+        assert os.path.exists(os.path.join(media_root, product.barcode.name))
+
+    def test_memory_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(barcodes.cache, "maxsize", 2)
+        for code in ("1", "2", "3"):
+            barcodes.cache.get(code)
+
+        assert list(barcodes.cache.images) == [
+            barcodes.barcode_name("2"),
+            barcodes.barcode_name("3"),
+        ]
+
+    def test_print_sheet_links_versioned_urls(self, client, product_factory):
+        product = product_factory(code="4242")
+
+        response = client.get(reverse("print-barcodes"), {"ids": product.pk})
+
+        assert (
+            f"/products/barcode/4242/?v={barcodes.options_digest()}"
+            in response.content.decode()
+        )
+
+
+@pytest.mark.django_db
+class TestBarcodeFormats:
+    def test_svg_by_query_param(self, client):
+        response = client.get(reverse("barcode-generate", args=["4242"]), {"format": "svg"})
+
+        assert response["Content-Type"] == "image/svg+xml"
+        assert b"<svg" in response.content
+        assert response["ETag"] == barcodes.barcode_etag("4242", fmt="svg")
+        assert response["ETag"] != barcodes.barcode_etag("4242")
+
+    def test_zpl_by_accept_header(self, client):
+        response = client.get(
+            reverse("barcode-generate", args=["4242"]), HTTP_ACCEPT="application/zpl"
+        )
+
+        assert response["Content-Type"] == "application/zpl"
+        assert response.content.startswith(b"^XA")
+        assert b"^FD4242^FS" in response.content
+        assert "Accept" in response["Vary"]
+
+    @pytest.mark.parametrize(
+        "accept",
+        [
+            # Chrome and Firefox, for an <img>
+            "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+            "image/avif,image/webp,image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5",
+            "*/*",
+            "",
+        ],
+    )
+    def test_browser_image_requests_get_png(self, client, accept):
+        response = client.get(reverse("barcode-generate", args=["4242"]), HTTP_ACCEPT=accept)
+
+        assert response["Content-Type"] == "image/png"
+
+    @pytest.mark.parametrize(
+        "accept, content_type",
+        [
+            ("image/svg+xml", "image/svg+xml"),
+            ("image/svg+xml, image/*;q=0.5", "image/svg+xml"),
+            ("image/png;q=0.5, image/svg+xml", "image/svg+xml"),
+            ("image/svg+xml;q=0.5, image/png", "image/png"),
+        ],
+    )
+    def test_accept_preferences(self, client, accept, content_type):
+        response = client.get(reverse("barcode-generate", args=["4242"]), HTTP_ACCEPT=accept)
+
+        assert response["Content-Type"] == content_type
+
+    def test_unencodable_code(self, client):
+        response = client.get(reverse("barcode-generate", args=["caffè"]))
+
+        assert response.status_code == 400
+
+    def test_unknown_format(self, client):
+        response = client.get(reverse("barcode-generate", args=["4242"]), {"format": "gif"})
+
+        assert response.status_code == 400
+
+    def test_zpl_escapes_control_characters(self):
+        label = barcodes.zpl_label("A^B~C_D", {}, title="x^y")
+
+        assert "^FH_^FDA_5EB_7EC_5FD^FS" in label
+        assert "^FH_^FDx_5Ey^FS" in label
+
+    def test_formats_are_cached_separately(self, media_root):
+        png = barcodes.cache.get("4242")
+        svg = barcodes.cache.get("4242", fmt="svg")
+        barcodes.cache.get("4242", fmt="zpl")
+
+        assert png != svg
+        assert os.path.exists(os.path.join(media_root, barcodes.barcode_name("4242", fmt="svg")))
+        # ZPL stays in memory only
+        assert not os.path.exists(
+            os.path.join(media_root, barcodes.barcode_name("4242", fmt="zpl"))
+        )
+        assert barcodes.barcode_name("4242", fmt="zpl") in barcodes.cache.images
@@ -0,0 +1,105 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.cart_backends import CacheCartBackend
+from orders.models import CartItem, Order, OrderItem
+from product.models import Product, ProductImage
+
+
+def product_id(code):
+    return Product.objects.get(code=code).pk
+
+
+@pytest.fixture
+def cache_cart(settings):
+    settings.CART_BACKEND = "cache"
+
+
+@pytest.mark.django_db
+class TestCacheCartBackend:
+    def test_cart_lives_in_one_cache_entry(self, cache_cart, api_client, product_factory):
+        product_factory(code="M1", price=5.0)
+        product_factory(code="M2", price=7.0)
+        add = reverse("add-to-cart-api")
+        api_client.post(add, {"product_code": "M1", "quantity": 2}, format="json")
+        api_client.post(add, {"product_code": "M2"}, format="json")
+
+        cart_id = api_client.session["cart_id"]
+        assert CartItem.objects.count() == 0
+        assert cache.get(f"cart:{cart_id}") == {
+            "M1": [product_id("M1"), 2],
+            "M2": [product_id("M2"), 1],
+        }
+
+    def test_adding_again_and_removing_skip_the_cart_tables(
+        self, cache_cart, api_client, product_factory, settings, cart_queries
+    ):
+        settings.CART_RESERVATION_MINUTES = 0
+        product_factory(code="M1")
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "M1"}, format="json")
+
+        with CaptureQueriesContext(connection) as context:
+            api_client.post(reverse("add-to-cart-api"), {"product_code": "M1"}, format="json")
+            api_client.post(reverse("remove-from-cart-api"), {"product_code": "M1"}, format="json")
+
+        # Only the release of the holds, whether there are any or not
+        queries = cart_queries(context)
+        assert len(queries) == 1
+        assert queries[0].startswith('DELETE FROM "orders_reservation"')
+
+    def test_summary_is_one_query(
+        self, cache_cart, api_client, product_factory, cart_queries
+    ):
+        product = product_factory(code="M1", price=5.0)
+        ProductImage.objects.create(product=product, image="img/m1.jpg")
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "M1", "quantity": 3}, format="json")
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(reverse("cart-api"))
+
+        assert len(cart_queries(context)) == 1
+        assert response.data["total_items"] == 3
+        assert response.data["total_price"] == 15.0
+        assert response.data["items"][0]["image"] == "img/m1.jpg"
+
+    def test_deleted_products_drop_out(self, cache_cart, api_client, product_factory):
+        product = product_factory(code="M1")
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "M1"}, format="json")
+        product.delete()
+
+        assert api_client.get(reverse("cart-api")).data["items"] == []
+
+    def test_checkout_writes_the_order_and_clears_the_cart(
+        self, cache_cart, api_client, product_factory, django_capture_on_commit_callbacks
+    ):
+        product_factory(code="M1", price=5.0)
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "M1"}, format="json")
+        cart_id = api_client.session["cart_id"]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse("checkout-api"), {"email": "a@example.com"}, format="json"
+            )
+
+        assert response.status_code == 200
+        assert OrderItem.objects.get().order == Order.objects.get()
+        assert CacheCartBackend().load(cart_id) == {}
+
+    def test_failed_checkout_keeps_the_cart(
+        self, cache_cart, api_client, product_factory
+    ):
+        product_factory(code="M1", price=5.0)
+        product_factory(code="M2", is_available=False)
+        add = reverse("add-to-cart-api")
+        api_client.post(add, {"product_code": "M1"}, format="json")
+        api_client.post(add, {"product_code": "M2"}, format="json")
+
+        response = api_client.post(
+            reverse("checkout-api"), {"email": "a@example.com"}, format="json"
+        )
+
+        assert response.status_code == 409
+        assert len(CacheCartBackend().load(api_client.session["cart_id"])) == 2
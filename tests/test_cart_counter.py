@@ -0,0 +1,66 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.cart import CART_COUNT_KEY
+from orders.context_processors import cart_processor
+
+
+@pytest.mark.django_db
+class TestCartCounter:
+    def test_cart_views_keep_the_counter(self, cart_client):
+        assert cart_client.session[CART_COUNT_KEY] == 3
+
+        cart_client.post(reverse("remove-from-cart-api"), {"product_code": "K1"}, format="json")
+        assert cart_client.session[CART_COUNT_KEY] == 1
+
+        cart_client.post(reverse("checkout-api"), {"email": "a@example.com"}, format="json")
+        assert cart_client.session[CART_COUNT_KEY] == 0
+
+    def test_middleware_does_not_query_cart_items(self, cart_client, cart_queries):
+        with CaptureQueriesContext(connection) as context:
+            response = cart_client.get(reverse("tag-list"))
+
+        assert response.status_code == 200
+        assert cart_queries(context, "orders_cartitem") == []
+
+    def test_missing_counter_is_rebuilt_once(self, cart_client, cart_queries):
+        session = cart_client.session
+        del session[CART_COUNT_KEY]
+        session.save()
+
+        with CaptureQueriesContext(connection) as context:
+            cart_client.get(reverse("tag-list"))
+        assert len(cart_queries(context, "orders_cartitem")) == 1
+        assert cart_client.session[CART_COUNT_KEY] == 3
+
+        with CaptureQueriesContext(connection) as context:
+            cart_client.get(reverse("tag-list"))
+        assert cart_queries(context, "orders_cartitem") == []
+
+    def test_cart_view_reconciles_the_counter(self, cart_client):
+        session = cart_client.session
+        session[CART_COUNT_KEY] = 42
+        session.save()
+
+        cart_client.get(reverse("cart-api"))
+
+        assert cart_client.session[CART_COUNT_KEY] == 3
+
+    def test_context_processor_reads_the_counter(self, cart_client, cart_queries):
+        request = RequestFactory().get("/")
+        request.session = cart_client.session
+
+        with CaptureQueriesContext(connection) as context:
+            assert cart_processor(request) == {"cart_count": 3}
+        assert cart_queries(context, "orders_cartitem") == []
+
+    def test_no_cart_means_zero_without_queries(self, db):
+        request = RequestFactory().get("/")
+        request.session = {}
+
+        with CaptureQueriesContext(connection) as context:
+            assert cart_processor(request) == {"cart_count": 0}
+        assert context.captured_queries == []
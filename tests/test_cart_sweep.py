@@ -0,0 +1,88 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders import tasks
+from orders.maintenance import sweep_expired_carts
+from orders.models import CartItem
+
+
+@pytest.fixture
+def carts(product_factory):
+    products = [product_factory(code=f"S{i}") for i in range(4)]
+    old = timezone.now() - timedelta(days=30)
+
+    def add(session_id, product, added):
+        item = CartItem.objects.create(session_id=session_id, product=product)
+        CartItem.objects.filter(pk=item.pk).update(date_added=added)
+
+    # Abandoned cart
+    for product in products:
+        add("abandoned", product, old)
+    # Old cart still being filled: kept whole
+    add("active", products[0], old)
+    add("active", products[1], timezone.now())
+    # Recent cart
+    add("recent", products[2], timezone.now())
+
+
+@pytest.mark.django_db
+class TestCartSweep:
+    def test_deletes_only_abandoned_carts(self, carts):
+        deleted, elapsed = sweep_expired_carts(timedelta(days=14))
+
+        assert deleted == 4
+        assert elapsed >= 0
+        assert set(CartItem.objects.values_list("session_id", flat=True)) == {
+            "active",
+            "recent",
+        }
+
+    def test_deletes_in_bounded_batches(self, carts):
+        with CaptureQueriesContext(connection) as context:
+            sweep_expired_carts(timedelta(days=14), batch_size=3)
+
+        deletes = [q["sql"] for q in context.captured_queries if q["sql"].startswith("DELETE")]
+        assert len(deletes) == 2
+
+    def test_command_reports_rows_and_time(self, carts):
+        out = StringIO()
+
+        call_command("sweep_carts", "--ttl-days", "14", "--batch-size", "2", stdout=out)
+
+        assert "Deleted 4 expired cart items in" in out.getvalue()
+        assert CartItem.objects.count() == 3
+
+    def test_periodic_sweeper(self, carts, monkeypatch):
+        swept = threading.Event()
+        calls = []
+
+        def fake_sweep():
+            calls.append(True)
+            swept.set()
+            return 0, 0.0
+
+        monkeypatch.setattr(tasks, "sweep_expired_carts", fake_sweep)
+        monkeypatch.setattr(tasks, "sweep_expired_reservations", lambda: (0, 0.0))
+        monkeypatch.setattr(tasks, "purge_expired_keys", lambda: (0, 0.0))
+        monkeypatch.setattr(tasks, "close_old_connections", lambda: None)
+        stop = threading.Event()
+        thread = threading.Thread(target=tasks.run_cart_sweeper, args=(0.01, stop))
+        thread.start()
+
+        assert swept.wait(5)
+        stop.set()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert calls
+
+    def test_sweeper_is_off_without_interval(self, settings):
+        settings.CART_SWEEP_INTERVAL = 0
+
+        assert tasks.start_cart_sweeper() is None
@@ -0,0 +1,157 @@
+import pytest
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.cart import CART_COUNT_KEY
+from orders.cart_backends import DatabaseCartBackend
+from orders.models import CartItem
+
+
+@pytest.mark.django_db
+class TestAddToCartUpsert:
+    def test_repeated_add_increments_in_one_update(
+        self, api_client, product_factory, settings, cart_queries
+    ):
+        # With holds the product is looked up to renew its hold, see below
+        settings.CART_RESERVATION_MINUTES = 0
+        product_factory(code="U1")
+        url = reverse("add-to-cart-api")
+        api_client.post(url, {"product_code": "U1", "quantity": 2}, format="json")
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.post(url, {"product_code": "U1", "quantity": 3}, format="json")
+
+        assert response.status_code == 200
+        statements = cart_queries(context)
+        assert len(statements) == 1
+        assert statements[0].startswith('UPDATE "orders_cartitem"')
+        assert CartItem.objects.get().quantity == 5
+
+    def test_repeated_add_renews_the_hold_then_increments(
+        self, api_client, product_factory, cart_queries
+    ):
+        product_factory(code="U1")
+        url = reverse("add-to-cart-api")
+        api_client.post(url, {"product_code": "U1", "quantity": 2}, format="json")
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.post(url, {"product_code": "U1", "quantity": 3}, format="json")
+
+        assert response.status_code == 200
+        statements = cart_queries(context)
+        # Product lookup, the three statements of the hold, then the increment
+        assert len(statements) == 5
+        assert statements[-1].startswith('UPDATE "orders_cartitem"')
+        assert CartItem.objects.get().quantity == 5
+
+    def test_stale_read_does_not_lose_updates(self, product_factory):
+        product = product_factory(code="U1")
+        DatabaseCartBackend().add("cart", product, 1)
+        # Simulates a concurrent request that saw no row and tried to insert
+        DatabaseCartBackend().add("cart", product, 2)
+
+        assert CartItem.objects.get().quantity == 3
+
+    def test_unknown_product(self, api_client):
+        response = api_client.post(
+            reverse("add-to-cart-api"), {"product_code": "NOPE"}, format="json"
+        )
+
+        assert response.status_code == 404
+        assert CartItem.objects.count() == 0
+
+    def test_rejects_non_positive_quantity(self, api_client, product_factory):
+        product_factory(code="U1")
+
+        response = api_client.post(
+            reverse("add-to-cart-api"), {"product_code": "U1", "quantity": 0}, format="json"
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestAddManyToCart:
+    url = reverse("add-many-to-cart-api")
+
+    def add_many(self, client, items):
+        return client.post(self.url, {"items": items}, format="json")
+
+    def test_adds_and_increments_in_one_transaction(self, api_client, product_factory):
+        for code in ("B1", "B2", "B3"):
+            product_factory(code=code)
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "B1"}, format="json")
+
+        response = self.add_many(
+            api_client,
+            [
+                {"product_code": "B1", "quantity": 2},
+                {"product_code": "B2"},
+                {"product_code": "B3", "quantity": 4},
+                {"product_code": "B2", "quantity": 1},
+            ],
+        )
+
+        assert response.status_code == 200
+        assert response.data["quantity"] == 8
+        quantities = dict(CartItem.objects.values_list("product__code", "quantity"))
+        assert quantities == {"B1": 3, "B2": 2, "B3": 4}
+        assert api_client.session[CART_COUNT_KEY] == 9
+
+    @pytest.mark.parametrize("count", [2, 12])
+    def test_constant_number_of_queries(
+        self, api_client, product_factory, count, cart_queries
+    ):
+        codes = [f"N{i}" for i in range(count * 2)]
+        for code in codes:
+            product_factory(code=code)
+        # Half of the products are already in the cart
+        self.add_many(api_client, [{"product_code": code} for code in codes[:count]])
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.add_many(api_client, [{"product_code": code} for code in codes])
+
+        assert response.status_code == 200
+        # Products, the three reservation statements, existing rows, one
+        # UPDATE, one INSERT
+        assert len(cart_queries(context)) == 7
+
+    def test_missing_products_change_nothing(self, api_client, product_factory):
+        product_factory(code="B1")
+
+        response = self.add_many(
+            api_client, [{"product_code": "B1"}, {"product_code": "NOPE"}]
+        )
+
+        assert response.status_code == 404
+        assert response.data["missing"] == ["NOPE"]
+        assert CartItem.objects.count() == 0
+
+    @pytest.mark.parametrize(
+        "items",
+        [[], "B1", [{"quantity": 1}], [{"product_code": "B1", "quantity": "x"}],
+         [{"product_code": "B1", "quantity": -1}]],
+    )
+    def test_invalid_items(self, api_client, product_factory, items):
+        product_factory(code="B1")
+
+        assert self.add_many(api_client, items).status_code == 400
+
+    def test_conflicting_insert_is_retried(self, product_factory, monkeypatch):
+        product = product_factory(code="B1")
+        original = CartItem.objects.bulk_create
+        conflicts = []
+
+        def conflicting_bulk_create(objs, *args, **kwargs):
+            # A concurrent request of the session inserted the row first
+            if not conflicts:
+                conflicts.append(objs)
+                raise IntegrityError("unique_cart_item_per_session")
+            return original(objs, *args, **kwargs)
+
+        monkeypatch.setattr(CartItem.objects, "bulk_create", conflicting_bulk_create)
+        DatabaseCartBackend().add_many("cart", {"B1": product.pk}, {"B1": 2})
+
+        assert len(conflicts) == 1
+        assert CartItem.objects.get().quantity == 2
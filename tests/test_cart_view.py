@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.models import CartItem
+
+
+def get_cart(client):
+    response = client.get(reverse("cart-api"))
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.django_db
+class TestCartView:
+    def test_summary_is_one_query(self, api_client, cart_queries, fill_cart):
+        fill_cart(api_client, 3, prefix="Q", images=("a", "b"))
+
+        with CaptureQueriesContext(connection) as context:
+            response = get_cart(api_client)
+        queries = cart_queries(context)
+
+        assert len(queries) == 1
+        assert response.data["total_items"] == 1 + 2 + 3
+        assert response.data["total_price"] == 10.0 * 1 + 11.0 * 2 + 12.0 * 3
+        assert [item["image"] for item in response.data["items"]] == [
+            "img/0-a.jpg",
+            "img/1-a.jpg",
+            "img/2-a.jpg",
+        ]
+        assert response.data["items"][2]["total"] == 36.0
+
+    @pytest.mark.parametrize("count", [1, 8])
+    def test_query_count_does_not_grow_with_items(
+        self, api_client, count, cart_queries, fill_cart
+    ):
+        fill_cart(api_client, count, prefix="Q", images=("a", "b"))
+
+        with CaptureQueriesContext(connection) as context:
+            response = get_cart(api_client)
+        queries = cart_queries(context)
+
+        assert len(response.data["items"]) == count
+        assert len(queries) == 1
+
+    def test_item_without_image(self, api_client, product_factory):
+        product_factory(code="NOIMG", price=5.0)
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "NOIMG"}, format="json")
+
+        response = get_cart(api_client)
+
+        assert response.data["items"][0]["image"] is None
+        assert response.data["total_price"] == 5.0
+
+    def test_empty_cart(self, api_client, cart_queries):
+        with CaptureQueriesContext(connection) as context:
+            response = get_cart(api_client)
+        queries = cart_queries(context)
+
+        assert queries == []
+        assert response.data == {"items": [], "total_items": 0, "total_price": 0}
+
@@ -0,0 +1,176 @@
+from __future__ import annotations
+import threading
+import time
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from product import cache as catalog_cache
+from product import signals
+from product.models import CatalogVersion, Product, ProductImage, ProductTag, Tag
+
+
+def catalog_queries(queries):
+    return [
+        q
+        for q in queries.captured_queries
+        if "product_" in q["sql"] and "product_catalogversion" not in q["sql"]
+    ]
+
+
+@pytest.mark.django_db
+class TestCatalogResponseCache:
+    def test_second_list_request_is_served_from_cache(self, api_client, product_factory):
+        product_factory(code="1001")
+        url = reverse("product")
+
+        first = api_client.get(url, {"page_size": 5})
+        with CaptureQueriesContext(connection) as queries:
+            second = api_client.get(url, {"page_size": 5})
+
+        assert first["X-Cache"] == "MISS"
+        assert second["X-Cache"] == "HIT"
+        assert second.data == first.data
+        assert catalog_queries(queries) == []
+
+    def test_tag_order_does_not_change_the_key(self, api_client, product_factory):
+        url = reverse("product")
+
+        api_client.get(url, {"tags": "sale,denim"})
+        response = api_client.get(url, {"tags": "denim, sale"})
+
+        assert response["X-Cache"] == "HIT"
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda p: Product.objects.filter(pk=p.pk).get().save(),
+            lambda p: ProductTag.objects.create(
+                product=p, tag=Tag.objects.create(name="new")
+            ),
+            lambda p: ProductImage.objects.create(product=p, image="new.jpg"),
+            lambda p: p.delete(),
+        ],
+    )
+    def test_catalog_changes_invalidate_the_list(
+        self, api_client, product_factory, change
+    ):
+        product = product_factory(code="1001")
+        url = reverse("product")
+        api_client.get(url)
+
+        change(product)
+        response = api_client.get(url)
+
+        assert response["X-Cache"] == "MISS"
+
+    def test_version_bumped_by_another_process_invalidates_the_list(
+        self, api_client, product_factory
+    ):
+        product_factory(code="1001")
+        url = reverse("product")
+        api_client.get(url)
+
+        # What a bump from another worker or a management command leaves behind
+        CatalogVersion.objects.update(version=F("version") + 1)
+        response = api_client.get(url)
+
+        assert response["X-Cache"] == "MISS"
+
+    def test_version_survives_a_cache_clear(self):
+        version = catalog_cache.catalog_version()
+
+        cache.clear()
+
+        assert catalog_cache.catalog_version() == version
+
+    def test_bump_never_goes_backwards(self):
+        CatalogVersion.objects.update(version=F("version") + 10**15)
+        version = int(catalog_cache.catalog_version())
+
+        catalog_cache.bump_catalog_version()
+
+        assert int(catalog_cache.catalog_version()) == version + 1
+
+    def test_tag_rename_invalidates_tag_list(self, api_client):
+        tag = Tag.objects.create(name="sale")
+        url = reverse("tag-list")
+        assert api_client.get(url).data == ["sale"]
+
+        tag.name = "promo"
+        tag.save()
+
+        assert api_client.get(url).data == ["promo"]
+
+    def test_availability_change_invalidates_search(self, api_client, product_factory):
+        product = product_factory(code="1001", title="Silk Dress")
+        url = reverse("product-search")
+        api_client.get(url, {"q": "silk"})
+
+        product.is_available = False
+        product.save()
+        response = api_client.get(url, {"q": "SILK"})
+
+        assert response["X-Cache"] == "MISS"
+        assert response.data["results"][0]["is_available"] is False
+
+    def test_hit_and_miss_counters(self, api_client):
+        catalog_cache.reset_cache_stats()
+        url = reverse("tag-list")
+
+        api_client.get(url)
+        api_client.get(url)
+        api_client.get(url)
+
+        stats = catalog_cache.cache_stats()
+        assert stats["tags.misses"] == 1
+        assert stats["tags.hits"] == 2
+
+
+def test_concurrent_misses_build_once(settings):
+    settings.CATALOG_CACHE_TIMEOUT = 60
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return {"results": []}
+
+    responses = []
+    threads = [
+        threading.Thread(
+            target=lambda: responses.append(
+                catalog_cache.cached_response("test", {"q": "x"}, build, "1")
+            )
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert sorted(r["X-Cache"] for r in responses) == ["HIT"] * 7 + ["MISS"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_autocommit_change_bumps_with_the_cards(api_client, product_factory, monkeypatch):
+    product = product_factory(code="1001")
+    refresh = signals.refresh_product_cards
+    in_transaction = []
+
+    def recording_refresh(product_ids):
+        # The bump made just before must not be committed on its own
+        in_transaction.append(connection.in_atomic_block)
+        refresh(product_ids)
+
+    monkeypatch.setattr(signals, "refresh_product_cards", recording_refresh)
+    # The transfer view saves in autocommit
+    response = api_client.get(reverse("product-transfer", args=[product.code]))
+
+    assert response.status_code == 200
+    assert in_transaction == [True]
+    assert api_client.get(reverse("product")).data["results"][0]["is_available"] is False
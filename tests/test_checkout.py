@@ -0,0 +1,176 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import checkout
+from orders.cart_backends import DatabaseCartBackend
+from orders.models import CartItem, Order, OrderItem, OutboxEmail
+from product.models import Product
+
+
+def place(client):
+    return client.post(reverse("checkout-api"), {"email": "a@example.com"}, format="json")
+
+
+@pytest.mark.django_db
+class TestCheckout:
+    @pytest.mark.parametrize("count", [1, 6])
+    def test_query_count_does_not_grow_with_items(self, api_client, count, fill_cart):
+        fill_cart(api_client, count)
+
+        with CaptureQueriesContext(connection) as context:
+            response = place(api_client)
+
+        queries = [
+            q["sql"]
+            for q in context.captured_queries
+            if "django_session" not in q["sql"] and "SAVEPOINT" not in q["sql"]
+        ]
+        assert response.status_code == 200
+        assert len(queries) == 10
+        assert OrderItem.objects.count() == count
+
+    def test_total_is_computed_with_quantities(self, api_client, fill_cart):
+        fill_cart(api_client, 3)
+
+        response = place(api_client)
+
+        order = Order.objects.get()
+        assert response.data["total"] == 10.0 * 1 + 11.0 * 2 + 12.0 * 3
+        assert order.total == response.data["total"]
+        assert sorted(order.items.values_list("price", flat=True)) == [10.0, 11.0, 12.0]
+        assert CartItem.objects.count() == 0
+
+    def test_rejects_unavailable_products(self, api_client, product_factory, fill_cart):
+        fill_cart(api_client, 2)
+        product_factory(code="GONE", is_available=False)
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "GONE"}, format="json")
+
+        response = place(api_client)
+
+        assert response.status_code == 409
+        assert response.data["unavailable"] == ["GONE"]
+        assert Order.objects.count() == 0
+        assert CartItem.objects.count() == 3
+
+    @pytest.mark.parametrize("backend", ["db", "cache"])
+    def test_deleted_products_are_reported_and_dropped(
+        self, api_client, settings, backend, fill_cart
+    ):
+        settings.CART_BACKEND = backend
+        fill_cart(api_client, 2)
+        Product.objects.filter(code="K1").delete()
+
+        response = place(api_client)
+
+        if backend == "cache":
+            # Only the cache still has the line to report
+            assert response.status_code == 409
+            assert response.data["unavailable"] == ["K1"]
+            assert api_client.session["cart_items"] == 1
+            response = place(api_client)
+        assert response.status_code == 200
+        assert list(Order.objects.get().items.values_list("product__code", flat=True)) == ["K0"]
+
+    def test_rejects_products_in_a_pending_order(self, api_client, settings, fill_cart):
+        # Without holds, both carts can take the product
+        settings.CART_RESERVATION_MINUTES = 0
+        fill_cart(api_client, 1)
+        other = Client()
+        other.post(reverse("add-to-cart-api"), {"product_code": "K0"}, content_type="application/json")
+        assert place(other).status_code == 200
+
+        response = place(api_client)
+
+        assert response.status_code == 409
+        assert response.data["unavailable"] == ["K0"]
+        assert Order.objects.count() == 1
+
+    def test_stale_pending_order_no_longer_blocks(self, api_client, settings, fill_cart):
+        settings.CART_RESERVATION_MINUTES = 0
+        settings.ORDER_PENDING_HOLD_HOURS = 2
+        fill_cart(api_client, 1)
+        other = Client()
+        other.post(reverse("add-to-cart-api"), {"product_code": "K0"}, content_type="application/json")
+        assert place(other).status_code == 200
+        # Never confirmed by the shop
+        Order.objects.update(created_at=timezone.now() - timedelta(hours=3))
+
+        response = place(api_client)
+
+        assert response.status_code == 200
+        assert Order.objects.count() == 2
+
+    def test_failure_rolls_back_the_whole_order(self, api_client, monkeypatch, fill_cart):
+        fill_cart(api_client, 2)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(checkout.OrderItem.objects, "bulk_create", fail)
+        with pytest.raises(RuntimeError):
+            place(api_client)
+
+        assert Order.objects.count() == 0
+        assert CartItem.objects.count() == 2
+
+    def test_emails_are_queued_in_the_order_transaction(self, api_client, fill_cart):
+        fill_cart(api_client, 1)
+
+        place(api_client)
+
+        assert mail.outbox == []
+        assert OutboxEmail.objects.get().to == ["a@example.com"]
+
+    def test_empty_cart(self, api_client):
+        assert place(api_client).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_do_not_double_sell(product_factory):
+    product = product_factory(code="UNIQUE", price=50.0)
+    buyers = [f"buyer-{i}" for i in range(4)]
+    CartItem.objects.bulk_create(CartItem(session_id=buyer, product=product) for buyer in buyers)
+
+    barrier = threading.Barrier(len(buyers))
+    outcomes = []
+
+    def buy(session_id):
+        barrier.wait()
+        try:
+            # The in-memory test database reports a held lock at once rather
+            # than waiting for it like a database file: retry, as the timeout
+            # would. A failed attempt is rolled back whole.
+            for _ in range(500):
+                try:
+                    checkout.place_order(DatabaseCartBackend(), session_id, "a@example.com")
+                except checkout.ProductsUnavailable:
+                    outcomes.append("rejected")
+                except OperationalError as exc:
+                    if "locked" not in str(exc):
+                        raise
+                    time.sleep(0.01)
+                    continue
+                else:
+                    outcomes.append("sold")
+                return
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=buy, args=(buyer,)) for buyer in buyers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert sorted(outcomes) == ["rejected", "rejected", "rejected", "sold"]
+    assert OrderItem.objects.filter(product=product).count() == 1
+    assert Order.objects.count() == 1
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import pytest
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from product.models import CatalogVersion, ProductImage, ProductTag, Tag
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    @pytest.mark.parametrize("url_name", ["product", "tag-list"])
+    def test_catalog_endpoints_answer_304_from_the_version_alone(
+        self, api_client, product_factory, url_name
+    ):
+        product_factory(code="1001")
+        url = reverse(url_name)
+        first = api_client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert first.status_code == 200
+        assert first["ETag"].startswith('"')
+        assert "Last-Modified" in first
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second["ETag"] == first["ETag"]
+        catalog = [q["sql"] for q in queries.captured_queries if "product_" in q["sql"]]
+        assert len(catalog) == 1
+        assert "product_catalogversion" in catalog[0]
+
+    def test_list_etag_depends_on_params(self, api_client, product_factory):
+        product_factory(code="1001")
+        url = reverse("product")
+
+        first = api_client.get(url, {"page_size": 5})
+        other = api_client.get(url, {"page_size": 6})
+
+        assert first["ETag"] != other["ETag"]
+
+    def test_list_etag_changes_with_catalog(self, api_client, product_factory):
+        product = product_factory(code="1001")
+        url = reverse("product")
+        etag = api_client.get(url)["ETag"]
+
+        product.price = 99.0
+        product.save()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert response.data["results"][0]["price"] == 99.0
+
+    @pytest.mark.parametrize("url_name", ["product", "tag-list"])
+    def test_etag_follows_a_bump_from_another_process(
+        self, api_client, product_factory, url_name
+    ):
+        product_factory(code="1001")
+        url = reverse(url_name)
+        first = api_client.get(url)
+
+        # Another worker, or a management command, changed the catalog
+        CatalogVersion.objects.update(version=F("version") + 1)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert response.status_code == 200
+        assert response["ETag"] != first["ETag"]
+
+    def test_details_answer_304(self, api_client, product_factory):
+        product_factory(code="1001")
+        url = reverse("product-details-api", args=[1001])
+        first = api_client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert second.status_code == 304
+        product_queries = [
+            q
+            for q in queries.captured_queries
+            if "product_" in q["sql"] and "product_catalogversion" not in q["sql"]
+        ]
+        assert len(product_queries) == 1
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda p: ProductImage.objects.create(product=p, image="new.jpg"),
+            lambda p: ProductTag.objects.create(
+                product=p, tag=Tag.objects.create(name="sale")
+            ),
+        ],
+    )
+    def test_details_etag_changes_with_relations(
+        self, api_client, product_factory, change
+    ):
+        product = product_factory(code="1001")
+        url = reverse("product-details-api", args=[1001])
+        etag = api_client.get(url)["ETag"]
+
+        change(product)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_details_unknown_code(self, api_client):
+        response = api_client.get(reverse("product-details-api", args=[404]))
+
+        assert response.status_code == 404
@@ -0,0 +1,182 @@
+import smtplib
+import threading
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import email as outbox
+from orders import tasks
+from orders.email import deliver_outbox, queue_order_emails
+from orders.models import Order, OutboxEmail
+
+
+class RecordingBackend(EmailBackend):
+    """locmem backend counting the connections opened, failing on demand."""
+
+    opened = 0
+    fail_for = set()
+    unreachable = False
+
+    def open(self):
+        if RecordingBackend.unreachable:
+            raise smtplib.SMTPConnectError(421, "try again later")
+        RecordingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & RecordingBackend.fail_for:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (450, b"busy")})
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    RecordingBackend.opened = 0
+    RecordingBackend.fail_for = set()
+    RecordingBackend.unreachable = False
+    monkeypatch.setattr(outbox, "get_connection", lambda **kwargs: RecordingBackend(**kwargs))
+    return RecordingBackend
+
+
+@pytest.fixture
+def order(settings):
+    settings.SHOP_OWNER_EMAIL = "owner@example.com"
+    order = Order.objects.create(email="buyer@example.com", total=25)
+    queue_order_emails(order)
+    return order
+
+
+def make_due():
+    OutboxEmail.objects.exclude(next_attempt_at=None).update(next_attempt_at=timezone.now())
+
+
+@pytest.mark.django_db
+class TestEmailOutbox:
+    def test_order_emails_are_queued_not_sent(self, order):
+        assert mail.outbox == []
+        assert sorted(OutboxEmail.objects.values_list("to", flat=True)) == [
+            ["buyer@example.com"],
+            ["owner@example.com"],
+        ]
+        confirmation = OutboxEmail.objects.get(to=["buyer@example.com"])
+        assert confirmation.subject == f"Conferma ordine #{order.id}"
+        assert "<" not in confirmation.body
+        assert confirmation.html_body
+
+    def test_delivers_over_one_connection(self, order, backend):
+        assert deliver_outbox() == (2, 0)
+
+        assert backend.opened == 1
+        assert sorted(message.to[0] for message in mail.outbox) == [
+            "buyer@example.com",
+            "owner@example.com",
+        ]
+        assert mail.outbox[0].alternatives[0][1] == "text/html"
+        assert not OutboxEmail.objects.filter(sent_at=None).exists()
+        # Nothing left to send
+        assert deliver_outbox() == (0, 0)
+
+    def test_failed_email_is_retried_with_backoff(self, order, backend, settings):
+        settings.EMAIL_OUTBOX_RETRY_DELAY = 60
+        backend.fail_for = {"owner@example.com"}
+
+        assert deliver_outbox() == (1, 1)
+        failed = OutboxEmail.objects.get(to=["owner@example.com"])
+        assert failed.attempts == 1
+        assert "SMTPRecipientsRefused" in failed.last_error
+        assert failed.next_attempt_at > timezone.now() + timedelta(seconds=50)
+        # Not due yet
+        assert deliver_outbox() == (0, 0)
+
+        make_due()
+        deliver_outbox()
+        failed.refresh_from_db()
+        # The delay doubles
+        assert failed.next_attempt_at > timezone.now() + timedelta(seconds=110)
+
+        backend.fail_for = set()
+        make_due()
+        assert deliver_outbox() == (1, 0)
+        failed.refresh_from_db()
+        assert failed.sent_at is not None
+        assert failed.attempts == 3
+
+    def test_gives_up_after_max_attempts(self, order, backend, settings):
+        settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+        backend.unreachable = True
+
+        deliver_outbox()
+        make_due()
+        assert deliver_outbox() == (0, 2)
+
+        assert not OutboxEmail.objects.exclude(next_attempt_at=None).exists()
+        assert not OutboxEmail.objects.exclude(sent_at=None).exists()
+        assert mail.outbox == []
+
+    def test_claimed_emails_are_not_sent_twice(self, order, backend):
+        claimed = outbox.claim_due_emails(10)
+
+        assert len(claimed) == 2
+        # Another worker finds nothing due while the lease runs
+        assert deliver_outbox() == (0, 0)
+        assert mail.outbox == []
+
+    def test_command_drains_the_outbox(self, order, backend):
+        out = StringIO()
+
+        call_command("send_outbox", "--batch-size", "1", stdout=out)
+
+        assert "Sent 2 emails, 0 failed" in out.getvalue()
+        assert len(mail.outbox) == 2
+
+    def test_checkout_survives_a_mail_server_outage(
+        self, api_client, product_factory, backend, django_capture_on_commit_callbacks
+    ):
+        backend.unreachable = True
+        product_factory(code="E1", price=5.0)
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "E1"}, format="json")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse("checkout-api"), {"email": "a@example.com"}, format="json"
+            )
+
+        assert response.status_code == 200
+        assert OutboxEmail.objects.filter(sent_at=None).count() == 1
+
+
+def test_outbox_worker_wakes_up(monkeypatch):
+    delivered = threading.Event()
+    results = iter([(1, 0), (0, 0)])
+
+    def fake_deliver():
+        result = next(results, (0, 0))
+        if result == (0, 0):
+            delivered.set()
+        return result
+
+    monkeypatch.setattr(tasks, "deliver_outbox", fake_deliver)
+    monkeypatch.setattr(tasks, "close_old_connections", lambda: None)
+    stop, wake = threading.Event(), threading.Event()
+    thread = threading.Thread(target=tasks.run_outbox_worker, args=(60, stop, wake))
+    thread.start()
+
+    wake.set()
+    assert delivered.wait(5)
+    stop.set()
+    wake.set()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_outbox_worker_is_off_without_interval(settings):
+    settings.EMAIL_OUTBOX_INTERVAL = 0
+
+    assert tasks.start_outbox_worker() is None
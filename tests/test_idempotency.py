@@ -0,0 +1,144 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders import idempotency
+from orders.models import CartItem, IdempotencyKey, Order, OutboxEmail
+
+
+def post(client, name, data, key=None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post(reverse(name), data, format="json", headers=headers)
+
+
+@pytest.fixture
+def cart(api_client, product_factory):
+    product_factory(code="I1", price=20.0)
+    post(api_client, "add-to-cart-api", {"product_code": "I1"})
+    return api_client
+
+
+@pytest.mark.django_db
+class TestIdempotencyKeys:
+    def test_retried_checkout_places_one_order(self, cart):
+        first = post(cart, "checkout-api", {"email": "a@example.com"}, key="k-1")
+        retry = post(cart, "checkout-api", {"email": "a@example.com"}, key="k-1")
+
+        assert first.status_code == retry.status_code == 200
+        assert retry.data["order_id"] == first.data["order_id"]
+        assert retry["Idempotent-Replayed"] == "true"
+        assert Order.objects.count() == 1
+        assert OutboxEmail.objects.count() == 1
+
+    def test_replay_runs_no_transaction(self, cart):
+        post(cart, "checkout-api", {"email": "a@example.com"}, key="k-1")
+
+        with CaptureQueriesContext(connection) as context:
+            post(cart, "checkout-api", {"email": "a@example.com"}, key="k-1")
+
+        queries = [q["sql"] for q in context.captured_queries if "django_session" not in q["sql"]]
+        assert len(queries) == 1
+        assert '"orders_idempotencykey"' in queries[0]
+
+    def test_retried_add_to_cart_adds_once(self, api_client, product_factory):
+        product_factory(code="I2")
+        for _ in range(3):
+            response = post(api_client, "add-many-to-cart-api", {"items": [{"product_code": "I2"}]}, key="k-2")
+
+        assert response.status_code == 200
+        assert CartItem.objects.get().quantity == 1
+
+    def test_clients_without_a_cart_do_not_share_keys(self, api_client, product_factory):
+        product_factory(code="I3")
+        product_factory(code="I4")
+        other = APIClient()
+
+        first = post(api_client, "add-to-cart-api", {"product_code": "I3"}, key="k-8")
+        second = post(other, "add-to-cart-api", {"product_code": "I4"}, key="k-8")
+
+        assert first.status_code == second.status_code == 200
+        assert "Idempotent-Replayed" not in second
+        assert sorted(CartItem.objects.values_list("product__code", flat=True)) == ["I3", "I4"]
+        assert CartItem.objects.values("session_id").distinct().count() == 2
+
+    def test_without_a_key_requests_run_every_time(self, cart):
+        post(cart, "add-to-cart-api", {"product_code": "I1"})
+
+        assert CartItem.objects.get().quantity == 2
+        assert IdempotencyKey.objects.count() == 0
+
+    def test_client_errors_are_replayed(self, api_client):
+        first = post(api_client, "checkout-api", {}, key="k-3")
+        retry = post(api_client, "checkout-api", {}, key="k-3")
+
+        assert first.status_code == retry.status_code == 400
+        assert retry.data == first.data
+
+    def test_key_reused_for_another_request(self, cart):
+        post(cart, "checkout-api", {"email": "a@example.com"}, key="k-4")
+
+        response = post(cart, "checkout-api", {"email": "b@example.com"}, key="k-4")
+
+        assert response.status_code == 422
+        assert Order.objects.count() == 1
+
+    def test_keys_are_scoped_to_the_endpoint(self, cart):
+        post(cart, "remove-from-cart-api", {"product_code": "I1"}, key="k-5")
+        response = post(cart, "add-to-cart-api", {"product_code": "I1"}, key="k-5")
+
+        assert response.status_code == 200
+        assert IdempotencyKey.objects.count() == 2
+
+    def test_expired_key_runs_again(self, cart):
+        post(cart, "add-to-cart-api", {"product_code": "I1"}, key="k-6")
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        post(cart, "add-to-cart-api", {"product_code": "I1"}, key="k-6")
+
+        assert CartItem.objects.get().quantity == 3
+
+    def test_concurrent_duplicate_gets_the_first_response(self, cart, monkeypatch):
+        first = post(cart, "checkout-api", {"email": "a@example.com"}, key="k-7")
+        find_key = idempotency.find_key
+        calls = []
+
+        def not_there_yet(key, scope):
+            # The duplicate looked before the first request committed
+            calls.append(key)
+            return None if len(calls) == 1 else find_key(key, scope)
+
+        monkeypatch.setattr(idempotency, "find_key", not_there_yet)
+        retry = post(cart, "checkout-api", {"email": "a@example.com"}, key="k-7")
+
+        assert retry.data == first.data
+        assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_purge_deletes_expired_keys_in_batches():
+    now = timezone.now()
+    IdempotencyKey.objects.bulk_create(
+        IdempotencyKey(
+            key=f"k{i}",
+            scope="/cart/add/|",
+            fingerprint="",
+            expires_at=now + timedelta(hours=-1 if i < 5 else 1),
+        )
+        for i in range(6)
+    )
+    out = StringIO()
+
+    with CaptureQueriesContext(connection) as context:
+        call_command("purge_idempotency_keys", "--batch-size", "2", stdout=out)
+
+    deletes = [q for q in context.captured_queries if q["sql"].startswith("DELETE")]
+    assert len(deletes) == 3
+    assert "Deleted 5 expired idempotency keys in" in out.getvalue()
+    assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["k5"]
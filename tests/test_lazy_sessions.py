@@ -0,0 +1,77 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+
+@pytest.mark.django_db
+class TestLazySessions:
+    def test_anonymous_browsing_persists_no_session(self, api_client, product_factory):
+        product_factory(code="1234")
+
+        for url in (
+            reverse("home"),
+            reverse("product"),
+            reverse("tag-list"),
+            reverse("cart-api"),
+            reverse("product-details-api", args=[1234]),
+        ):
+            response = api_client.get(url)
+            assert response.status_code == 200, url
+
+        api_client.post(reverse("remove-from-cart-api"), {"product_code": "1234"}, format="json")
+        api_client.post(reverse("checkout-api"), {"email": "a@example.com"}, format="json")
+
+        assert Session.objects.count() == 0
+        assert "sessionid" not in api_client.cookies
+
+    def test_first_cart_item_persists_the_session(self, api_client, product_factory):
+        product_factory(code="1234")
+
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "1234"}, format="json")
+
+        assert Session.objects.count() == 1
+        session = api_client.session
+        assert len(session["cart_id"]) == 32
+        assert api_client.get(reverse("cart-api")).data["total_items"] == 1
+
+    def test_cart_works_with_signed_cookie_sessions(self, api_client, product_factory, settings):
+        settings.SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+        product_factory(code="1234")
+
+        api_client.post(reverse("add-to-cart-api"), {"product_code": "1234"}, format="json")
+
+        assert Session.objects.count() == 0
+        assert api_client.get(reverse("cart-api")).data["total_items"] == 1
+
+
+@pytest.mark.django_db
+class TestPurgeSessions:
+    def make_session(self, expire_date):
+        store = SessionStore()
+        store.create()
+        Session.objects.filter(pk=store.session_key).update(expire_date=expire_date)
+
+    def test_deletes_expired_sessions_in_batches(self):
+        for _ in range(5):
+            self.make_session(timezone.now() - timedelta(days=1))
+        self.make_session(timezone.now() + timedelta(days=1))
+        out = StringIO()
+
+        call_command("purge_sessions", "--batch-size", "2", stdout=out)
+
+        assert "Deleted 5 expired sessions" in out.getvalue()
+        assert Session.objects.count() == 1
+
+    def test_non_database_engine(self, settings):
+        settings.SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+        out = StringIO()
+
+        call_command("purge_sessions", stdout=out)
+
+        assert "needs no purge" in out.getvalue()
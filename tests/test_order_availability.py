@@ -1,6 +1,8 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from orders.models import Order, OrderItem
-from product.models import Product
+from product.models import Product, ProductCard, ProductHistory
 
 @pytest.mark.django_db
 class TestOrderAvailabilitySignals:
@@ -72,3 +74,106 @@ class TestOrderAvailabilitySignals:
         
         product.refresh_from_db()
         assert product.is_available is True
+
+    def test_deferred_confirmed_is_compared_with_the_stored_value(self, product_factory):
+        product = product_factory(code="P7", is_available=False)
+        order = Order.objects.create(email="test@example.com", confirmed=True)
+        OrderItem.objects.create(order=order, product=product, price=product.price)
+
+        order = Order.objects.defer("confirmed").get(pk=order.pk)
+        order.confirmed = True
+        order.save()
+
+        product.refresh_from_db()
+        assert product.is_available is False
+
+        order = Order.objects.defer("confirmed").get(pk=order.pk)
+        order.confirmed = False
+        order.save()
+
+        product.refresh_from_db()
+        assert product.is_available is True
+
+    def test_saving_without_the_deferred_field_leaves_availability(self, product_factory):
+        product = product_factory(code="P8", is_available=False)
+        order = Order.objects.create(email="test@example.com", confirmed=False)
+        OrderItem.objects.create(order=order, product=product, price=product.price)
+
+        order = Order.objects.defer("confirmed").get(pk=order.pk)
+        order.email = "other@example.com"
+        with CaptureQueriesContext(connection) as context:
+            order.save()
+
+        assert not [q for q in context.captured_queries if "product_product" in q["sql"]]
+        product.refresh_from_db()
+        assert product.is_available is False
+
+
+def order_with_items(product_factory, count, confirmed=False):
+    order = Order.objects.create(email="test@example.com", confirmed=confirmed)
+    products = [product_factory(code=f"N{count}-{i}") for i in range(count)]
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, price=product.price) for product in products
+    )
+    return Order.objects.get(pk=order.pk), products
+
+
+def confirmation_queries(order):
+    with CaptureQueriesContext(connection) as context:
+        order.confirmed = True
+        order.save()
+    return [q for q in context.captured_queries if "SAVEPOINT" not in q["sql"]]
+
+
+@pytest.mark.django_db
+class TestSetBasedAvailability:
+
+    @pytest.mark.parametrize("count", [1, 50])
+    def test_confirming_is_a_fixed_number_of_queries(self, product_factory, count):
+        order, products = order_with_items(product_factory, count)
+
+        queries = confirmation_queries(order)
+
+        # UPDATE order, item product ids, UPDATE products, version bump,
+        # rebuilt cards, version change for the tag index
+        assert len(queries) <= 9
+        assert not Product.objects.filter(pk__in=[p.pk for p in products], is_available=True).exists()
+
+    def test_query_count_does_not_grow_with_items(self, product_factory):
+        small, _ = order_with_items(product_factory, 1)
+        large, _ = order_with_items(product_factory, 50)
+
+        assert len(confirmation_queries(small)) == len(confirmation_queries(large))
+
+    def test_saving_without_a_transition_touches_no_product(self, product_factory):
+        order, _ = order_with_items(product_factory, 3, confirmed=True)
+
+        with CaptureQueriesContext(connection) as context:
+            order.label = "renamed"
+            order.save()
+
+        assert len(context.captured_queries) == 1
+
+    def test_products_are_not_saved_one_by_one(self, product_factory):
+        order, products = order_with_items(product_factory, 3)
+        history = ProductHistory.objects.count()
+
+        order.confirmed = True
+        order.save()
+
+        # No per-product post_save, but the catalog still sees the change
+        assert ProductHistory.objects.count() == history
+        assert not ProductCard.objects.filter(
+            pk__in=[p.pk for p in products], is_available=True
+        ).exists()
+
+    def test_deleting_a_confirmed_order_updates_once(self, product_factory):
+        order, products = order_with_items(product_factory, 20, confirmed=True)
+        Product.objects.update(is_available=False)
+
+        with CaptureQueriesContext(connection) as context:
+            order.delete()
+
+        updates = [q for q in context.captured_queries if q["sql"].startswith('UPDATE "product_product"')]
+        assert len(updates) == 1
+        assert Product.objects.filter(is_available=True).count() == 20
@@ -0,0 +1,124 @@
+import pytest
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.confirmation import set_orders_confirmed
+from orders.models import Order, OrderItem
+from product.models import Product, ProductCard
+
+
+@pytest.fixture
+def orders(product_factory):
+    """Three orders of two products each; the last product is in two orders."""
+    created = []
+    for i in range(3):
+        order = Order.objects.create(email=f"o{i}@example.com")
+        products = [product_factory(code=f"C{i}-{j}") for j in range(2)]
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, price=product.price) for product in products
+        )
+        created.append(order)
+    OrderItem.objects.create(
+        order=created[0], product=Product.objects.get(code="C2-1"), price=1
+    )
+    return created
+
+
+def unavailable_codes():
+    return set(Product.objects.filter(is_available=False).values_list("code", flat=True))
+
+
+@pytest.mark.django_db
+class TestSetOrdersConfirmed:
+    def test_confirms_and_reports_changed_products(self, orders):
+        result = set_orders_confirmed([orders[0].pk, orders[1].pk], True)
+
+        assert result == (2, 5)
+        assert unavailable_codes() == {"C0-0", "C0-1", "C1-0", "C1-1", "C2-1"}
+        assert ProductCard.objects.filter(is_available=False).count() == 5
+        # Already confirmed: nothing to do
+        assert set_orders_confirmed([orders[0].pk], True) == (0, 0)
+
+    def test_unconfirm_keeps_products_of_other_confirmed_orders(self, orders):
+        set_orders_confirmed([o.pk for o in orders], True)
+
+        assert set_orders_confirmed([orders[2].pk], False) == (1, 1)
+        # C2-1 is still in the confirmed first order
+        assert "C2-0" not in unavailable_codes()
+        assert "C2-1" in unavailable_codes()
+
+    def test_query_count_does_not_grow_with_selection(self, orders, product_factory):
+        with CaptureQueriesContext(connection) as small:
+            set_orders_confirmed([orders[0].pk], True)
+        many = []
+        for i in range(20):
+            order = Order.objects.create(email="x@example.com")
+            OrderItem.objects.create(order=order, product=product_factory(code=f"M{i}"), price=1)
+            many.append(order.pk)
+        with CaptureQueriesContext(connection) as large:
+            set_orders_confirmed(many, True)
+
+        assert len(large.captured_queries) == len(small.captured_queries)
+
+
+@pytest.mark.django_db
+class TestConfirmOrdersAdmin:
+    def test_bulk_action(self, admin_client, orders):
+        response = admin_client.post(
+            reverse("admin:orders_order_changelist"),
+            {"action": "confirm_orders", ACTION_CHECKBOX_NAME: [o.pk for o in orders]},
+            follow=True,
+        )
+
+        assert "3 orders confirmed, 6 products changed availability" in response.content.decode()
+        assert Order.objects.filter(confirmed=True).count() == 3
+
+    def test_changelist_annotates_item_counts(self, admin_client, orders):
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.get(reverse("admin:orders_order_changelist"))
+
+        counts = sorted(row.item_count for row in response.context["cl"].result_list)
+        assert counts == [2, 2, 3]
+        item_queries = [
+            q for q in context.captured_queries if q["sql"].startswith('SELECT "orders_orderitem"')
+        ]
+        assert item_queries == []
+
+
+@pytest.mark.django_db
+class TestConfirmOrdersApi:
+    url = "confirm-orders-api"
+
+    def test_staff_can_confirm_and_unconfirm(self, api_client, admin_user, orders):
+        api_client.force_authenticate(admin_user)
+
+        response = api_client.post(
+            reverse(self.url), {"order_ids": [orders[1].pk]}, format="json"
+        )
+        assert response.data == {"orders": 1, "products": 2}
+
+        response = api_client.post(
+            reverse(self.url), {"order_ids": [orders[1].pk], "confirmed": False}, format="json"
+        )
+        assert response.data == {"orders": 1, "products": 2}
+        assert unavailable_codes() == set()
+
+    def test_requires_staff(self, api_client, orders):
+        response = api_client.post(
+            reverse(self.url), {"order_ids": [orders[0].pk]}, format="json"
+        )
+
+        assert response.status_code in (401, 403)
+        assert not Order.objects.filter(confirmed=True).exists()
+
+    @pytest.mark.parametrize(
+        "data", [{}, {"order_ids": []}, {"order_ids": ["1"]}, {"order_ids": [1], "confirmed": "yes"}]
+    )
+    def test_rejects_invalid_data(self, api_client, admin_user, data):
+        api_client.force_authenticate(admin_user)
+
+        response = api_client.post(reverse(self.url), data, format="json")
+
+        assert response.status_code == 400
@@ -0,0 +1,71 @@
+import os
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from product import barcodes
+from product.models import Product, ProductCard
+
+
+def pregenerate(*args):
+    out = StringIO()
+    call_command("pregenerate_barcodes", *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def imported_products(db):
+    # bulk_create skips Product.save(), like a large import
+    return Product.objects.bulk_create(
+        Product(code=str(6000 + i), title=f"Imported {i}", price=1) for i in range(12)
+    )
+
+
+@pytest.mark.django_db
+class TestPregenerateBarcodes:
+    def test_renders_and_records_missing_barcodes(self, imported_products, media_root):
+        output = pregenerate("--workers", "1", "--chunk-size", "5")
+
+        assert "rendered 12 barcodes, updated 12 products" in output
+        assert "barcodes/s" in output
+        for product in Product.objects.all():
+            assert product.barcode.name == barcodes.barcode_name(product.code)
+            assert os.path.exists(os.path.join(media_root, product.barcode.name))
+
+    def test_skips_unencodable_codes(self, imported_products):
+        Product.objects.bulk_create([Product(code="caffè", title="Bad", price=1)])
+
+        output = pregenerate("--workers", "1")
+
+        assert "rendered 12 barcodes, updated 12 products" in output
+        assert Product.objects.get(code="caffè").barcode.name == ""
+        assert "rendered 0 barcodes, updated 0 products" in pregenerate("--workers", "1")
+
+    def test_second_run_is_a_no_op(self, imported_products):
+        pregenerate("--workers", "1")
+
+        assert "rendered 0 barcodes, updated 0 products" in pregenerate("--workers", "1")
+
+    def test_only_changed_codes_are_touched(self, imported_products):
+        pregenerate("--workers", "1")
+        product = imported_products[3]
+        Product.objects.filter(pk=product.pk).update(code="6999")
+        before = dict(Product.objects.values_list("pk", "updated_at"))
+
+        output = pregenerate("--workers", "1")
+
+        assert "rendered 1 barcodes, updated 1 products" in output
+        after = dict(Product.objects.values_list("pk", "updated_at"))
+        assert [pk for pk in after if after[pk] != before[pk]] == [product.pk]
+        card = ProductCard.objects.get(pk=product.pk)
+        assert barcodes.barcode_name("6999") in card.data["barcode"]
+
+    def test_renders_across_processes(self, imported_products):
+        output = pregenerate("--workers", "2")
+
+        assert "rendered 12 barcodes" in output
+
+    def test_rejects_invalid_workers(self, imported_products):
+        with pytest.raises(CommandError, match="must be positive"):
+            pregenerate("--workers", "0")
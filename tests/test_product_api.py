@@ -111,3 +111,78 @@ class TestProductAPI:
         assert len(response.data["results"]) == 1
         result = response.data["results"][0]
         assert set(result.keys()) == {"code", "title", "description", "is_available"}
+
+
+# COUNT + pagina + prefetch tag + prefetch immagini, piu' il salvataggio
+# della sessione fatto da CartMiddleware
+LIST_QUERY_BUDGET = 8
+
+
+@pytest.mark.django_db
+class TestProductQueryBudget:
+    @pytest.fixture
+    def catalog(self, product_factory):
+        from product import tag_index
+        from product.cards import rebuild_product_cards
+        from product.models import Tag, ProductTag, ProductImage
+
+        tags = [Tag.objects.create(name=name) for name in ("sale", "denim")]
+        products = [
+            product_factory(code=f"B{i:03d}", title=f"Item {i}") for i in range(100)
+        ]
+        ProductTag.objects.bulk_create(
+            [ProductTag(product=p, tag=tag) for p in products for tag in tags]
+        )
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=p, image=f"img/{i}-{suffix}.jpg")
+                for i, p in enumerate(products)
+                for suffix in ("a", "b")
+            ]
+        )
+        # bulk_create sends no signals
+        rebuild_product_cards()
+        # Budgets are for a warm worker: the tag index is loaded once per version
+        tag_index.index.load()
+
+    @pytest.mark.parametrize("page_size", [12, 100])
+    def test_list_stays_within_budget(
+        self, api_client, catalog, page_size, django_assert_max_num_queries
+    ):
+        url = reverse("product")
+        with django_assert_max_num_queries(LIST_QUERY_BUDGET):
+            response = api_client.get(url, {"page_size": page_size})
+
+        assert response.status_code == 200
+        assert len(response.data["results"]) == page_size
+        first = response.data["results"][0]
+        assert first["tags"] == ["sale", "denim"]
+        assert first["images"] == [
+            {"image": "img/99-a.jpg"},
+            {"image": "img/99-b.jpg"},
+        ]
+
+    def test_tag_filtered_list_stays_within_budget(
+        self, api_client, catalog, django_assert_max_num_queries
+    ):
+        url = reverse("product")
+        with django_assert_max_num_queries(LIST_QUERY_BUDGET):
+            response = api_client.get(url, {"page_size": 100, "tags": "sale"})
+
+        assert response.status_code == 200
+        assert response.data["count"] == 100
+
+    def test_details_stays_within_budget(
+        self, api_client, catalog, product_factory, django_assert_max_num_queries
+    ):
+        from product.models import ProductImage
+
+        product = product_factory(code="7007")
+        ProductImage.objects.create(product=product, image="img/7007.jpg")
+
+        url = reverse("product-details-api", args=[7007])
+        with django_assert_max_num_queries(LIST_QUERY_BUDGET):
+            response = api_client.get(url)
+
+        assert response.status_code == 200
+        assert response.data["images"] == [{"image": "img/7007.jpg"}]
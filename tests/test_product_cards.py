@@ -0,0 +1,126 @@
+from __future__ import annotations
+from io import StringIO
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from orders.models import Order, OrderItem
+from product.models import Product, ProductCard, ProductImage, ProductTag, Tag
+from product.serializers import ProductSerializer
+
+
+def card_data(product):
+    return ProductCard.objects.get(pk=product.pk).data
+
+
+def fresh_data(product):
+    product = Product.objects.with_catalog_relations().get(pk=product.pk)
+    return ProductSerializer(product).data
+
+
+@pytest.mark.django_db
+class TestProductCards:
+    def test_card_matches_serializer(self, product_factory):
+        product = product_factory(code="1001")
+        ProductTag.objects.create(product=product, tag=Tag.objects.create(name="sale"))
+        ProductImage.objects.create(product=product, image="a.jpg")
+
+        assert card_data(product) == fresh_data(product)
+        assert card_data(product)["tags"] == ["sale"]
+        assert card_data(product)["images"] == [{"image": "a.jpg"}]
+
+    def test_serializer_create_fills_relations(self, product_factory):
+        serializer = ProductSerializer(
+            data={"code": "1002", "title": "Coat", "uploaded_images": ["b.jpg"]}
+        )
+        assert serializer.is_valid(), serializer.errors
+        product = serializer.save()
+
+        assert card_data(product)["images"] == [{"image": "b.jpg"}]
+
+    def test_tag_rename_updates_cards(self, product_factory):
+        product = product_factory(code="1001")
+        tag = Tag.objects.create(name="sale")
+        ProductTag.objects.create(product=product, tag=tag)
+
+        tag.name = "promo"
+        tag.save()
+
+        assert card_data(product)["tags"] == ["promo"]
+
+    def test_order_confirmation_updates_availability(self, product_factory):
+        product = product_factory(code="1001")
+        order = Order.objects.create(email="a@example.com")
+        OrderItem.objects.create(order=order, product=product, price=10)
+
+        order.confirmed = True
+        order.save()
+
+        card = ProductCard.objects.get(pk=product.pk)
+        assert card.is_available is False
+        assert card.data["is_available"] is False
+
+    def test_product_delete_removes_card(self, product_factory):
+        product = product_factory(code="1001")
+        pk = product.pk
+
+        product.delete()
+
+        assert not ProductCard.objects.filter(pk=pk).exists()
+
+    def test_list_reads_cards_with_one_query(self, api_client, product_factory):
+        for i in range(5):
+            product_factory(code=f"100{i}")
+        from product import tag_index
+
+        tag_index.index.load()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("product"), {"pagination": "cursor"})
+
+        catalog = [
+            q["sql"]
+            for q in queries.captured_queries
+            if "product_" in q["sql"] and "product_catalogversion" not in q["sql"]
+        ]
+        assert len(catalog) == 1
+        assert "product_productcard" in catalog[0]
+        assert len(response.data["results"]) == 5
+
+    def test_check_and_rebuild_command(self, product_factory):
+        product = product_factory(code="1001")
+        ProductCard.objects.filter(pk=product.pk).update(data={"stale": True})
+        other = product_factory(code="1002")
+        ProductCard.objects.filter(pk=other.pk).delete()
+
+        with pytest.raises(CommandError, match="1 missing cards.*1 stale cards"):
+            call_command("rebuild_product_cards", "--check", stdout=StringIO())
+
+        out = StringIO()
+        call_command("rebuild_product_cards", stdout=out)
+        call_command("rebuild_product_cards", "--check", stdout=out)
+
+        assert "Rebuilt 2 product cards" in out.getvalue()
+        assert "up to date" in out.getvalue()
+        assert card_data(product) == fresh_data(product)
+
+    def test_migrate_fills_an_empty_card_table(self, api_client, product_factory):
+        product_factory(code="1001")
+        product_factory(code="1002")
+        # As right after the migration creating the table, on an existing catalog
+        ProductCard.objects.all().delete()
+        assert api_client.get(reverse("product")).data["results"] == []
+
+        call_command("migrate", verbosity=0)
+
+        response = api_client.get(reverse("product"))
+        assert sorted(item["code"] for item in response.data["results"]) == ["1001", "1002"]
+
+    def test_migrate_leaves_existing_cards_alone(self, product_factory):
+        product = product_factory(code="1001")
+        ProductCard.objects.filter(pk=product.pk).update(data={"stale": True})
+
+        call_command("migrate", verbosity=0)
+
+        assert card_data(product) == {"stale": True}
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from urllib.parse import parse_qs, urlparse
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+def walk(api_client, params):
+    codes = []
+    response = api_client.get(reverse("product"), {"pagination": "cursor", **params})
+    while True:
+        assert response.status_code == 200
+        codes.extend(item["code"] for item in response.data["results"])
+        if response.data["next"] is None:
+            return codes
+        response = api_client.get(response.data["next"])
+
+
+@pytest.mark.django_db
+class TestProductCursorPagination:
+    @pytest.fixture
+    def products(self, product_factory):
+        # Duplicated prices and a NULL price to exercise the tie breaker
+        prices = [30.0, 10.0, None, 20.0, 10.0, 30.0, 20.0, 10.0]
+        return [
+            product_factory(code=f"{2000 + i}", price=price)
+            for i, price in enumerate(prices)
+        ]
+
+    @pytest.mark.parametrize(
+        "sort, key, reverse_order",
+        [
+            ("-id", lambda p: p.pk, True),
+            ("price_asc", lambda p: (p.price is not None, p.price or 0, p.pk), False),
+            ("price_desc", lambda p: (p.price is not None, p.price or 0, p.pk), True),
+            ("year_asc", lambda p: (p.code, p.pk), False),
+            ("year_desc", lambda p: (p.code, p.pk), True),
+        ],
+    )
+    def test_walks_every_sort_without_gaps(
+        self, api_client, products, sort, key, reverse_order
+    ):
+        expected = [p.code for p in sorted(products, key=key, reverse=reverse_order)]
+
+        assert walk(api_client, {"sort": sort, "page_size": 3}) == expected
+
+    def test_matches_page_number_order(self, api_client, products):
+        url = reverse("product")
+        numbered = api_client.get(url, {"sort": "price_desc", "page_size": 100})
+
+        assert walk(api_client, {"sort": "price_desc", "page_size": 3}) == [
+            item["code"] for item in numbered.data["results"]
+        ]
+
+    def test_skips_count_query(self, api_client, products):
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(
+                reverse("product"), {"pagination": "cursor", "page_size": 3}
+            )
+
+        assert "count" not in response.data
+        assert "total_pages" not in response.data
+        assert not any("COUNT(" in q["sql"] for q in queries.captured_queries)
+
+    def test_tag_filter(self, api_client, products):
+        from product.models import Tag, ProductTag
+
+        tag = Tag.objects.create(name="sale")
+        for product in products[:5]:
+            ProductTag.objects.create(product=product, tag=tag)
+
+        codes = walk(api_client, {"tags": "sale", "sort": "year_asc", "page_size": 2})
+
+        assert codes == [p.code for p in products[:5]]
+
+    def test_invalid_cursor(self, api_client, products):
+        response = api_client.get(reverse("product"), {"cursor": "not-a-cursor"})
+
+        assert response.status_code == 404
+
+    def test_cursor_bound_to_sort(self, api_client, products):
+        first = api_client.get(
+            reverse("product"), {"pagination": "cursor", "page_size": 3}
+        )
+        cursor = parse_qs(urlparse(first.data["next"]).query)["cursor"][0]
+        assert api_client.get(reverse("product"), {"cursor": cursor}).status_code == 200
+
+        response = api_client.get(
+            reverse("product"), {"cursor": cursor, "sort": "price_asc"}
+        )
+
+        assert response.status_code == 404
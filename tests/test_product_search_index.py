@@ -0,0 +1,90 @@
+from __future__ import annotations
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from product.search import FTS_TABLE, get_search_backend, like_pattern
+
+
+def search(api_client, q):
+    response = api_client.get(reverse("product-search"), {"q": q})
+    assert response.status_code == 200
+    return [item["code"] for item in response.data["results"]]
+
+
+@pytest.mark.django_db
+class TestProductSearchIndex:
+    def test_uses_fts_on_sqlite(self):
+        assert get_search_backend().name == "sqlite_fts"
+
+    @pytest.mark.parametrize("backend", ["sqlite_fts", "scan"])
+    def test_ranking_matches_scan_backend(
+        self, api_client, product_factory, settings, backend
+    ):
+        settings.PRODUCT_SEARCH_BACKEND = backend
+        product_factory(code="P300", title="Velvet Coat", description="Warm")
+        product_factory(code="P301", title="Coat Dress", description="Formal")
+        product_factory(code="P302", title="Trench", description="A smart coat")
+        product_factory(code="P303", title="Another Coat", description="Wool")
+
+        assert search(api_client, "coat") == ["P301", "P303", "P300", "P302"]
+
+    def test_prefix_typeahead(self, api_client, product_factory):
+        product_factory(code="P100", title="Crewneck Sweater", description="")
+
+        assert search(api_client, "crew") == ["P100"]
+        assert search(api_client, "crewneck swe") == ["P100"]
+
+    @pytest.mark.parametrize("backend", ["sqlite_fts", "scan"])
+    @pytest.mark.parametrize(
+        "q, expected",
+        [
+            ("neck", ["P100"]),
+            ("WNEC", ["P100"]),
+            ("ck sw", ["P100"]),
+            ("ea", ["P100", "P101"]),
+            ("merino", ["P101"]),
+            ("50%", ["P101"]),
+            ('"', []),
+        ],
+    )
+    def test_matches_substrings_like_the_scan(
+        self, api_client, product_factory, settings, backend, q, expected
+    ):
+        settings.PRODUCT_SEARCH_BACKEND = backend
+        product_factory(code="P100", title="Crewneck Sweater", description="")
+        product_factory(code="P101", title="Cardigan", description="50% merino wool, leather")
+
+        assert sorted(search(api_client, q)) == expected
+
+    def test_index_follows_product_updates(self, api_client, product_factory):
+        product = product_factory(code="P100", title="Silk Dress", description="")
+
+        product.title = "Linen Shirt"
+        product.save()
+
+        assert search(api_client, "silk") == []
+        assert search(api_client, "linen") == ["P100"]
+
+    def test_index_follows_product_deletes(self, api_client, product_factory):
+        product = product_factory(code="P100", title="Silk Dress", description="")
+
+        product.delete()
+
+        assert search(api_client, "silk") == []
+
+    def test_rebuild_command(self, api_client, product_factory):
+        product_factory(code="P100", title="Silk Dress", description="")
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        assert search(api_client, "silk") == []
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        assert search(api_client, "dress") == ["P100"]
+
+
+def test_like_pattern_escapes_wildcards():
+    assert like_pattern("coat") == "%coat%"
+    assert like_pattern("50%_off\\") == "%50\\%\\_off\\\\%"
@@ -0,0 +1,193 @@
+"""
+Query plans of the hot endpoints. Each test captures the SQL an endpoint runs
+and fails when the database would answer it with a full table scan, or with
+an explicit sort where an index should provide the order.
+"""
+
+from __future__ import annotations
+import re
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from orders.maintenance import expired_cart_items
+from orders.models import IdempotencyKey, Order, Reservation
+from product.models import ProductHistory
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Tiny test tables make a seq scan cheapest: only allow it when
+            # there is no index to use
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute("EXPLAIN " + sql)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    pattern = r"Seq Scan on (\w+)" if connection.vendor == "postgresql" else r"^SCAN (\w+)$"
+    return [m.group(1) for line in plan if (m := re.search(pattern, line.strip()))]
+
+
+def explicit_sorts(plan):
+    marker = "Sort Key" if connection.vendor == "postgresql" else "TEMP B-TREE FOR ORDER BY"
+    return [line for line in plan if marker in line]
+
+
+def selects_on(queries, table):
+    return [
+        q["sql"]
+        for q in queries.captured_queries
+        if q["sql"].startswith("SELECT") and f'FROM "{table}"' in q["sql"]
+    ]
+
+
+def assert_no_full_scan(queries, table):
+    statements = selects_on(queries, table)
+    assert statements, f"no query on {table} was captured"
+    for sql in statements:
+        plan = query_plan(sql)
+        assert table not in full_scans(plan), f"full scan of {table}:\n{sql}\n{plan}"
+
+
+@pytest.mark.django_db
+class TestHotQueryPlans:
+    @pytest.mark.parametrize(
+        "url",
+        [
+            reverse("product-details-api", args=[1001]),
+            reverse("product-transfer", args=[1001]),
+        ],
+    )
+    def test_product_by_code(self, api_client, product_factory, url):
+        product_factory(code="1001")
+
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get(url)
+
+        assert_no_full_scan(queries, "product_product")
+
+    def test_add_to_cart(self, cart_client):
+        with CaptureQueriesContext(connection) as queries:
+            cart_client.post(
+                reverse("add-to-cart-api"), {"product_code": "K0"}, format="json"
+            )
+
+        # A repeated add is one UPDATE finding the row through the product code
+        updates = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "orders_cartitem"')
+        ]
+        assert len(updates) == 1
+        plan = query_plan(updates[0])
+        assert not full_scans(plan), f"full scan:\n{updates[0]}\n{plan}"
+
+    def test_cart_middleware_and_cart_view(self, cart_client):
+        with CaptureQueriesContext(connection) as queries:
+            cart_client.get(reverse("cart-api"))
+
+        assert_no_full_scan(queries, "orders_cartitem")
+
+    def test_remove_from_cart(self, cart_client):
+        with CaptureQueriesContext(connection) as queries:
+            cart_client.post(
+                reverse("remove-from-cart-api"), {"product_code": "K0"}, format="json"
+            )
+
+        assert_no_full_scan(queries, "orders_cartitem")
+
+    def test_orders_by_session(self, db):
+        with CaptureQueriesContext(connection) as queries:
+            list(Order.objects.filter(session_id="abc"))
+
+        assert_no_full_scan(queries, "orders_order")
+
+    def test_expired_cart_sweep(self, db):
+        with CaptureQueriesContext(connection) as queries:
+            list(expired_cart_items(timedelta(days=14)).values_list("pk", flat=True)[:500])
+
+        assert_no_full_scan(queries, "orders_cartitem")
+
+    def test_reservation_checks(self, api_client, product_factory):
+        product_factory(code="1002")
+
+        with CaptureQueriesContext(connection) as queries:
+            api_client.post(reverse("add-to-cart-api"), {"product_code": "1002"}, format="json")
+
+        statements = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith(("SELECT", "UPDATE")) and '"orders_reservation"' in q["sql"]
+        ]
+        assert len(statements) == 2
+        for sql in statements:
+            plan = query_plan(sql)
+            assert "orders_reservation" not in full_scans(plan), f"full scan:\n{sql}\n{plan}"
+
+    def test_expired_reservation_sweep(self, db):
+        with CaptureQueriesContext(connection) as queries:
+            list(
+                Reservation.objects.filter(expires_at__lte=timezone.now())
+                .values_list("pk", flat=True)[:500]
+            )
+
+        assert_no_full_scan(queries, "orders_reservation")
+
+    def test_idempotency_key_lookup(self, cart_client):
+        headers = {"Idempotency-Key": "retry-1"}
+        url = reverse("add-to-cart-api")
+        cart_client.post(url, {"product_code": "K0"}, format="json", headers=headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            cart_client.post(url, {"product_code": "K0"}, format="json", headers=headers)
+
+        assert_no_full_scan(queries, "orders_idempotencykey")
+
+    def test_expired_idempotency_key_purge(self, db):
+        with CaptureQueriesContext(connection) as queries:
+            list(
+                IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                .values_list("pk", flat=True)[:500]
+            )
+
+        assert_no_full_scan(queries, "orders_idempotencykey")
+
+    def test_product_history_by_time(self, db):
+        since = timezone.now() - timedelta(days=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(ProductHistory.objects.filter(timestamp__gte=since).order_by("-timestamp")[:20])
+
+        assert_no_full_scan(queries, "product_producthistory")
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"sort": "price_asc"},
+            {"sort": "price_desc"},
+            {"sort": "year_asc"},
+            {"sort": "year_desc"},
+            {"sort": "price_asc", "pagination": "cursor"},
+        ],
+    )
+    def test_list_order_comes_from_an_index(self, api_client, product_factory, params):
+        product_factory(code="1001")
+
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get(reverse("product"), params)
+
+        pages = [
+            sql for sql in selects_on(queries, "product_productcard") if "ORDER BY" in sql
+        ]
+        assert pages
+        for sql in pages:
+            plan = query_plan(sql)
+            assert not explicit_sorts(plan), f"sort without index:\n{sql}\n{plan}"
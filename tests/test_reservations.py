@@ -0,0 +1,182 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders import reservations
+from orders.models import CartItem, Order, Reservation
+
+
+def add(client, code):
+    return client.post(
+        reverse("add-to-cart-api"), {"product_code": code}, content_type="application/json"
+    )
+
+
+def checkout(client):
+    return client.post(
+        reverse("checkout-api"), {"email": "a@example.com"}, content_type="application/json"
+    )
+
+
+def expire_all():
+    Reservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+
+@pytest.fixture
+def shoppers():
+    return Client(), Client()
+
+
+@pytest.mark.django_db
+class TestReservations:
+    def test_adding_holds_the_product(self, shoppers, product_factory, settings):
+        settings.CART_RESERVATION_MINUTES = 15
+        first, second = shoppers
+        product = product_factory(code="V1")
+
+        assert add(first, "V1").status_code == 200
+        response = add(second, "V1")
+
+        assert response.status_code == 409
+        reservation = Reservation.objects.get(product=product)
+        assert reservation.session_id == first.session["cart_id"]
+        assert reservation.expires_at > timezone.now() + timedelta(minutes=14)
+        assert CartItem.objects.count() == 1
+
+    def test_removing_releases_the_hold(self, shoppers, product_factory):
+        first, second = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+
+        first.post(
+            reverse("remove-from-cart-api"), {"product_code": "V1"}, content_type="application/json"
+        )
+
+        assert add(second, "V1").status_code == 200
+
+    def test_expired_hold_is_taken_over(self, shoppers, product_factory):
+        first, second = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+        expire_all()
+
+        assert add(second, "V1").status_code == 200
+        assert Reservation.objects.get().session_id == second.session["cart_id"]
+
+    def test_adding_again_renews_the_hold(self, shoppers, product_factory):
+        first, _ = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+        Reservation.objects.update(expires_at=timezone.now() + timedelta(minutes=1))
+
+        assert add(first, "V1").status_code == 200
+
+        assert Reservation.objects.get().expires_at > timezone.now() + timedelta(minutes=14)
+        assert CartItem.objects.get().quantity == 2
+
+    def test_adding_again_after_losing_the_hold(self, shoppers, product_factory):
+        first, second = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+        expire_all()
+        add(second, "V1")
+
+        response = add(first, "V1")
+
+        assert response.status_code == 409
+        assert Reservation.objects.get().session_id == second.session["cart_id"]
+        assert CartItem.objects.get(session_id=first.session["cart_id"]).quantity == 1
+
+    def test_batch_add_reports_held_products(self, shoppers, product_factory):
+        first, second = shoppers
+        for code in ("V1", "V2", "V3"):
+            product_factory(code=code)
+        add(first, "V2")
+
+        response = second.post(
+            reverse("add-many-to-cart-api"),
+            {"items": [{"product_code": code} for code in ("V1", "V2", "V3")]},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 409
+        assert response.json()["reserved"] == ["V2"]
+        assert CartItem.objects.count() == 1
+        # The holds taken on V1 and V3 went with the rejected batch
+        assert list(Reservation.objects.values_list("product__code", flat=True)) == ["V2"]
+        assert add(Client(), "V1").status_code == 200
+
+    def test_reserving_is_three_statements_for_any_number_of_products(self, product_factory):
+        products = [product_factory(code=f"V{i}") for i in range(10)]
+
+        for ids in ([products[0].pk], [p.pk for p in products[1:]]):
+            with CaptureQueriesContext(connection) as context:
+                assert reservations.reserve("cart", ids) == []
+            statements = [q for q in context.captured_queries if "SAVEPOINT" not in q["sql"]]
+            assert len(statements) == 3
+
+        assert Reservation.objects.count() == 10
+
+    def test_checkout_rejects_products_held_by_another_cart(self, shoppers, product_factory):
+        first, _ = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+        # The hold ran out and was taken by another cart
+        expire_all()
+        reservations.reserve("someone-else", Reservation.objects.values_list("product_id", flat=True))
+
+        response = checkout(first)
+
+        assert response.status_code == 409
+        assert response.json()["unavailable"] == ["V1"]
+        assert Order.objects.count() == 0
+
+    def test_checkout_releases_the_holds(self, shoppers, product_factory):
+        first, _ = shoppers
+        product_factory(code="V1")
+        add(first, "V1")
+
+        assert checkout(first).status_code == 200
+        assert Reservation.objects.count() == 0
+
+    def test_holds_can_be_turned_off(self, shoppers, product_factory, settings):
+        settings.CART_RESERVATION_MINUTES = 0
+        first, second = shoppers
+        product_factory(code="V1")
+
+        assert add(first, "V1").status_code == 200
+        assert add(second, "V1").status_code == 200
+        assert Reservation.objects.count() == 0
+
+
+@pytest.mark.django_db
+class TestReservationSweep:
+    @pytest.fixture
+    def holds(self, product_factory):
+        products = [product_factory(code=f"W{i}") for i in range(5)]
+        reservations.reserve("old", [p.pk for p in products[:4]])
+        expire_all()
+        reservations.reserve("new", [products[4].pk])
+
+    def test_deletes_expired_holds_in_batches(self, holds):
+        with CaptureQueriesContext(connection) as context:
+            deleted, _ = reservations.sweep_expired_reservations(batch_size=3)
+
+        deletes = [q for q in context.captured_queries if q["sql"].startswith("DELETE")]
+        assert deleted == 4
+        assert len(deletes) == 2
+        assert list(Reservation.objects.values_list("session_id", flat=True)) == ["new"]
+
+    def test_command(self, holds):
+        out = StringIO()
+
+        call_command("sweep_reservations", "--batch-size", "2", stdout=out)
+
+        assert "Deleted 4 expired reservations in" in out.getvalue()
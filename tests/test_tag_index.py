@@ -0,0 +1,140 @@
+from __future__ import annotations
+import pytest
+from django.db.models import F
+from django.urls import reverse
+from product import tag_index, views
+from product.cache import bump_catalog_version, catalog_version
+from product.models import CatalogVersion, ProductTag, Tag
+
+
+def codes(response):
+    assert response.status_code == 200
+    return sorted(item["code"] for item in response.data["results"])
+
+
+def test_bitmap_round_trip():
+    ids = [0, 3, 8, 9, 1000]
+
+    assert tag_index.ids_from_bitmap(tag_index.bitmap_from_ids(ids)) == ids
+    assert tag_index.bitmap_from_ids([]) == 0
+
+
+@pytest.mark.django_db
+class TestTagBitmapIndex:
+    @pytest.fixture
+    def catalog(self, product_factory):
+        sale = Tag.objects.create(name="sale")
+        denim = Tag.objects.create(name="denim")
+        Tag.objects.create(name="empty")
+        products = {
+            code: product_factory(code=code) for code in ("1001", "1002", "1003", "1004")
+        }
+        for code, tags in {"1001": [sale, denim], "1002": [sale], "1003": [denim]}.items():
+            for tag in tags:
+                ProductTag.objects.create(product=products[code], tag=tag)
+        return products
+
+    @pytest.mark.parametrize(
+        "match, expected",
+        [
+            ("any", ["1001", "1002", "1003"]),
+            ("all", ["1001"]),
+        ],
+    )
+    def test_match_modes(self, api_client, catalog, match, expected):
+        response = api_client.get(
+            reverse("product"), {"tags": "sale,denim", "match": match}
+        )
+
+        assert codes(response) == expected
+
+    def test_tag_ids_and_names(self, api_client, catalog):
+        sale = Tag.objects.get(name="sale")
+
+        response = api_client.get(
+            reverse("product"), {"tags": f"{sale.id},denim", "match": "all"}
+        )
+
+        assert codes(response) == ["1001"]
+
+    def test_unknown_tag_in_all_mode(self, api_client, catalog):
+        response = api_client.get(
+            reverse("product"), {"tags": "sale,missing", "match": "all"}
+        )
+
+        assert codes(response) == []
+
+    def test_subquery_fallback_matches_index(self, api_client, catalog, monkeypatch):
+        monkeypatch.setattr(views, "TAG_FILTER_MAX_IDS", 0)
+
+        for match, expected in [("any", ["1001", "1002", "1003"]), ("all", ["1001"])]:
+            response = api_client.get(
+                reverse("product"), {"tags": "sale,denim", "match": match}
+            )
+            assert codes(response) == expected
+
+    def test_facets_for_result_set(self, api_client, catalog):
+        response = api_client.get(reverse("product"), {"tags": "sale"})
+
+        assert response.data["facets"] == {"sale": 2, "denim": 1, "empty": 0}
+
+    def test_facets_without_filter(self, api_client, catalog):
+        response = api_client.get(reverse("product"))
+
+        assert response.data["facets"] == {"sale": 2, "denim": 2, "empty": 0}
+
+    def test_tag_list_with_counts(self, api_client, catalog):
+        url = reverse("tag-list")
+
+        assert api_client.get(url).data == ["sale", "denim", "empty"]
+        assert api_client.get(url, {"with_counts": "1"}).data == [
+            {"name": "sale", "count": 2},
+            {"name": "denim", "count": 2},
+            {"name": "empty", "count": 0},
+        ]
+
+    def test_refresh_on_commit_keeps_index_current(
+        self, catalog, django_capture_on_commit_callbacks
+    ):
+        tag_index.index.load()
+        sale = Tag.objects.get(name="sale")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            ProductTag.objects.create(product=catalog["1004"], tag=sale)
+        with django_capture_on_commit_callbacks(execute=True):
+            ProductTag.objects.filter(product=catalog["1002"], tag=sale).delete()
+
+        assert tag_index.index.version == catalog_version()
+        bitmap = tag_index.index.match(["sale"])
+        assert tag_index.ids_from_bitmap(bitmap) == sorted(
+            [catalog["1001"].pk, catalog["1004"].pk]
+        )
+
+    def test_change_from_another_process_reloads_the_index(self, catalog):
+        tag_index.index.load()
+        sale = Tag.objects.get(name="sale")
+
+        # Written by another process: no signal here, only its version bump
+        ProductTag.objects.bulk_create([ProductTag(product=catalog["1004"], tag=sale)])
+        CatalogVersion.objects.update(version=F("version") + 1)
+
+        bitmap = tag_index.index.match(["sale"])
+        assert catalog["1004"].pk in tag_index.ids_from_bitmap(bitmap)
+
+    def test_refresh_after_a_missed_change_reloads(
+        self, catalog, django_capture_on_commit_callbacks
+    ):
+        tag_index.index.load()
+        sale = Tag.objects.get(name="sale")
+        # Another process tags 1004 and bumps; this one serves no request since
+        ProductTag.objects.bulk_create([ProductTag(product=catalog["1004"], tag=sale)])
+        bump_catalog_version()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            ProductTag.objects.create(product=catalog["1003"], tag=sale)
+
+        assert tag_index.index.version == catalog_version()
+        bitmap = tag_index.index.match(["sale"])
+        assert tag_index.ids_from_bitmap(bitmap) == sorted(
+            product.pk for product in catalog.values()
+        )